@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量打码脚本
+对目录或通配符匹配到的多个视频进行人脸打码：进程池中每个工作进程只创建一次检测器并依次处理多个文件，
+按总帧数从长到短调度（长任务先开始，避免最后只剩一个长视频在跑），已是最新的输出直接跳过，
+最后输出每个文件的汇总表。
+
+使用方法:
+    python batch_mosaic.py footage/ [更多目录或通配符...] [--output-dir out/] [--workers 4]
+    python batch_mosaic.py "footage/**/*.mp4" --detector yunet --force
+
+输出文件命名为: 原文件名_out.扩展名（与输入同目录，或放到 --output-dir）
+"""
+
+import argparse
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from detector_registry import DETECTORS
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v')
+
+# 本脚本和quick_mosaic.py生成的输出文件（以及未完成的临时文件），收集输入时跳过
+OUTPUT_NAME_PATTERN = re.compile(r'_out(_\d{8}_\d{6})?(\.partial)?$')
+
+# 每个工作进程的检测器（进程初始化时创建，之后处理的所有文件共用）
+_worker_detector = None
+
+
+def collect_inputs(sources, recursive=False):
+    """
+    收集待处理的视频文件
+
+    Args:
+        sources (list): 视频文件、目录或通配符（支持 **）
+        recursive (bool): 目录是否递归查找
+
+    Returns:
+        list: 去重后的视频文件路径（按路径排序）
+    """
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            pattern = os.path.join(source, '**', '*') if recursive else os.path.join(source, '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif os.path.isfile(source):
+            candidates = [source]
+        else:
+            candidates = glob.glob(source, recursive=True)
+            if not candidates:
+                print(f"警告: 没有匹配的文件: {source}")
+
+        for path in candidates:
+            stem, extension = os.path.splitext(os.path.basename(path))
+            if (os.path.isfile(path) and extension.lower() in VIDEO_EXTENSIONS
+                    and not OUTPUT_NAME_PATTERN.search(stem)):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def get_output_path(input_path, output_dir=None):
+    """
+    批量模式的输出文件名（不含时间戳，便于判断是否已处理）
+
+    Args:
+        input_path (str): 输入视频文件路径
+        output_dir (str): 输出目录，None表示与输入同目录
+
+    Returns:
+        str: 输出文件路径
+    """
+    stem, extension = os.path.splitext(os.path.basename(input_path))
+    return os.path.join(output_dir or os.path.dirname(input_path), f"{stem}_out{extension}")
+
+
+def is_up_to_date(input_path, output_path):
+    """
+    输出文件存在、非空且不早于输入文件时视为最新
+
+    Args:
+        input_path (str): 输入视频文件路径
+        output_path (str): 输出视频文件路径
+
+    Returns:
+        bool: 是否可以跳过
+    """
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return False
+    return os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+def count_frames(input_path):
+    """
+    读取视频总帧数（用于调度，无法打开时返回0）
+
+    Args:
+        input_path (str): 视频文件路径
+
+    Returns:
+        int: 总帧数
+    """
+    cap = cv2.VideoCapture(input_path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    cap.release()
+    return max(0, frames)
+
+
+def schedule_jobs(jobs):
+    """
+    最长任务优先：按总帧数从大到小排列，依次提交给进程池
+
+    Args:
+        jobs (list): 任务列表，每项包含'frames'
+
+    Returns:
+        list: 排序后的任务列表
+    """
+    return sorted(jobs, key=lambda job: job['frames'], reverse=True)
+
+
+def _init_worker(detector_name, detector_options):
+    """
+    工作进程初始化：创建本进程的检测器
+
+    Args:
+        detector_name (str): 检测器名称
+        detector_options (dict): create_detector的其他参数
+    """
+    global _worker_detector
+    from detector_registry import create_detector
+    _worker_detector = create_detector(detector_name, **detector_options)
+
+
+def _process_job(job):
+    """
+    工作进程入口：处理一个文件
+    先写入临时文件，成功后再改名，中断时不会留下看似最新的残缺输出
+
+    Args:
+        job (dict): 任务，包括输入/输出路径和process_video参数
+
+    Returns:
+        dict: 任务结果，'result'为process_video的结果
+    """
+    stem, extension = os.path.splitext(job['output_path'])
+    temp_path = f"{stem}.partial{extension}"
+    start_time = time.time()
+    try:
+        result = _worker_detector.process_video(job['input_path'], temp_path, **job['process_kwargs'])
+        os.replace(temp_path, job['output_path'])
+        return dict(job, status='done', result=result, wall_time=time.time() - start_time)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return dict(job, status='failed', error=str(e), wall_time=time.time() - start_time)
+
+
+def run_batch(inputs, output_dir=None, workers=None, force=False, detector_name='hybrid',
+              detector_options=None, **process_kwargs):
+    """
+    批量处理视频
+
+    Args:
+        inputs (list): 输入视频文件路径
+        output_dir (str): 输出目录，None表示与输入同目录
+        workers (int): 工作进程数，默认为CPU核数（不超过待处理文件数）
+        force (bool): 即使输出已是最新也重新处理
+        detector_name (str): 检测器名称
+        detector_options (dict): create_detector的其他参数（如continuation_frames、deepface_backend）
+        **process_kwargs: 传给process_video的参数（如apply_mosaic、mosaic_size、codec）
+
+    Returns:
+        list: 每个文件的任务结果（按输入顺序），status为done、skipped或failed
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # 批量模式下预览和进度回调无法跨进程工作
+    process_kwargs.pop('show_preview', None)
+    process_kwargs.pop('progress_callback', None)
+
+    jobs = []
+    for input_path in inputs:
+        output_path = get_output_path(input_path, output_dir)
+        job = {'input_path': input_path, 'output_path': output_path, 'frames': count_frames(input_path),
+               'process_kwargs': process_kwargs}
+        if not force and is_up_to_date(input_path, output_path):
+            job['status'] = 'skipped'
+        jobs.append(job)
+
+    pending = schedule_jobs([job for job in jobs if 'status' not in job])
+    skipped = len(jobs) - len(pending)
+    finished = {}
+    if pending:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        print(f"批量处理: {len(pending)}个文件（跳过{skipped}个已是最新）, {workers}个进程, "
+              f"共{sum(job['frames'] for job in pending)}帧")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(detector_name, detector_options or {})) as executor:
+            futures = [executor.submit(_process_job, job) for job in pending]
+            for done_count, future in enumerate(as_completed(futures), 1):
+                item = future.result()
+                finished[item['input_path']] = item
+                status = '完成' if item['status'] == 'done' else f"失败: {item['error']}"
+                print(f"[{done_count}/{len(pending)}] {os.path.basename(item['input_path'])} {status}", flush=True)
+    else:
+        print(f"没有需要处理的文件（{skipped}个已是最新）")
+
+    return [finished.get(job['input_path'], job) for job in jobs]
+
+
+def summary_rows(items):
+    """
+    由任务结果生成汇总表的行
+
+    Args:
+        items (list): run_batch的返回值
+
+    Returns:
+        list: 每行一个字典
+    """
+    rows = []
+    for item in items:
+        result = item.get('result') or {}
+        rows.append({
+            'file': os.path.basename(item['input_path']),
+            'status': item['status'],
+            'frames': result.get('processed_frames', item['frames']),
+            'frames_with_faces': result.get('frames_with_faces', ''),
+            'faces_detected': result.get('total_faces_detected', ''),
+            'detection_rate': f"{result['detection_rate']:.2%}" if result else '',
+            'processing_time': f"{result['processing_time']:.2f}" if result else '',
+            'fps': f"{result['fps_processed']:.2f}" if result else '',
+            'output': item['output_path'],
+            'error': item.get('error', '')
+        })
+    return rows
+
+
+def print_summary(rows):
+    """
+    打印汇总表
+
+    Args:
+        rows (list): summary_rows的返回值
+    """
+    print(f"\n{'文件':<32}{'状态':<9}{'帧数':>8}{'有人脸':>8}{'检测率':>9}{'耗时(秒)':>10}{'帧/秒':>9}")
+    print("-" * 85)
+    for row in rows:
+        print(f"{row['file'][:31]:<32}{row['status']:<9}{row['frames']:>8}{row['frames_with_faces']:>8}"
+              f"{row['detection_rate']:>9}{row['processing_time']:>10}{row['fps']:>9}")
+        if row['error']:
+            print(f"  错误: {row['error']}")
+    print("-" * 85)
+    counts = {status: sum(row['status'] == status for row in rows) for status in ('done', 'skipped', 'failed')}
+    print(f"完成 {counts['done']}, 跳过 {counts['skipped']}, 失败 {counts['failed']}")
+
+
+def write_summary(rows, path):
+    """
+    把汇总表写入CSV文件
+
+    Args:
+        rows (list): summary_rows的返回值
+        path (str): CSV文件路径
+    """
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ['file'])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"汇总表已保存: {path}")
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(
+        description='批量视频人脸打码',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例用法:
+  python batch_mosaic.py footage/                          # 处理目录下的所有视频
+  python batch_mosaic.py footage/ --recursive --output-dir out/
+  python batch_mosaic.py "day1/*.mp4" "day2/*.mov" --workers 4
+  python batch_mosaic.py footage/ --detector yunet --force  # 使用YuNet并重新处理全部文件
+        """
+    )
+    parser.add_argument('sources', nargs='+', help='视频文件、目录或通配符')
+    parser.add_argument('--output-dir', help='输出目录（默认：与输入文件同目录）')
+    parser.add_argument('--recursive', action='store_true', help='递归查找子目录中的视频')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数（默认：CPU核数）')
+    parser.add_argument('--force', action='store_true', help='即使输出已是最新也重新处理')
+    parser.add_argument('--summary', default=None,
+                        help='汇总表CSV路径（默认：输出目录或当前目录下的batch_summary.csv）')
+    parser.add_argument('--detector', choices=list(DETECTORS), default='hybrid',
+                        help='检测器类型（默认：hybrid，与quick_mosaic.py一致）')
+    parser.add_argument('--deepface-backend', default='retinaface', help='DeepFace检测后端（默认：retinaface）')
+    parser.add_argument('--continuation-frames', type=int, default=15, help='无人脸时延续打码的帧数（默认：15）')
+    parser.add_argument('--mosaic-size', type=int, default=15, help='马赛克块大小（默认：15）')
+    parser.add_argument('--codec', default='auto', help='输出视频编码器（默认：auto）')
+    parser.add_argument('--detect-size', type=int, default=None, help='检测分辨率（长边像素）')
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.sources, recursive=args.recursive)
+    if not inputs:
+        print("错误: 没有找到视频文件")
+        sys.exit(1)
+
+    items = run_batch(
+        inputs, output_dir=args.output_dir, workers=args.workers, force=args.force,
+        detector_name=args.detector,
+        detector_options={'continuation_frames': args.continuation_frames,
+                          'deepface_backend': args.deepface_backend},
+        apply_mosaic=True, mosaic_size=args.mosaic_size, codec=args.codec, detect_size=args.detect_size
+    )
+
+    rows = summary_rows(items)
+    print_summary(rows)
+    write_summary(rows, args.summary or os.path.join(args.output_dir or '.', 'batch_summary.csv'))
+
+    if any(item['status'] == 'failed' for item in items):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
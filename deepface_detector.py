@@ -17,7 +17,7 @@ class DeepFaceDetector:
     提供人脸检测、属性分析等高级功能
     """
     
-    def __init__(self, detector_backend='mtcnn', model_name='VGG-Face'):
+    def __init__(self, detector_backend='mtcnn', model_name='VGG-Face', detect_size=None):
         """
         初始化DeepFace检测器
         
@@ -25,12 +25,15 @@ class DeepFaceDetector:
             detector_backend (str): 检测后端 ('opencv', 'ssd', 'dlib', 'mtcnn', 'retinaface')
                                    推荐使用 'mtcnn' 或 'retinaface' 以获得更好的侧脸检测效果
             model_name (str): 人脸识别模型 ('VGG-Face', 'Facenet', 'OpenFace', 'DeepFace')
+            detect_size (int): 检测分辨率（长边像素数），帧先缩小到该尺寸再检测，结果映射回原始坐标；
+                               为None或0时使用原始分辨率（retinaface在1080p上很慢，建议设为640~960）
         """
         if not DEEPFACE_AVAILABLE:
             raise ImportError("DeepFace未安装，请先安装: pip install deepface")
             
         self.detector_backend = detector_backend
         self.model_name = model_name
+        self.detect_size = detect_size
         
         # 支持的检测后端，按侧脸检测能力排序
         self.supported_backends = ['opencv', 'ssd', 'dlib', 'mtcnn', 'retinaface']
@@ -38,6 +41,13 @@ class DeepFaceDetector:
         
         if detector_backend not in self.supported_backends:
             raise ValueError(f"不支持的检测后端: {detector_backend}")
+        
+        # 检测模型在第一次检测时构建，之后每帧直接调用（只做属性分析时不加载检测模型）
+        self._detect = None
+        # 最近一次检测的人脸置信度，与返回的人脸框一一对应
+        self.last_confidences = []
+        # 属性分析是否使用批量输入（旧版DeepFace不支持时在第一次分析后关闭）
+        self._batch_analyze = True
             
         # 如果使用推荐后端，给出提示
         if detector_backend in self.recommended_backends:
@@ -45,63 +55,118 @@ class DeepFaceDetector:
         else:
             print(f"DeepFace检测器初始化完成 - 后端: {detector_backend}, 模型: {model_name}")
             print(f"提示: 推荐使用 {self.recommended_backends} 后端以获得更好的侧脸检测效果")
+        if detect_size:
+            print(f"DeepFace检测分辨率: 长边 {detect_size} 像素")
     
-    def detect_faces_in_frame(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    @staticmethod
+    def _build_detect_function(backend):
         """
-        在单帧图像中检测人脸
+        构建检测模型并返回单帧检测函数，兼容不同DeepFace版本的接口
         
         Args:
-            frame (numpy.ndarray): 输入的图像帧
+            backend (str): 检测后端
             
         Returns:
-            list: 检测到的人脸矩形框列表，每个元素为(x, y, w, h)
+            callable: 输入BGR图像，返回[(x, y, w, h, 置信度), ...]
         """
+        # DeepFace >= 0.0.93: modeling.build_model(task=..., model_name=...)
         try:
-            # 使用DeepFace检测人脸区域
-            face_objs = DeepFace.extract_faces(
-                img_path=frame,
-                detector_backend=self.detector_backend,
-                enforce_detection=False,
-                align=False
-            )
-            
-            # 获取人脸区域坐标
-            face_boxes = []
-            if face_objs:
-                # DeepFace返回的是归一化的人脸区域，需要转换为像素坐标
-                height, width = frame.shape[:2]
-                
-                # 使用DeepFace的函数获取精确坐标
-                try:
-                    from deepface.commons import functions
-                    detected_faces = functions.extract_faces(
-                        img=frame,
-                        detector_backend=self.detector_backend,
-                        grayscale=False,
-                        enforce_detection=False,
-                        align=False
-                    )
-                except ImportError:
-                    # 如果导入失败，使用备用方法
-                    detected_faces = DeepFace.extract_faces(
-                        img_path=frame,
-                        detector_backend=self.detector_backend,
-                        grayscale=False,
-                        enforce_detection=False,
-                        align=False
-                    )
-                
-                for face_data in detected_faces:
-                    if 'facial_area' in face_data:
-                        area = face_data['facial_area']
-                        x, y, w, h = area['x'], area['y'], area['w'], area['h']
-                        face_boxes.append((x, y, w, h))
+            from deepface.modules import modeling
+            model = modeling.build_model(task='face_detector', model_name=backend)
+            return lambda img: [(r.x, r.y, r.w, r.h, r.confidence) for r in model.detect_faces(img)]
+        except (ImportError, TypeError):
+            pass
+        
+        # DeepFace 0.0.86 ~ 0.0.92: DetectorWrapper.build_model(backend)
+        try:
+            from deepface.detectors import DetectorWrapper
+            model = DetectorWrapper.build_model(backend)
+            return lambda img: [(r.x, r.y, r.w, r.h, r.confidence) for r in model.detect_faces(img)]
+        except (ImportError, AttributeError):
+            pass
+        
+        # DeepFace 0.0.79 ~ 0.0.85: FaceDetector.build_model(backend)
+        try:
+            from deepface.detectors import FaceDetector
+            model = FaceDetector.build_model(backend)
+            return lambda img: [(*region, confidence) for _, region, confidence
+                                in FaceDetector.detect_faces(model, backend, img, align=False)]
+        except (ImportError, AttributeError):
+            pass
+        
+        # 无法直接使用检测模型时，每帧调用一次extract_faces（DeepFace内部缓存模型）
+        return DeepFaceDetector._extract_faces_function(backend)
+    
+    @staticmethod
+    def _extract_faces_function(backend):
+        """
+        返回通过DeepFace.extract_faces检测的单帧检测函数（所有DeepFace版本都支持，但每帧有额外开销）
+        
+        Args:
+            backend (str): 检测后端
             
-            return face_boxes
+        Returns:
+            callable: 输入BGR图像，返回[(x, y, w, h, 置信度), ...]
+        """
+        def detect(img):
+            face_objs = DeepFace.extract_faces(img_path=img, detector_backend=backend,
+                                               enforce_detection=False, align=False)
+            faces = []
+            for face_data in face_objs:
+                area = face_data.get('facial_area')
+                # 未检测到人脸时返回置信度为0的整幅图像，需要排除
+                if area and face_data.get('confidence', 0) > 0:
+                    faces.append((area['x'], area['y'], area['w'], area['h'], face_data['confidence']))
+            return faces
+        return detect
+    
+    def detect_faces_in_frame(self, frame: np.ndarray, detect_size: Optional[int] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        在单帧图像中检测人脸（每帧只运行一次检测）
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            detect_size (int): 本次使用的检测分辨率，为None时使用初始化时的设置
             
+        Returns:
+            list: 检测到的人脸矩形框列表，每个元素为(x, y, w, h)
+        """
+        detect_size = self.detect_size if detect_size is None else detect_size
+        height, width = frame.shape[:2]
+        scale_x = scale_y = 1.0
+        det_frame = frame
+        # 按检测分辨率缩小，结果再映射回原始坐标
+        if detect_size and max(width, height) > detect_size:
+            scale = detect_size / max(width, height)
+            det_w, det_h = max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+            det_frame = cv2.resize(frame, (det_w, det_h), interpolation=cv2.INTER_AREA)
+            scale_x, scale_y = width / det_w, height / det_h
+        
+        if self._detect is None:
+            # 只构建一次；构建失败（如模型权重加载失败）时改用extract_faces，不在之后的每帧重试
+            try:
+                self._detect = self._build_detect_function(self.detector_backend)
+            except Exception as e:
+                print(f"DeepFace检测模型构建失败，改用extract_faces逐帧检测: {e}")
+                self._detect = self._extract_faces_function(self.detector_backend)
+        
+        try:
+            detections = self._detect(det_frame)
         except Exception as e:
             print(f"DeepFace人脸检测错误: {e}")
+            self.last_confidences = []
             return []
+        
+        face_boxes = []
+        confidences = []
+        for x, y, w, h, confidence in detections:
+            x1, y1 = max(0, int(round(x * scale_x))), max(0, int(round(y * scale_y)))
+            x2, y2 = min(width, int(round((x + w) * scale_x))), min(height, int(round((y + h) * scale_y)))
+            if x2 > x1 and y2 > y1:
+                face_boxes.append((x1, y1, x2 - x1, y2 - y1))
+                confidences.append(float(confidence) if confidence is not None else 1.0)
+        self.last_confidences = confidences
+        return face_boxes
     
     def analyze_faces_in_frame(self, frame: np.ndarray) -> List[Dict]:
         """
@@ -133,6 +198,85 @@ class DeepFaceDetector:
             print(f"DeepFace人脸分析错误: {e}")
             return []
     
+    def analyze_face_crops(self, frame: np.ndarray, boxes: List[Tuple[int, int, int, int]],
+                           actions=('age', 'gender', 'race', 'emotion'), margin: float = 0.2) -> List[Dict]:
+        """
+        对已检测到的人脸框直接做属性分析（跳过DeepFace的检测，所有人脸一次批量分析）
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            boxes (list): 人脸矩形框列表，每个元素为(x, y, w, h)
+            actions (tuple): 分析项目
+            margin (float): 裁剪时向四周扩展的比例（属性模型需要一些脸部周围的区域）
+            
+        Returns:
+            list: 与boxes一一对应的分析结果，每项包含'bbox'和'region'（原图坐标）；
+                  分析失败的人脸只有'bbox'、'region'和'error'
+        """
+        height, width = frame.shape[:2]
+        crops = []
+        results = []
+        for x, y, w, h in boxes:
+            dx, dy = int(w * margin), int(h * margin)
+            x1, y1 = max(0, x - dx), max(0, y - dy)
+            x2, y2 = min(width, x + w + dx), min(height, y + h + dy)
+            results.append({'bbox': (x, y, w, h), 'region': {'x': x, 'y': y, 'w': w, 'h': h}})
+            if x2 > x1 and y2 > y1:
+                crops.append(frame[y1:y2, x1:x2])
+            else:
+                crops.append(None)
+                results[-1]['error'] = '人脸框超出图像范围'
+        
+        valid = [i for i, crop in enumerate(crops) if crop is not None]
+        if not valid:
+            return results
+        
+        analyses = self._analyze_crops([crops[i] for i in valid], list(actions))
+        for i, analysis in zip(valid, analyses):
+            if isinstance(analysis, Exception):
+                results[i]['error'] = str(analysis)
+                continue
+            # 结果中的region是裁剪图中的坐标，保留原图中的人脸框
+            analysis = {key: value for key, value in analysis.items() if key != 'region'}
+            results[i].update(analysis)
+        return results
+    
+    def _analyze_crops(self, crops: List[np.ndarray], actions: List[str]) -> List:
+        """
+        批量分析人脸裁剪图；DeepFace版本不支持批量输入时逐张分析
+        
+        Args:
+            crops (list): 人脸裁剪图
+            actions (list): 分析项目
+            
+        Returns:
+            list: 与crops一一对应的分析结果字典，分析失败的项为异常对象
+        """
+        def first(item):
+            # skip模式下每张图只有一个"人脸"，不同版本返回字典或单元素列表
+            return item[0] if isinstance(item, list) else item
+        
+        if self._batch_analyze and len(crops) > 1:
+            try:
+                batch = DeepFace.analyze(img_path=crops, actions=actions, detector_backend='skip',
+                                         enforce_detection=False, silent=True)
+                if isinstance(batch, list) and len(batch) == len(crops):
+                    self._batch_analyze = True
+                    return [first(item) for item in batch]
+            except (ValueError, TypeError, AttributeError):
+                pass
+            # 旧版DeepFace只接受单张图像
+            self._batch_analyze = False
+        
+        analyses = []
+        for crop in crops:
+            try:
+                analyses.append(first(DeepFace.analyze(img_path=crop, actions=actions, detector_backend='skip',
+                                                       enforce_detection=False, silent=True)))
+            except Exception as e:
+                analyses.append(e)
+        return analyses
+    
     def get_face_embeddings(self, frame: np.ndarray) -> List[np.ndarray]:
         """
         获取人脸特征向量
@@ -200,7 +344,7 @@ class HybridFaceDetector(VideoFaceDetector):
     继承VideoFaceDetector以复用视频处理功能
     """
     
-    def __init__(self, primary_backend='yunet', enable_deepface=False, deepface_backend='mtcnn', continuation_frames=5):
+    def __init__(self, primary_backend='yunet', enable_deepface=False, deepface_backend='mtcnn', continuation_frames=5, **detector_kwargs):
         """
         初始化混合检测器
         
@@ -209,9 +353,10 @@ class HybridFaceDetector(VideoFaceDetector):
             enable_deepface (bool): 是否启用DeepFace高级功能
             deepface_backend (str): DeepFace检测后端
             continuation_frames (int): 无人脸时延续打码的最大帧数
+            **detector_kwargs: 传递给VideoFaceDetector的其他参数（如multi_scale）
         """
         # 调用父类初始化方法，传递continuation_frames参数
-        super().__init__(continuation_frames=continuation_frames)
+        super().__init__(continuation_frames=continuation_frames, **detector_kwargs)
         
         self.primary_backend = primary_backend
         self.enable_deepface = enable_deepface and DEEPFACE_AVAILABLE
@@ -259,11 +404,50 @@ class HybridFaceDetector(VideoFaceDetector):
             # 使用父类的YuNet检测器
             return super().detect_faces_in_frame(frame)
         elif self.primary_backend == 'deepface' and self.enable_deepface:
-            return self.deepface_detector.detect_faces_in_frame(frame)
+            # 与YuNet使用相同的检测分辨率（process_video的detect_size参数会更新self.detect_size）
+            faces = self.deepface_detector.detect_faces_in_frame(frame, detect_size=self.detect_size or 0)
+            # DeepFace没有YuNet格式的关键点，用人脸框补齐以便光流传播使用
+            self.last_detections = self._boxes_to_detections(faces)
+            self.last_detections[:, 14] = self.deepface_detector.last_confidences
+            return faces
         else:
             # 如果DeepFace不可用，回退到YuNet（父类方法）
             return super().detect_faces_in_frame(frame)
     
+    def _detect_image_raw(self, image: np.ndarray) -> np.ndarray:
+        """
+        在给定图像上按原尺寸运行一次主后端检测（跟踪区域检测的拼接图）
+        
+        Args:
+            image (numpy.ndarray): 输入图像
+            
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的检测结果（图像坐标）
+        """
+        if self.primary_backend == 'deepface' and self.enable_deepface:
+            faces = self.deepface_detector.detect_faces_in_frame(image, detect_size=0)
+            detections = self._boxes_to_detections(faces)
+            detections[:, 14] = self.deepface_detector.last_confidences
+            return detections
+        return super()._detect_image_raw(image)
+    
+    def detection_params(self):
+        """
+        检测结果缓存的键，包含主后端和DeepFace后端
+
+        Returns:
+            dict: 模型哈希和检测参数
+        """
+        params = super().detection_params()
+        params['primary_backend'] = self.primary_backend if self.enable_deepface else 'yunet'
+        params['deepface_backend'] = self.deepface_backend if self.enable_deepface else None
+        return params
+
+    @property
+    def supports_parallel_detection(self):
+        """DeepFace后端的模型不保证线程安全，以DeepFace为主后端时不支持并行检测"""
+        return not (self.primary_backend == 'deepface' and self.enable_deepface)
+    
     def analyze_faces_with_attributes(self, frame: np.ndarray) -> Dict:
         """
         检测人脸并分析属性
@@ -272,7 +456,7 @@ class HybridFaceDetector(VideoFaceDetector):
             frame (numpy.ndarray): 输入的图像帧
             
         Returns:
-            dict: 包含检测结果和属性分析的完整信息
+            dict: 包含检测结果和属性分析的完整信息，'analysis'与'faces'按序一一对应
         """
         result = {
             'faces': [],
@@ -284,10 +468,9 @@ class HybridFaceDetector(VideoFaceDetector):
         faces = self.detect_faces_in_frame(frame)
         result['faces'] = faces
         
-        # 如果启用DeepFace，进行属性分析
+        # 如果启用DeepFace，直接在检测到的人脸框上做属性分析（不再对整帧重新检测），结果与faces一一对应
         if self.enable_deepface and faces:
-            analysis = self.deepface_detector.analyze_faces_in_frame(frame)
-            result['analysis'] = analysis
+            result['analysis'] = self.deepface_detector.analyze_face_crops(frame, faces)
             result['has_deepface_analysis'] = True
         
         return result
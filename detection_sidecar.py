@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检测结果缓存（sidecar）
+把每帧的原始检测结果（跟踪之前）以列式npz文件保存：frame_offsets按帧索引检测结果，
+boxes / scores / landmarks分列存放。文件以模型哈希和检测参数作为键，
+调整马赛克大小、延续打码帧数等渲染参数时可以直接回放检测结果，无需重新推理。
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+SIDECAR_VERSION = 1
+
+# 模型文件哈希缓存：{(路径, 修改时间, 大小): sha256}
+_model_hash_cache = {}
+
+
+def model_sha256(model_path):
+    """
+    计算模型文件的SHA-256（按路径、修改时间和大小缓存）
+
+    Args:
+        model_path (str): 模型文件路径
+
+    Returns:
+        str: 十六进制哈希值，文件不存在时返回空字符串
+    """
+    if not model_path or not os.path.exists(model_path):
+        return ''
+    stat = os.stat(model_path)
+    cache_key = (os.path.abspath(model_path), stat.st_mtime_ns, stat.st_size)
+    if cache_key not in _model_hash_cache:
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _model_hash_cache[cache_key] = digest.hexdigest()
+    return _model_hash_cache[cache_key]
+
+
+class DetectionRecorder:
+    """
+    按帧记录原始检测结果
+    以帧序号为键保存，多线程流水线中检测结果乱序到达也能正确记录
+    """
+
+    def __init__(self):
+        self.frames = {}
+
+    def record(self, index, detections):
+        """
+        记录一帧的检测结果
+
+        Args:
+            index (int): 帧序号
+            detections (numpy.ndarray): 形状为(N, 15)的检测结果
+        """
+        self.frames[index] = np.asarray(detections, dtype=np.float32).reshape(-1, 15)
+
+    def save(self, path, key, video_info):
+        """
+        保存为列式npz文件
+
+        Args:
+            path (str): 输出文件路径
+            key (dict): 缓存键（模型哈希和检测参数）
+            video_info (dict): 视频信息（帧数、宽高），回放时用于校验
+        """
+        frame_count = max(self.frames) + 1 if self.frames else 0
+        empty = np.empty((0, 15), dtype=np.float32)
+        per_frame = [self.frames.get(i, empty) for i in range(frame_count)]
+
+        counts = np.array([len(d) for d in per_frame], dtype=np.int64)
+        frame_offsets = np.zeros(frame_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=frame_offsets[1:])
+        detections = np.concatenate(per_frame) if per_frame else empty
+
+        meta = {'version': SIDECAR_VERSION, 'key': key, 'video': video_info}
+        # 写入临时文件再替换，避免中断时留下损坏的缓存
+        temp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            temp_path,
+            frame_offsets=frame_offsets,
+            boxes=detections[:, :4],
+            landmarks=detections[:, 4:14],
+            scores=detections[:, 14],
+            meta=np.array(json.dumps(meta, sort_keys=True))
+        )
+        os.replace(temp_path, path)
+        print(f"检测结果已保存: {path} ({frame_count}帧, {len(detections)}个检测框)")
+
+
+class DetectionSidecar:
+    """
+    读取检测结果缓存，按帧序号回放原始检测结果
+    """
+
+    def __init__(self, path):
+        """
+        加载缓存文件
+
+        Args:
+            path (str): 缓存文件路径
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"检测结果缓存不存在: {path}")
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != SIDECAR_VERSION:
+                raise ValueError(f"不支持的检测结果缓存版本: {meta.get('version')}")
+            self.frame_offsets = data['frame_offsets']
+            detections = np.empty((len(data['scores']), 15), dtype=np.float32)
+            detections[:, :4] = data['boxes']
+            detections[:, 4:14] = data['landmarks']
+            detections[:, 14] = data['scores']
+        self.path = path
+        self.detections = detections
+        self.key = meta['key']
+        self.video_info = meta['video']
+
+    @property
+    def frame_count(self):
+        """缓存中的帧数"""
+        return len(self.frame_offsets) - 1
+
+    def matches(self, key, video_info=None):
+        """
+        检查缓存是否与当前检测配置（以及视频）一致
+
+        Args:
+            key (dict): 当前的缓存键
+            video_info (dict): 当前视频信息，为None时不校验
+
+        Returns:
+            bool: 是否一致
+        """
+        return self.key == key and (video_info is None or self.video_info == video_info)
+
+    def frame_detections(self, index):
+        """
+        取出一帧的原始检测结果
+
+        Args:
+            index (int): 帧序号
+
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的检测结果，超出范围时为空数组
+        """
+        if index < 0 or index >= self.frame_count:
+            return np.empty((0, 15), dtype=np.float32)
+        return self.detections[self.frame_offsets[index]:self.frame_offsets[index + 1]]
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检测器注册表
+按名称延迟导入检测器后端：只有被选中的后端才会导入对应模块。
+DeepFace会连带导入TensorFlow，耗时数秒并占用数百MB内存，默认的YuNet路径不应承担这部分开销。
+"""
+
+import importlib
+import importlib.util
+
+# 检测器名称 -> (模块名, 类名, 是否需要DeepFace)
+DETECTORS = {
+    'yunet': ('face_detector', 'VideoFaceDetector', False),
+    'deepface': ('deepface_detector', 'HybridFaceDetector', True),
+    'hybrid': ('deepface_detector', 'HybridFaceDetector', True)
+}
+
+
+def deepface_installed():
+    """
+    检查DeepFace是否已安装（只查找包，不导入）
+
+    Returns:
+        bool: DeepFace是否已安装
+    """
+    return importlib.util.find_spec('deepface') is not None
+
+
+def load_detector_class(name):
+    """
+    导入并返回检测器类
+
+    Args:
+        name (str): 检测器名称（'yunet'、'deepface'、'hybrid'）
+
+    Returns:
+        type: 检测器类
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"未知的检测器类型: {name}")
+    module_name, class_name, _ = DETECTORS[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def deepface_available():
+    """
+    检查DeepFace是否真正可用（会导入deepface_detector，仅在选中DeepFace相关检测器时调用）
+
+    Returns:
+        bool: DeepFace是否可以导入
+    """
+    if not deepface_installed():
+        return False
+    return importlib.import_module('deepface_detector').DEEPFACE_AVAILABLE
+
+
+def create_detector(name='yunet', model_path=None, continuation_frames=5, deepface_backend='mtcnn',
+                    **detector_kwargs):
+    """
+    按名称创建检测器，只导入所选后端
+
+    Args:
+        name (str): 检测器名称（'yunet'、'deepface'、'hybrid'）
+        model_path (str): 自定义YuNet模型文件路径
+        continuation_frames (int): 无人脸时延续打码的最大帧数
+        deepface_backend (str): DeepFace检测后端
+        **detector_kwargs: 传给VideoFaceDetector的其他参数（如multi_scale、detect_size）
+
+    Returns:
+        VideoFaceDetector: 检测器实例
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"未知的检测器类型: {name}")
+
+    if name == 'deepface':
+        if not deepface_available():
+            raise RuntimeError("DeepFace不可用，请先安装DeepFace或选择其他检测器（pip install deepface）")
+        print(f"初始化DeepFace检测器 - 后端: {deepface_backend}...")
+        return load_detector_class(name)(primary_backend=deepface_backend, enable_deepface=True,
+                                         continuation_frames=continuation_frames, **detector_kwargs)
+
+    if name == 'hybrid':
+        if deepface_available():
+            print(f"初始化混合检测器（YuNet + DeepFace） - DeepFace后端: {deepface_backend}...")
+            return load_detector_class(name)(primary_backend='yunet', enable_deepface=True,
+                                             deepface_backend=deepface_backend,
+                                             continuation_frames=continuation_frames, **detector_kwargs)
+        print("错误: DeepFace不可用，回退到YuNet检测器")
+
+    print("初始化YuNet人脸检测器...")
+    return load_detector_class('yunet')(model_path=model_path, continuation_frames=continuation_frames,
+                                        **detector_kwargs)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理事件日志
+替代处理循环中的逐帧print：基于logging分级输出，重复消息限速并在结束时汇总，
+进度以结构化事件（字典）发送给订阅者。默认订阅者输出"处理进度"文本行；
+jsonl格式下每个事件输出为一行JSON（帧数、fps、预计剩余时间、各阶段累计耗时、人脸数），供GUI直接解析；
+此时其余供人阅读的输出改到标准错误，标准输出中只有JSON事件。
+"""
+
+import json
+import logging
+import sys
+import time
+
+LOGGER_NAME = 'face_mosaic'
+
+# jsonl事件的输出流（reserve_stdout_for_events()之后为原来的标准输出），为None时使用当前的sys.stdout
+_event_stream = None
+
+
+def get_logger():
+    """
+    获取处理日志记录器，首次调用时添加输出到stdout的处理器（只输出消息本身，与原来的print一致）
+
+    Returns:
+        logging.Logger: 日志记录器
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def set_log_level(level):
+    """
+    设置处理日志级别
+
+    Args:
+        level (str): 'debug'、'info'、'warning' 或 'error'
+    """
+    get_logger().setLevel(getattr(logging, level.upper()))
+
+
+def reserve_stdout_for_events():
+    """
+    让标准输出只包含jsonl事件：之后的print和处理日志改为输出到标准错误，jsonl事件仍写到原来的标准输出，
+    读取标准输出的程序逐行解析即可，不会混入普通文本
+    """
+    global _event_stream
+    if _event_stream is not None:
+        return
+    _event_stream = sys.stdout
+    sys.stdout = sys.stderr
+    for handler in get_logger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream is _event_stream:
+            handler.setStream(sys.stderr)
+
+
+def text_progress_sink(event):
+    """
+    默认进度订阅者：输出"处理进度: 12.5% (30/240)"文本行
+
+    Args:
+        event (dict): 进度事件
+    """
+    if event['event'] == 'progress':
+        get_logger().info(f"处理进度: {event['percent']:.1f}% ({event['processed']}/{event['total']})")
+
+
+def jsonl_sink(event):
+    """
+    JSON Lines订阅者：每个事件输出一行JSON并立即刷新
+
+    Args:
+        event (dict): 事件
+    """
+    stream = _event_stream or sys.stdout
+    stream.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+    stream.flush()
+
+
+PROGRESS_FORMATS = {
+    'text': text_progress_sink,
+    'jsonl': jsonl_sink
+}
+
+
+def create_event_log(progress_format='text', progress_interval=None):
+    """
+    按输出格式创建事件日志
+
+    Args:
+        progress_format (str): 'text'（"处理进度"文本行）或 'jsonl'（每行一个JSON事件）
+        progress_interval (float): 进度事件的最短间隔（秒）；为None时text每30帧一次，jsonl每0.5秒一次
+
+    Returns:
+        EventLog: 事件日志
+    """
+    if progress_format not in PROGRESS_FORMATS:
+        raise ValueError(f"不支持的进度格式: {progress_format}")
+    if progress_interval is None and progress_format == 'jsonl':
+        progress_interval = 0.5
+    return EventLog(progress_interval=progress_interval, sinks=[PROGRESS_FORMATS[progress_format]])
+
+
+class EventLog:
+    """
+    一次处理过程的事件日志
+    - progress(): 按帧间隔或时间间隔限速的进度事件，发送给所有订阅者
+    - repeated(): 重复出现的消息，按时间间隔限速输出并累计次数，finish()时输出汇总
+    """
+
+    def __init__(self, progress_every=30, progress_interval=None, repeat_interval=1.0, sinks=None):
+        """
+        初始化事件日志
+
+        Args:
+            progress_every (int): 每处理多少帧发送一次进度事件
+            progress_interval (float): 设置时改为按时间限速：两次进度事件之间的最短间隔（秒）
+            repeat_interval (float): 同一重复消息两次输出之间的最短间隔（秒）
+            sinks (list): 进度事件订阅者，为None时使用文本输出
+        """
+        self.logger = get_logger()
+        self.progress_every = max(1, progress_every)
+        self.progress_interval = progress_interval
+        self.repeat_interval = repeat_interval
+        self.sinks = list(sinks) if sinks is not None else [text_progress_sink]
+        self.reset()
+
+    def reset(self, timer=None):
+        """
+        开始新的处理过程：清空计数和限速状态
+
+        Args:
+            timer (StageTimer): 本次处理的分阶段计时器，进度事件中附带各阶段累计耗时
+        """
+        self.timer = timer
+        self.start_time = time.perf_counter()
+        self.last_progress = 0
+        self.last_progress_time = self.start_time
+        self.repeats = {}
+
+    def emit(self, event):
+        """
+        发送结构化事件给所有订阅者
+
+        Args:
+            event (dict): 事件，'event'字段为事件类型
+        """
+        for sink in self.sinks:
+            sink(event)
+
+    def progress(self, processed, total, counters=None, force=False):
+        """
+        报告处理进度，按帧间隔或时间间隔限速（force时立即发送）
+
+        Args:
+            processed (int): 已处理帧数
+            total (int): 总帧数
+            counters (dict): 处理统计计数器，附带已检测到人脸的帧数和人脸数
+            force (bool): 忽略间隔立即发送（如处理结束时）
+        """
+        if processed == self.last_progress:
+            return
+        now = time.perf_counter()
+        if not force:
+            if self.progress_interval is not None:
+                if now - self.last_progress_time < self.progress_interval:
+                    return
+            elif processed - self.last_progress < self.progress_every:
+                return
+        self.last_progress = processed
+        self.last_progress_time = now
+        elapsed = now - self.start_time
+        fps = processed / elapsed if elapsed > 0 else 0.0
+        event = {
+            'event': 'progress',
+            'processed': processed,
+            'total': total,
+            'percent': processed / total * 100 if total > 0 else 0.0,
+            'elapsed': elapsed,
+            'fps': fps,
+            'eta': (total - processed) / fps if fps > 0 and total > processed else 0.0
+        }
+        if counters is not None:
+            event['frames_with_faces'] = counters['frames_with_faces']
+            event['faces_detected'] = counters['total_faces_detected']
+        if self.timer is not None:
+            event['stages'] = self.timer.totals()
+        self.emit(event)
+
+    def repeated(self, key, message, summary, level=logging.DEBUG):
+        """
+        记录一条可能逐帧重复的消息：累计次数，按repeat_interval限速输出，其余合并到汇总
+
+        Args:
+            key (str): 消息类别
+            message (str): 本次的消息文本
+            summary (str): 汇总文本模板，可使用{count}，如 "延续打码: 共{count}帧"
+            level (int): 逐条消息的日志级别（默认DEBUG，即默认只输出汇总）
+        """
+        state = self.repeats.get(key)
+        if state is None:
+            state = self.repeats[key] = {'count': 0, 'suppressed': 0, 'last_time': None, 'summary': summary}
+        state['count'] += 1
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.perf_counter()
+        if state['last_time'] is not None and now - state['last_time'] < self.repeat_interval:
+            state['suppressed'] += 1
+            return
+        suffix = f" (期间另有{state['suppressed']}条)" if state['suppressed'] else ''
+        state['last_time'] = now
+        state['suppressed'] = 0
+        self.logger.log(level, message + suffix)
+
+    def counts(self):
+        """
+        各类重复消息的累计次数
+
+        Returns:
+            dict: 类别 -> 次数
+        """
+        return {key: state['count'] for key, state in self.repeats.items()}
+
+    def finish(self):
+        """处理结束：输出各类重复消息的汇总"""
+        for state in self.repeats.values():
+            self.logger.info(state['summary'].format(count=state['count']))
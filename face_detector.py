@@ -1,7 +1,16 @@
 import cv2
+import functools
 import numpy as np
 import os
 import time
+import threading
+from collections import deque
+
+from face_tracking import OpticalFlowPropagator, MultiFaceTracker, LookaheadGapFiller, MotionGate
+from event_log import EventLog
+from stage_timing import StageTimer
+from model_selector import resolve_model_path
+from roi_detection import RoiDetectionPolicy, RoiMosaic, inference_area
 
 def get_codec_fourcc(codec_name):
     """
@@ -27,6 +36,283 @@ def get_codec_fourcc(codec_name):
         # 默认返回H.264
         return codec_map['h264']
 
+def open_video_writer(output_path, codec, fps, width, height, input_fourcc=0, input_codec=''):
+    """
+    按编码器设置创建输出视频写入器，失败时依次尝试备用编码器
+    
+    Args:
+        output_path (str): 输出视频文件路径
+        codec (str): 输出视频编码器
+        fps (int): 帧率
+        width (int): 帧宽度
+        height (int): 帧高度
+        input_fourcc (int): 输入视频的fourcc代码
+        input_codec (str): 输入视频的编码器名称
+        
+    Returns:
+        cv2.VideoWriter: 已打开的视频写入器
+    """
+    out = None
+    if codec == 'auto':
+        # 自动模式：首先尝试使用与输入视频相同的编码器
+        if input_fourcc != 0:  # 确保获取到了有效的编码器信息
+            print(f"自动模式：尝试使用输入视频的编码器: {input_codec}")
+            out = cv2.VideoWriter(output_path, input_fourcc, fps, (width, height))
+        
+        # 如果输入编码器不可用，按优先级尝试常用编码器
+        fallback_codecs = ['h264', 'xvid', 'mp4v']
+        for fallback_codec in fallback_codecs:
+            if not out or not out.isOpened():
+                fourcc, codec_desc = get_codec_fourcc(fallback_codec)
+                print(f"尝试使用 {codec_desc} 编码器")
+                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+                if out.isOpened():
+                    print(f"成功初始化 {codec_desc} 编码器")
+                    break
+    else:
+        # 指定编码器模式
+        fourcc, codec_desc = get_codec_fourcc(codec)
+        print(f"使用指定的 {codec_desc} 编码器")
+        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        
+        # 如果指定的编码器不可用，尝试备用编码器
+        if not out.isOpened():
+            print(f"{codec_desc} 编码器不可用，尝试备用编码器")
+            fallback_codecs = ['h264', 'xvid', 'mp4v']
+            for fallback_codec in fallback_codecs:
+                if fallback_codec != codec:  # 跳过已经尝试过的编码器
+                    fourcc, fallback_desc = get_codec_fourcc(fallback_codec)
+                    print(f"尝试使用备用 {fallback_desc} 编码器")
+                    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+                    if out.isOpened():
+                        print(f"成功初始化备用 {fallback_desc} 编码器")
+                        break
+    
+    # 检查编码器是否成功初始化
+    if not out or not out.isOpened():
+        raise ValueError(f"无法初始化任何视频编码器，请检查输出路径和系统编码器支持: {output_path}")
+    
+    return out
+
+# 椭圆遮罩尺寸的量化步长（像素）：跟踪抖动导致的细微尺寸变化共用同一个基础遮罩
+MASK_QUANTUM = 8
+
+
+@functools.lru_cache(maxsize=128)
+def _quantised_ellipse_mask(width, height):
+    """
+    绘制量化尺寸的椭圆遮罩
+    
+    Args:
+        width (int): 遮罩宽度（量化后）
+        height (int): 遮罩高度（量化后）
+        
+    Returns:
+        numpy.ndarray: 形状为(height, width)的只读uint8遮罩，椭圆内为255
+    """
+    mask = np.zeros((height, width), dtype=np.uint8)
+    
+    # 计算椭圆中心和轴长
+    center_x = width // 2
+    center_y = height // 2
+    # 椭圆的半轴长度，扩大10%以更好地遮挡面部
+    axis_x = int(width * 0.50)  # 水平半轴（从45%增加到50%）
+    axis_y = int(height * 0.66)  # 垂直半轴（从60%增加到66%），人脸通常是竖向的椭圆
+    
+    # 绘制填充的椭圆遮罩
+    cv2.ellipse(mask, (center_x, center_y), (axis_x, axis_y), 0, 0, 360, 255, -1)
+    mask.flags.writeable = False
+    return mask
+
+
+@functools.lru_cache(maxsize=512)
+def ellipse_mask(width, height):
+    """
+    获取指定尺寸的椭圆遮罩（LRU缓存）
+    先按MASK_QUANTUM量化尺寸取得基础遮罩，再用最近邻缩放到精确尺寸
+    
+    Args:
+        width (int): 遮罩宽度
+        height (int): 遮罩高度
+        
+    Returns:
+        numpy.ndarray: 形状为(height, width)的只读uint8遮罩，椭圆内为255
+    """
+    quantised_w = -(-width // MASK_QUANTUM) * MASK_QUANTUM
+    quantised_h = -(-height // MASK_QUANTUM) * MASK_QUANTUM
+    mask = _quantised_ellipse_mask(quantised_w, quantised_h)
+    if (quantised_w, quantised_h) != (width, height):
+        mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
+        mask.flags.writeable = False
+    return mask
+
+
+class MultiScaleFallbackPolicy:
+    """
+    多尺度回退检测的自适应策略
+    在滑动窗口内统计回退检测的命中率：命中率持续过低时（例如无人脸的空镜头），
+    只尝试近期命中过的尺度或直接跳过，并定期做一次完整探测；
+    同时支持单帧时间预算，并统计每个尺度的实际命中次数
+    """
+    
+    MODES = ('adaptive', 'always', 'off')
+    
+    def __init__(self, scales=((160, 160), (240, 240), (480, 480)), mode='adaptive', window=60,
+                 min_hit_rate=0.05, min_samples=10, probe_interval=15, time_budget_ms=None):
+        """
+        初始化回退策略
+        
+        Args:
+            scales (tuple): 依次尝试的检测尺寸 (宽, 高)
+            mode (str): 'adaptive'（自适应）、'always'（每次尝试全部尺度）或 'off'（关闭回退检测）
+            window (int): 统计命中率的滑动窗口大小（回退检测次数）
+            min_hit_rate (float): 命中率低于该值时开始精简回退尺度
+            min_samples (int): 窗口内样本数少于该值时不做精简
+            probe_interval (int): 精简状态下每隔多少次回退做一次完整探测
+            time_budget_ms (float): 单帧回退检测的时间预算（毫秒），None表示不限制
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的多尺度回退模式: {mode}")
+        
+        self.scales = [tuple(scale) for scale in scales]
+        self.mode = mode
+        self.window = window
+        self.min_hit_rate = min_hit_rate
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self.time_budget_ms = time_budget_ms
+        
+        # 多线程流水线中多个检测线程共享同一个策略实例
+        self._lock = threading.Lock()
+        
+        self.reset()
+    
+    def reset(self):
+        """
+        清空统计信息和滑动窗口
+        """
+        # 窗口内每次回退检测的结果：命中的尺度序号，未命中为-1
+        self.history = deque(maxlen=self.window)
+        self.since_probe = 0
+        # 每个尺度单次检测耗时的指数滑动平均（秒），用于时间预算判断
+        self.scale_cost = [0.0] * len(self.scales)
+        self.stats = {
+            'invocations': 0,
+            'skipped': 0,
+            'thinned': 0,
+            'budget_exhausted': 0,
+            'scale_attempts': [0] * len(self.scales),
+            'scale_hits': [0] * len(self.scales)
+        }
+    
+    @property
+    def hit_rate(self):
+        """滑动窗口内的命中率"""
+        if not self.history:
+            return 1.0
+        return sum(1 for hit in self.history if hit >= 0) / len(self.history)
+    
+    def plan(self):
+        """
+        决定本次回退检测要尝试的尺度
+        
+        Returns:
+            list: 尺度序号列表，为空表示跳过本次回退检测
+        """
+        with self._lock:
+            self.stats['invocations'] += 1
+            all_scales = list(range(len(self.scales)))
+        
+            if self.mode == 'off':
+                self.stats['skipped'] += 1
+                return []
+            if self.mode == 'always' or len(self.history) < self.min_samples or self.hit_rate >= self.min_hit_rate:
+                return all_scales
+        
+            # 命中率过低：定期完整探测，其余时间只尝试近期命中过的尺度
+            self.since_probe += 1
+            if self.since_probe >= self.probe_interval:
+                self.since_probe = 0
+                return all_scales
+        
+            recent_hits = sorted(set(hit for hit in self.history if hit >= 0))
+            if recent_hits:
+                self.stats['thinned'] += 1
+            else:
+                self.stats['skipped'] += 1
+            return recent_hits
+    
+    def within_budget(self, elapsed, scale_index):
+        """
+        判断在已用时间下是否还能尝试指定尺度
+        
+        Args:
+            elapsed (float): 本帧回退检测已用时间（秒）
+            scale_index (int): 尺度序号
+            
+        Returns:
+            bool: 是否在预算内
+        """
+        with self._lock:
+            if self.time_budget_ms is None:
+                return True
+            if elapsed + self.scale_cost[scale_index] <= self.time_budget_ms / 1000.0:
+                return True
+            self.stats['budget_exhausted'] += 1
+            return False
+    
+    def record_attempt(self, scale_index, cost, hit):
+        """
+        记录单个尺度的检测结果
+        
+        Args:
+            scale_index (int): 尺度序号
+            cost (float): 检测耗时（秒）
+            hit (bool): 是否检测到人脸
+        """
+        with self._lock:
+            self.stats['scale_attempts'][scale_index] += 1
+            if hit:
+                self.stats['scale_hits'][scale_index] += 1
+            previous = self.scale_cost[scale_index]
+            self.scale_cost[scale_index] = cost if previous == 0.0 else 0.8 * previous + 0.2 * cost
+    
+    def record_result(self, scale_index):
+        """
+        记录一次实际执行的回退检测的最终结果
+        
+        Args:
+            scale_index (int): 命中的尺度序号，未命中为-1
+        """
+        with self._lock:
+            self.history.append(scale_index)
+    
+    def summary(self):
+        """
+        汇总回退检测统计
+        
+        Returns:
+            dict: 调用次数、跳过/精简次数及每个尺度的尝试和命中次数
+        """
+        per_scale = {}
+        for index, (scale_w, scale_h) in enumerate(self.scales):
+            attempts = self.stats['scale_attempts'][index]
+            hits = self.stats['scale_hits'][index]
+            per_scale[f"{scale_w}x{scale_h}"] = {
+                'attempts': attempts,
+                'hits': hits,
+                'hit_rate': hits / attempts if attempts > 0 else 0.0
+            }
+        return {
+            'mode': self.mode,
+            'invocations': self.stats['invocations'],
+            'skipped': self.stats['skipped'],
+            'thinned': self.stats['thinned'],
+            'budget_exhausted': self.stats['budget_exhausted'],
+            'window_hit_rate': self.hit_rate,
+            'scales': per_scale
+        }
+
 class VideoFaceDetector:
     """
     视频人脸检测器类
@@ -34,21 +320,29 @@ class VideoFaceDetector:
     使用YuNet深度学习人脸检测模型，支持人脸跟踪以减少马赛克抖动
     """
     
-    def __init__(self, model_path=None, continuation_frames=5):
+    def __init__(self, model_path=None, continuation_frames=5, detect_size=None, detect_interval=1,
+                 multi_scale='adaptive', multi_scale_budget_ms=None, motion_gate=0, roi_detection=0):
         """
         初始化视频人脸检测器
         
         Args:
-            model_path (str): YuNet模型文件路径，如果为None则使用默认路径
+            model_path (str): YuNet模型文件路径，或模型变体名称'fp32'、'int8'、'int8bq'；
+                              为None时使用本机测量结果缓存中的变体（没有缓存时为fp32），
+                              为'auto'时没有缓存则先测量各变体再选择（见model_selector.py）
             continuation_frames (int): 无人脸时延续打码的最大帧数，默认为5帧
+            detect_size (int): 检测分辨率（长边像素数），帧会先缩小到该尺寸再送入YuNet，
+                               检测结果映射回原始坐标；为None或0时使用原始分辨率
+            detect_interval (int): 关键帧检测间隔，每N帧运行一次完整检测，
+                                   中间帧用光流传播人脸框；为1时每帧都检测
+            multi_scale (str): 多尺度回退检测策略：'adaptive'（默认，命中率低时自动精简）、
+                               'always'（每个无人脸帧都尝试全部尺度）或 'off'
+            multi_scale_budget_ms (float): 单帧多尺度回退检测的时间预算（毫秒），None表示不限制
+            motion_gate (int): 运动门控：画面静止时沿用上一次的检测结果，最多连续跳过N帧检测；0表示每帧检测
+            roi_detection (int): 跟踪区域检测：已有人脸轨迹时只在预测位置周围的区域内检测，
+                                 每N次检测（或镜头切换时）做一次全画面检测；0表示始终全画面检测
         """
-        # 设置模型路径
-        if model_path is None:
-            # 使用默认的YuNet模型路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            self.model_path = os.path.join(current_dir, "models", "face_detection_yunet_2023mar.onnx")
-        else:
-            self.model_path = model_path
+        # 设置模型路径：None时使用本机测量结果缓存中的fp32/int8/int8bq变体（没有缓存时为fp32），'auto'时必要时先测量
+        self.model_path = resolve_model_path(model_path, detect_size)
             
         # 检查模型文件是否存在
         if not os.path.exists(self.model_path):
@@ -65,21 +359,175 @@ class VideoFaceDetector:
             nms_threshold=0.3,
             top_k=5000
         )
+        # 当前检测器的输入尺寸，避免每帧重复调用setInputSize
+        self._input_size = (320, 320)
+        
+        # 检测分辨率（长边），None表示使用原始分辨率
+        self.detect_size = detect_size
         
-        # 人脸跟踪相关变量
-        self.face_history = []  # 存储最近几帧的人脸位置
-        self.history_length = 5  # 保持最近5帧的历史记录
-        self.tracking_threshold = 50  # 人脸位置变化阈值
+        # 最近一次检测的原始结果（已映射回原始坐标），形状为(N, 15)：
+        # [x, y, w, h, 右眼x, 右眼y, 左眼x, 左眼y, 鼻尖x, 鼻尖y, 右嘴角x, 右嘴角y, 左嘴角x, 左嘴角y, 置信度]
+        self.last_detections = np.empty((0, 15), dtype=np.float32)
         
-        # 无人脸时的延续打码策略
-        self.last_detected_faces = []  # 最后一次检测到的人脸坐标
-        self.no_face_frame_count = 0  # 连续无人脸的帧数
+        # 多尺度回退检测策略
+        self.multi_scale_policy = MultiScaleFallbackPolicy(mode=multi_scale, time_budget_ms=multi_scale_budget_ms)
+        
+        # 多人脸跟踪：每个人脸一条轨迹，检测不到时该人脸单独延续打码
         self.max_continuation_frames = max(1, continuation_frames)  # 最大延续打码帧数，至少为1帧
+        self.tracker = MultiFaceTracker(max_misses=self.max_continuation_frames)
+        self.last_track_ids = np.empty(0, dtype=np.int64)     # 最近一帧输出人脸框对应的轨迹编号
+        self.last_track_misses = np.empty(0, dtype=np.int32)  # 以及各自连续未检测到的帧数
+        
+        # 前瞻补帧（离线处理）：缓冲的帧数，0表示不启用
+        self.lookahead_frames = 0
+        
+        # 关键帧检测策略：每detect_interval帧检测一次，中间帧用光流传播
+        self.detect_interval = max(1, detect_interval)
+        self.propagator = OpticalFlowPropagator()
+        self.frames_since_keyframe = 0
+        self.keyframe_stats = {'keyframes': 0, 'propagated_frames': 0, 'forced_redetections': 0}
+        
+        # 运动门控：静止画面跳过检测，沿用上一次的检测结果
+        self.motion_gate = MotionGate(max_skip=motion_gate) if motion_gate > 0 else None
+        self.gated_faces = []
+        
+        # 跟踪区域检测：在轨迹预测位置周围的拼接小图上检测，定期全画面检测
+        self.roi_policy = RoiDetectionPolicy(full_scan_interval=roi_detection) if roi_detection > 0 else None
+        
+        # 分阶段计时：多尺度回退的累计耗时单独统计，从检测阶段中扣除
+        self.multi_scale_time = 0.0
+        self.continuation_frames = 0
+        
+        # 多线程流水线的检测线程不做多尺度回退，只标记待回退，由按帧序的跟踪阶段执行，
+        # 自适应回退策略因此按帧序更新，与串行处理一致
+        self.defer_multi_scale = False
+        self.multi_scale_pending = False
+        self.stage_timer = StageTimer()
+        
+        # 处理事件日志：进度事件和限速的逐帧消息
+        self.events = EventLog()
+        
+        # 逐帧回调：每帧渲染并写入后调用，用于界面缩略图预览
+        self.frame_callback = None
+    
+    def reset_tracking_state(self):
+        """
+        重置跨帧的跟踪状态，处理新视频前调用
+        """
+        self.tracker.max_misses = max(self.max_continuation_frames, self.lookahead_frames)
+        self.tracker.reset()
+        self.last_track_ids = np.empty(0, dtype=np.int64)
+        self.last_track_misses = np.empty(0, dtype=np.int32)
+        self.propagator.reset()
+        self.multi_scale_policy.reset()
+        self.frames_since_keyframe = 0
+        self.keyframe_stats = {'keyframes': 0, 'propagated_frames': 0, 'forced_redetections': 0}
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        self.gated_faces = []
+        if self.roi_policy is not None:
+            self.roi_policy.reset()
+        self.continuation_frames = 0
+    
+    def _set_input_size(self, size):
+        """
+        设置YuNet输入尺寸，尺寸未变化时跳过
+        
+        Args:
+            size (tuple): (宽, 高)
+        """
+        if size != self._input_size:
+            self.detector.setInputSize(size)
+            self._input_size = size
+    
+    def _run_yunet(self, image, scale_x=1.0, scale_y=1.0):
+        """
+        在给定图像上运行一次YuNet，并将结果按比例映射回原始坐标
+        
+        Args:
+            image (numpy.ndarray): 送入检测器的图像
+            scale_x (float): 水平方向映射比例（原始宽度 / 图像宽度）
+            scale_y (float): 垂直方向映射比例（原始高度 / 图像高度）
+            
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的检测结果，坐标已映射回原始尺寸
+        """
+        height, width = image.shape[:2]
+        self._set_input_size((width, height))
+        _, faces = self.detector.detect(image)
+        
+        if faces is None or len(faces) == 0:
+            return np.empty((0, 15), dtype=np.float32)
+        
+        faces = faces.astype(np.float32, copy=True)
+        if scale_x != 1.0 or scale_y != 1.0:
+            # 偶数列为x坐标/宽度，奇数列为y坐标/高度，最后一列为置信度
+            faces[:, 0:14:2] *= scale_x
+            faces[:, 1:14:2] *= scale_y
+        return faces
+    
+    def _prepare_detection_input(self, frame):
+        """
+        按检测分辨率缩小帧
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            
+        Returns:
+            tuple: (检测用图像, 水平映射比例, 垂直映射比例)
+        """
+        height, width = frame.shape[:2]
+        longest = max(width, height)
+        
+        # 未设置检测分辨率或原图已足够小时直接使用原图，不做放大
+        if not self.detect_size or longest <= self.detect_size:
+            return frame, 1.0, 1.0
+        
+        scale = self.detect_size / longest
+        det_w = max(1, int(round(width * scale)))
+        det_h = max(1, int(round(height * scale)))
+        det_frame = cv2.resize(frame, (det_w, det_h), interpolation=cv2.INTER_AREA)
+        return det_frame, width / det_w, height / det_h
+    
+    @staticmethod
+    def _detections_to_boxes(detections):
+        """
+        将原始检测结果转换为人脸矩形框列表
+        
+        Args:
+            detections (numpy.ndarray): 形状为(N, 15)的检测结果
+            
+        Returns:
+            list: 人脸矩形框列表，每个元素为(x, y, w, h)
+        """
+        return [tuple(int(v) for v in box) for box in detections[:, :4].astype(int)]
+    
+    @staticmethod
+    def _boxes_to_detections(boxes, score=1.0):
+        """
+        将人脸矩形框列表转换为(N, 15)格式的检测结果
+        没有关键点信息时，关键点统一填为人脸框中心
+        
+        Args:
+            boxes (list): 人脸矩形框列表，每个元素为(x, y, w, h)
+            score (float): 填充的置信度
+            
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的检测结果
+        """
+        detections = np.zeros((len(boxes), 15), dtype=np.float32)
+        if len(boxes) > 0:
+            detections[:, :4] = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+            detections[:, 4:14:2] = (detections[:, 0] + detections[:, 2] / 2.0)[:, None]
+            detections[:, 5:14:2] = (detections[:, 1] + detections[:, 3] / 2.0)[:, None]
+            detections[:, 14] = score
+        return detections
     
     def detect_faces_in_frame(self, frame):
         """
         在单帧图像中检测人脸
         使用多尺度检测提高侧脸检测效果
+        设置了检测分辨率时，帧只缩小一次，YuNet在固定尺寸上运行，结果映射回原始坐标
         
         Args:
             frame (numpy.ndarray): 输入的图像帧
@@ -87,28 +535,22 @@ class VideoFaceDetector:
         Returns:
             list: 检测到的人脸矩形框列表，每个元素为(x, y, w, h)
         """
-        # 获取图像尺寸
-        height, width = frame.shape[:2]
-        
-        # 设置检测器的输入尺寸为当前帧的尺寸
-        self.detector.setInputSize((width, height))
+        # 按检测分辨率缩小图像
+        det_frame, scale_x, scale_y = self._prepare_detection_input(frame)
         
         # 使用YuNet检测人脸
-        _, faces = self.detector.detect(frame)
-        
-        face_boxes = []
-        if faces is not None:
-            for face in faces:
-                # YuNet返回的格式: [x, y, w, h, x_re, y_re, x_le, y_le, x_nt, y_nt, x_rcm, y_rcm, x_lcm, y_lcm]
-                # 我们只需要前4个值: x, y, w, h
-                x, y, w, h = face[:4].astype(int)
-                face_boxes.append((x, y, w, h))
+        detections = self._run_yunet(det_frame, scale_x, scale_y)
         
         # 如果没有检测到人脸，尝试多尺度检测
-        if len(face_boxes) == 0:
-            face_boxes = self._multi_scale_detection(frame)
+        self.multi_scale_pending = len(detections) == 0 and self.defer_multi_scale
+        if len(detections) == 0 and not self.defer_multi_scale:
+            detections = self._multi_scale_detection_raw(frame)
         
-        return face_boxes
+        self.last_detections = detections
+        
+        # YuNet返回的格式: [x, y, w, h, x_re, y_re, x_le, y_le, x_nt, y_nt, x_rcm, y_rcm, x_lcm, y_lcm, score]
+        # 我们只需要前4个值: x, y, w, h
+        return self._detections_to_boxes(detections)
     
     def _multi_scale_detection(self, frame):
         """
@@ -120,120 +562,218 @@ class VideoFaceDetector:
         Returns:
             list: 检测到的人脸矩形框列表
         """
-        face_boxes = []
+        return self._detections_to_boxes(self._multi_scale_detection_raw(frame))
+    
+    def _multi_scale_detection_raw(self, frame):
+        """
+        多尺度人脸检测，返回映射回原始坐标的完整检测结果
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的检测结果
+        """
         height, width = frame.shape[:2]
+        policy = self.multi_scale_policy
         
-        # 尝试不同的输入尺寸进行检测
-        scales = [(160, 160), (240, 240), (480, 480)]
+        # 由回退策略决定本次尝试的尺度（命中率过低时精简或跳过）
+        scale_indices = policy.plan()
+        if not scale_indices:
+            return np.empty((0, 15), dtype=np.float32)
         
-        for scale_w, scale_h in scales:
+        start_time = time.perf_counter()
+        for scale_index in scale_indices:
+            # 超出单帧时间预算时停止尝试更大的尺度
+            if not policy.within_budget(time.perf_counter() - start_time, scale_index):
+                break
+            
+            scale_w, scale_h = policy.scales[scale_index]
+            attempt_start = time.perf_counter()
             try:
-                # 调整检测器输入尺寸
-                self.detector.setInputSize((scale_w, scale_h))
-                
                 # 缩放图像到检测尺寸
                 resized_frame = cv2.resize(frame, (scale_w, scale_h))
                 
-                # 检测人脸
-                _, faces = self.detector.detect(resized_frame)
-                
-                if faces is not None:
-                    # 将检测结果缩放回原始尺寸
-                    scale_x = width / scale_w
-                    scale_y = height / scale_h
-                    
-                    for face in faces:
-                        x, y, w, h = face[:4].astype(int)
-                        # 缩放坐标回原始尺寸
-                        x = int(x * scale_x)
-                        y = int(y * scale_y)
-                        w = int(w * scale_x)
-                        h = int(h * scale_y)
-                        face_boxes.append((x, y, w, h))
-                    
-                    # 如果找到人脸就停止尝试其他尺度
-                    if len(face_boxes) > 0:
-                        break
-                        
+                # 检测人脸，并将检测结果缩放回原始尺寸
+                detections = self._run_yunet(resized_frame, width / scale_w, height / scale_h)
             except Exception as e:
                 # 如果某个尺度检测失败，继续尝试下一个
                 continue
+            
+            policy.record_attempt(scale_index, time.perf_counter() - attempt_start, len(detections) > 0)
+            
+            # 如果找到人脸就停止尝试其他尺度
+            if len(detections) > 0:
+                policy.record_result(scale_index)
+                self.multi_scale_time += time.perf_counter() - start_time
+                return detections
+        
+        policy.record_result(-1)
+        self.multi_scale_time += time.perf_counter() - start_time
+        return np.empty((0, 15), dtype=np.float32)
+    
+    def detect_or_propagate(self, frame):
+        """
+        关键帧检测：每detect_interval帧运行一次完整检测，
+        中间帧使用光流传播上一帧的人脸框，跟踪置信度下降时强制重新检测；
+        启用运动门控时，画面相对上一次检测的帧没有变化则直接沿用上一次的结果
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            
+        Returns:
+            list: 人脸矩形框列表，每个元素为(x, y, w, h)
+        """
+        gate = self.motion_gate
+        if gate is None:
+            return self._detect_keyframe(frame)
+        if gate.check(frame, self.gated_faces):
+            return list(self.gated_faces)
+        self.gated_faces = self._detect_keyframe(frame)
+        gate.detected()
+        return list(self.gated_faces)
+    
+    def _detect_keyframe(self, frame):
+        """
+        不经运动门控的关键帧检测/光流传播，见detect_or_propagate
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            
+        Returns:
+            list: 人脸矩形框列表，每个元素为(x, y, w, h)
+        """
+        if self.detect_interval <= 1:
+            return self.detect_full_or_roi(frame)
+        
+        # 未到关键帧且存在可传播的人脸时，使用光流传播
+        if self.frames_since_keyframe < self.detect_interval - 1 and self.propagator.has_tracks:
+            detections = self.propagator.propagate(frame)
+            if detections is not None:
+                self.frames_since_keyframe += 1
+                self.keyframe_stats['propagated_frames'] += 1
+                self.last_detections = detections
+                return self._detections_to_boxes(detections)
+            # 跟踪置信度过低，强制重新检测
+            self.keyframe_stats['forced_redetections'] += 1
+        
+        faces = self.detect_full_or_roi(frame)
+        self.propagator.reset(frame, self.last_detections)
+        self.frames_since_keyframe = 0
+        self.keyframe_stats['keyframes'] += 1
+        return faces
+    
+    def detect_full_or_roi(self, frame):
+        """
+        运行一次检测：启用跟踪区域检测且存在人脸轨迹时，只在轨迹预测位置周围的拼接小图上检测；
+        区域内一个人脸也没有找到时做一次全画面检测（含多尺度回退），全画面也没有找到时
+        之后的区域检测不再回退，直到按间隔做全画面检测或重新找到人脸
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            
+        Returns:
+            list: 人脸矩形框列表，每个元素为(x, y, w, h)
+        """
+        policy = self.roi_policy
+        if policy is None:
+            return self.detect_faces_in_frame(frame)
+        
+        det_frame_area = self._detection_area(frame)
+        regions = policy.plan(frame, self.tracker.predicted_boxes())
+        roi_area = 0
+        if regions:
+            mosaic = RoiMosaic(frame, regions)
+            detections = mosaic.map_back(self._detect_image_raw(mosaic.image))
+            if len(detections) > 0 or not policy.allow_fallback:
+                policy.record(mosaic.area, det_frame_area, roi=True, found=len(detections) > 0)
+                self.last_detections = detections
+                return self._detections_to_boxes(detections)
+            policy.stats['fallbacks'] += 1
+            roi_area = mosaic.area
         
-        # 恢复原始输入尺寸
-        self.detector.setInputSize((width, height))
+        faces = self.detect_faces_in_frame(frame)
+        policy.record(roi_area + det_frame_area, det_frame_area, roi=False, found=len(faces) > 0)
+        return faces
+    
+    def _detect_image_raw(self, image):
+        """
+        在给定图像上按原尺寸运行一次检测（不缩放、不做多尺度回退），用于跟踪区域检测的拼接图
         
-        return face_boxes
+        Args:
+            image (numpy.ndarray): 输入图像
+            
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的检测结果（图像坐标）
+        """
+        return self._run_yunet(image)
+    
+    def _detection_area(self, frame):
+        """
+        全画面检测时YuNet处理的像素数（按检测分辨率缩小后，32像素对齐）
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            
+        Returns:
+            int: 像素数
+        """
+        height, width = frame.shape[:2]
+        longest = max(width, height)
+        if not self.detect_size or longest <= self.detect_size:
+            return inference_area(width, height)
+        scale = self.detect_size / longest
+        return inference_area(max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    
+    def detect_timed(self, frame, timer):
+        """
+        执行detect_or_propagate并记录耗时，多尺度回退的耗时单独记录，不计入检测阶段
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            timer (StageTimer): 分阶段计时器
+            
+        Returns:
+            list: 人脸矩形框列表，每个元素为(x, y, w, h)
+        """
+        multi_scale_before = self.multi_scale_time
+        start = time.perf_counter()
+        faces = self.detect_or_propagate(frame)
+        elapsed = time.perf_counter() - start
+        multi_scale = self.multi_scale_time - multi_scale_before
+        timer.record('detect', elapsed - multi_scale)
+        if multi_scale > 0:
+            timer.record('multi_scale', multi_scale)
+        return faces
     
     def track_faces_with_history(self, current_faces):
         """
-        使用历史帧信息跟踪人脸，减少马赛克抖动
-        增加无人脸时延续打码策略：在检测不到人脸时，使用最后一次检测到的坐标继续打码5帧
+        将当前帧的检测结果关联到人脸轨迹，漏检的人脸单独延续打码
+        每个人脸连续未检测到时使用卡尔曼滤波按其速度预测的位置，最多延续max_continuation_frames帧；
+        多个人脸中只有一个漏检时，其余人脸仍使用当前帧的检测位置
         
         Args:
             current_faces (list): 当前帧检测到的人脸列表
             
         Returns:
-            list: 经过跟踪平滑处理的人脸列表
-        """
-        # 如果当前帧检测到人脸
-        if len(current_faces) > 0:
-            # 更新最后检测到的人脸坐标
-            self.last_detected_faces = current_faces.copy()
-            # 重置无人脸帧计数
-            self.no_face_frame_count = 0
-            
-            # 更新历史记录
-            self.face_history.append(current_faces)
-            if len(self.face_history) > self.history_length:
-                self.face_history.pop(0)
-            return current_faces
-        
-        # 如果当前帧没有检测到人脸
-        else:
-            # 增加无人脸帧计数
-            self.no_face_frame_count += 1
-            
-            # 如果有最后检测到的人脸坐标，且未超过最大延续帧数
-            if (len(self.last_detected_faces) > 0 and 
-                self.no_face_frame_count <= self.max_continuation_frames):
-                
-                # 使用最后一次检测到的坐标继续打码
-                print(f"无人脸检测，使用延续策略 (第{self.no_face_frame_count}/{self.max_continuation_frames}帧)")
-                
-                # 添加空的当前帧到历史记录（表示使用了延续策略）
-                self.face_history.append([])
-                if len(self.face_history) > self.history_length:
-                    self.face_history.pop(0)
-                    
-                return self.last_detected_faces
-            
-            # 如果超过最大延续帧数或没有历史坐标，尝试使用历史信息
-            elif len(self.face_history) > 0:
-                # 使用最近一帧的人脸位置作为预测位置
-                last_faces = self.face_history[-1]
-                
-                # 检查历史记录的一致性
-                recent_frames_with_faces = 0
-                for hist_faces in self.face_history[-3:]:  # 检查最近3帧
-                    if len(hist_faces) > 0:
-                        recent_frames_with_faces += 1
-                
-                # 如果最近3帧中至少有2帧检测到人脸，则使用历史位置
-                if recent_frames_with_faces >= 2:
-                    self.face_history.append([])
-                    if len(self.face_history) > self.history_length:
-                        self.face_history.pop(0)
-                    return last_faces
-                else:
-                    # 历史记录不够一致，清空相关记录
-                    self.face_history.append([])
-                    if len(self.face_history) > self.history_length:
-                        self.face_history.pop(0)
-                    return []
-            
-            # 没有任何可用的历史信息
-            else:
-                return []
+            list: 需要打码的人脸列表（当前检测结果 + 延续中的人脸）
+        """
+        boxes, _ = self.tracker.update(current_faces)
+        # 前瞻补帧时轨迹保留得更久以便关联重新出现的人脸，超过延续帧数的预测框不输出
+        visible = self.tracker.output_misses <= self.max_continuation_frames
+        self.last_track_ids = self.tracker.output_ids[visible]
+        self.last_track_misses = self.tracker.output_misses[visible]
+        coasting = int(np.count_nonzero(self.last_track_misses))
+        if coasting:
+            # 逐帧消息为DEBUG级别并限速，结束时输出汇总
+            longest = int(self.last_track_misses.max())
+            self.events.repeated(
+                'continuation',
+                f"{coasting}个人脸未检测到，使用延续策略 (第{longest}/{self.max_continuation_frames}帧)",
+                "延续打码: 共{count}帧"
+            )
+            self.continuation_frames += 1
+        return [tuple(int(value) for value in box) for box in boxes[visible]]
     
     def draw_faces(self, frame, faces):
         """
@@ -258,28 +798,34 @@ class VideoFaceDetector:
         
         return result_frame
     
-    def apply_mosaic_to_faces(self, frame, faces, mosaic_size=15):
+    def apply_mosaic_to_faces(self, frame, faces, mosaic_size=15, in_place=False):
         """
         对检测到的人脸区域应用椭圆形马赛克效果
+        椭圆遮罩从LRU缓存中获取，马赛克像素按遮罩直接复制到原图（uint8），不做浮点混合
         
         Args:
             frame (numpy.ndarray): 输入的图像帧
             faces (list): 人脸矩形框列表
             mosaic_size (int): 马赛克块的大小，值越小马赛克越细腻
+            in_place (bool): 是否直接修改输入帧（省去整帧复制），调用方不再需要原始帧时使用
             
         Returns:
             numpy.ndarray: 应用了椭圆形马赛克效果的图像帧
         """
-        result_frame = frame.copy()
+        result_frame = frame if in_place else frame.copy()
+        frame_h, frame_w = frame.shape[:2]
         
         for (x, y, w, h) in faces:
             # 确保坐标在图像范围内
             x = max(0, x)
             y = max(0, y)
-            w = min(w, frame.shape[1] - x)
-            h = min(h, frame.shape[0] - y)
+            w = min(w, frame_w - x)
+            h = min(h, frame_h - y)
+            # 人脸框完全在画面外或尺寸无效时跳过
+            if w <= 0 or h <= 0:
+                continue
             
-            # 提取人脸区域
+            # 提取人脸区域（原图视图）
             face_region = result_frame[y:y+h, x:x+w]
             
             # 计算马赛克后的尺寸
@@ -292,31 +838,281 @@ class VideoFaceDetector:
             # 放大回原尺寸，使用最近邻插值产生马赛克效果
             mosaic_face = cv2.resize(small_face, (w, h), interpolation=cv2.INTER_NEAREST)
             
-            # 创建椭圆形遮罩
-            mask = np.zeros((h, w), dtype=np.uint8)
+            # 应用椭圆形马赛克：只在椭圆区域内把马赛克像素复制回原图（直接写入原图视图）
+            cv2.copyTo(mosaic_face, ellipse_mask(w, h), face_region)
+        
+        return result_frame
+    
+    def detection_params(self):
+        """
+        影响检测结果的模型和参数，作为检测结果缓存的键
+        延续打码帧数、马赛克大小等只影响跟踪和渲染的参数不包含在内
+        
+        Returns:
+            dict: 模型哈希和检测参数
+        """
+        from detection_sidecar import model_sha256
+        return {
+            'detector': type(self).__name__,
+            'model_sha256': model_sha256(self.model_path),
+            'score_threshold': 0.6,
+            'nms_threshold': 0.3,
+            'detect_size': self.detect_size,
+            'detect_interval': self.detect_interval,
+            'multi_scale': self.multi_scale_policy.mode,
+            'multi_scale_budget_ms': self.multi_scale_policy.time_budget_ms,
+            'motion_gate': self.motion_gate.max_skip if self.motion_gate is not None else 0,
+            'roi_detection': self.roi_policy.full_scan_interval if self.roi_policy is not None else 0
+        }
+    
+    @property
+    def supports_parallel_detection(self):
+        """是否可以用create_worker_detector创建多个检测器实例并行检测"""
+        return True
+    
+    def create_worker_detector(self):
+        """
+        创建一个配置相同的独立检测器实例，供并行检测线程使用
+        YuNet检测器实例不是线程安全的，每个检测线程需要自己的实例；
+        检测线程不做多尺度回退，由流水线的跟踪阶段用当前实例按帧序执行（见defer_multi_scale）
+        
+        Returns:
+            VideoFaceDetector: 新的检测器实例
+        """
+        worker = VideoFaceDetector(
+            model_path=self.model_path,
+            continuation_frames=self.max_continuation_frames,
+            detect_size=self.detect_size
+        )
+        worker.defer_multi_scale = True
+        return worker
+    
+    def render_frame(self, frame, faces, apply_mosaic=False, mosaic_size=15, in_place=False):
+        """
+        按输出模式渲染一帧
+        
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+            faces (list): 人脸矩形框列表
+            apply_mosaic (bool): 是否应用马赛克，否则绘制检测框
+            mosaic_size (int): 马赛克块大小
+            in_place (bool): 马赛克模式下是否直接修改输入帧
             
-            # 计算椭圆中心和轴长
-            center_x = w // 2
-            center_y = h // 2
-            # 椭圆的半轴长度，扩大10%以更好地遮挡面部
-            axis_x = int(w * 0.50)  # 水平半轴（从45%增加到50%）
-            axis_y = int(h * 0.66)  # 垂直半轴（从60%增加到66%），人脸通常是竖向的椭圆
+        Returns:
+            numpy.ndarray: 渲染后的图像帧
+        """
+        if apply_mosaic:
+            # 马赛克模式
+            return self.apply_mosaic_to_faces(frame, faces, mosaic_size, in_place=in_place)
+        # 预览模式，绘制检测框
+        return self.draw_faces(frame, faces)
+    
+    def _finish_frame(self, result_frame, detected_count, out, counters, total_frames, show_preview, progress_callback):
+        """
+        处理一帧的收尾工作：更新统计、写入输出、预览和进度回调
+        
+        Args:
+            result_frame (numpy.ndarray): 渲染后的图像帧
+            detected_count (int): 本帧实际检测到的人脸数（不含跟踪结果）
+            out (cv2.VideoWriter): 输出视频写入器，可为None
+            counters (dict): 统计计数器，原地更新
+            total_frames (int): 视频总帧数
+            show_preview (bool): 是否显示实时预览
+            progress_callback (callable): 进度回调函数
             
-            # 绘制填充的椭圆遮罩
-            cv2.ellipse(mask, (center_x, center_y), (axis_x, axis_y), 0, 0, 360, 255, -1)
+        Returns:
+            bool: 是否继续处理
+        """
+        # 更新统计信息（基于实际检测结果，不是跟踪结果）
+        counters['processed_frames'] += 1
+        if detected_count > 0:
+            counters['frames_with_faces'] += 1
+            counters['total_faces_detected'] += detected_count
+        processed_frames = counters['processed_frames']
+        
+        # 保存到输出视频
+        if out:
+            start = time.perf_counter()
+            out.write(result_frame)
+            self.stage_timer.record('encode', time.perf_counter() - start)
+        
+        # 逐帧回调（帧缓冲区之后会被复用，回调中需要保留的内容应自行复制）
+        if self.frame_callback is not None:
+            self.frame_callback(processed_frames - 1, result_frame)
+        
+        # 显示预览
+        if show_preview:
+            cv2.imshow('人脸检测', result_frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("用户中断处理")
+                counters['interrupted'] = True
+                return False
+        
+        # 调用进度回调
+        if progress_callback:
+            should_continue = progress_callback(processed_frames, total_frames)
+            if not should_continue:
+                print("用户中断处理")
+                counters['interrupted'] = True
+                return False
+        
+        # 进度事件（按帧间隔限速）
+        self.events.progress(processed_frames, total_frames, counters)
+        
+        return True
+    
+    def _warm_up_tracking(self, cap, frame_count):
+        """
+        预热跟踪状态：只检测和跟踪，不渲染、不写入、不计入统计
+        用于分段处理时让延续打码状态在段首已经就绪
+        
+        Args:
+            cap (cv2.VideoCapture): 输入视频，已定位到预热起点
+            frame_count (int): 预热帧数
             
-            # 将遮罩转换为3通道
-            mask_3d = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) / 255.0
+        Returns:
+            int: 实际预热的帧数
+        """
+        warmed = 0
+        for _ in range(frame_count):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            self.track_faces_with_history(self.detect_or_propagate(frame))
+            warmed += 1
+        return warmed
+    
+    def _process_frames_serial(self, cap, out, total_frames, show_preview, apply_mosaic, mosaic_size, progress_callback, frame_limit=None,
+                               face_log=None, recorder=None, replay=None):
+        """
+        串行处理循环：读取、检测、跟踪、渲染、写入依次执行
+        
+        Args:
+            cap (cv2.VideoCapture): 输入视频
+            out (cv2.VideoWriter): 输出视频写入器，可为None
+            total_frames (int): 视频总帧数
+            show_preview (bool): 是否显示实时预览
+            apply_mosaic (bool): 是否应用马赛克
+            mosaic_size (int): 马赛克块大小
+            progress_callback (callable): 进度回调函数
+            frame_limit (int): 最多处理的帧数，None表示处理到视频结束
+            face_log (list): 不为None时按帧追加跟踪后的人脸框列表
+            recorder (DetectionRecorder): 不为None时记录每帧的原始检测结果
+            replay (DetectionSidecar): 不为None时从缓存回放检测结果，不运行检测器
             
-            # 应用椭圆形马赛克：只在椭圆区域内应用马赛克效果
-            blended_region = face_region * (1 - mask_3d) + mosaic_face * mask_3d
+        Returns:
+            dict: 统计计数器
+        """
+        counters = {'processed_frames': 0, 'frames_with_faces': 0, 'total_faces_detected': 0}
+        timer = self.stage_timer
+        
+        while frame_limit is None or counters['processed_frames'] < frame_limit:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timer.record('decode', time.perf_counter() - start)
+            index = counters['processed_frames']
+            
+            if replay is not None:
+                # 回放缓存的检测结果
+                detected_faces = self._detections_to_boxes(replay.frame_detections(index))
+            else:
+                # 检测人脸（关键帧检测，中间帧光流传播）
+                detected_faces = self.detect_timed(frame, timer)
+                if recorder is not None:
+                    recorder.record(index, self.last_detections)
+            
+            # 统一使用跟踪算法来保持两种模式的一致性
+            start = time.perf_counter()
+            faces = self.track_faces_with_history(detected_faces)
+            if face_log is not None:
+                face_log.append(list(faces))
+            timer.record('track', time.perf_counter() - start)
+            
+            # 既不输出也不预览时（如仅分析的第一遍）无需渲染
+            if out or show_preview:
+                # 解码出的帧只在本循环中使用，直接在原帧上打码
+                start = time.perf_counter()
+                result_frame = self.render_frame(frame, faces, apply_mosaic, mosaic_size, in_place=True)
+                timer.record('render', time.perf_counter() - start)
+            else:
+                result_frame = frame
             
-            # 将处理后的区域放回原图
-            result_frame[y:y+h, x:x+w] = blended_region.astype(np.uint8)
+            if not self._finish_frame(result_frame, len(detected_faces), out, counters,
+                                      total_frames, show_preview, progress_callback):
+                break
         
-        return result_frame
+        return counters
+    
+    def _process_frames_lookahead(self, cap, out, total_frames, show_preview, apply_mosaic, mosaic_size, progress_callback,
+                                  frame_limit=None, face_log=None, recorder=None, replay=None, backfill_frames=0):
+        """
+        前瞻缓冲的串行处理循环：检测和跟踪后的帧先进入缓冲区，延迟lookahead_frames帧再渲染和写入，
+        期间用之后的检测结果补齐漏检区间（双向插值）和人脸首次出现之前的帧
+        
+        Args:
+            cap, out, total_frames, show_preview, apply_mosaic, mosaic_size, progress_callback,
+            frame_limit, face_log, recorder, replay: 同_process_frames_serial
+            backfill_frames (int): 人脸首次出现时向前补打码的帧数
+            
+        Returns:
+            dict: 统计计数器，'lookahead'为插值和向前补的人脸框数
+        """
+        counters = {'processed_frames': 0, 'frames_with_faces': 0, 'total_faces_detected': 0}
+        timer = self.stage_timer
+        filler = LookaheadGapFiller(self.lookahead_frames, backfill_frames)
+        # ffmpeg读取器复用预分配的帧缓冲区，扩大环形缓冲使缓冲区中的帧不被覆盖（帧只保存一份，不复制）
+        if hasattr(cap, 'ensure_buffers'):
+            cap.ensure_buffers(self.lookahead_frames + 2)
+        
+        def emit(ready):
+            for (frame, detected_count), faces in ready:
+                if face_log is not None:
+                    face_log.append(faces)
+                if out or show_preview:
+                    start = time.perf_counter()
+                    frame = self.render_frame(frame, faces, apply_mosaic, mosaic_size, in_place=True)
+                    timer.record('render', time.perf_counter() - start)
+                if not self._finish_frame(frame, detected_count, out, counters,
+                                          total_frames, show_preview, progress_callback):
+                    return False
+            return True
+        
+        read_frames = 0
+        running = True
+        while running and (frame_limit is None or read_frames < frame_limit):
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timer.record('decode', time.perf_counter() - start)
+            
+            if replay is not None:
+                detected_faces = self._detections_to_boxes(replay.frame_detections(read_frames))
+            else:
+                detected_faces = self.detect_timed(frame, timer)
+                if recorder is not None:
+                    recorder.record(read_frames, self.last_detections)
+            read_frames += 1
+            
+            start = time.perf_counter()
+            faces = self.track_faces_with_history(detected_faces)
+            ready = filler.push((frame, len(detected_faces)), self.last_track_ids, np.array(faces, dtype=np.float32),
+                                self.last_track_misses)
+            timer.record('track', time.perf_counter() - start)
+            running = emit(ready)
+        
+        if running:
+            emit(filler.flush())
+        counters['lookahead'] = dict(filler.stats, frames=self.lookahead_frames, backfill=filler.backfill)
+        return counters
     
-    def process_video(self, input_path, output_path=None, show_preview=False, apply_mosaic=False, mosaic_size=15, progress_callback=None, codec='auto'):
+    def process_video(self, input_path, output_path=None, show_preview=False, apply_mosaic=False, mosaic_size=15,
+                      progress_callback=None, codec='auto', detect_size=None, detect_interval=None, pipeline_workers=0,
+                      start_frame=0, end_frame=None, preroll_frames=0, io_backend='opencv', ffmpeg_options=None,
+                      collect_faces=False, sidecar_path=None, replay_sidecar=None, frame_callback=None,
+                      lookahead_frames=0, backfill_frames=0, motion_gate=None, roi_detection=None):
         """
         处理视频文件，检测其中的人脸
         
@@ -328,6 +1124,28 @@ class VideoFaceDetector:
             mosaic_size (int): 马赛克块大小，仅在apply_mosaic=True时有效
             progress_callback (callable): 进度回调函数，接收(当前帧数, 总帧数)参数，返回是否继续处理
             codec (str): 输出视频编码器，支持 'h264', 'h265', 'av1', 'xvid', 'mp4v', 'auto'
+            detect_size (int): 检测分辨率（长边像素数），为None时沿用初始化时的设置
+                               （detect_size、detect_interval、motion_gate、roi_detection只对本次调用有效，
+                               处理结束后恢复初始化时的设置）
+            detect_interval (int): 关键帧检测间隔，为None时沿用初始化时的设置
+            pipeline_workers (int): 多线程流水线的检测线程数，0或1时使用串行处理
+            start_frame (int): 起始帧序号（包含），用于分段处理
+            end_frame (int): 结束帧序号（不包含），None表示处理到视频结束
+            preroll_frames (int): 起始帧之前用于预热跟踪状态的帧数，这些帧不写入输出；启用卡尔曼滤波时至少为跟踪器的warmup_frames
+            io_backend (str): 视频读写后端，'opencv'（默认）或 'ffmpeg'（管道读写，支持编码参数和音轨复制）
+            ffmpeg_options (dict): ffmpeg后端的编码参数：preset、crf、threads、pix_fmt、audio（是否复制音轨）
+            collect_faces (bool): 是否在结果的'tracked_faces'中返回每帧跟踪后的人脸框（含延续打码帧）
+            sidecar_path (str): 检测结果缓存路径；文件存在且模型、检测参数和视频一致时直接回放，
+                                否则运行检测并把每帧的原始检测结果写入该文件
+            replay_sidecar (str): 仅渲染模式：从该缓存回放检测结果，不运行检测器
+            frame_callback (callable): 逐帧回调，接收(帧序号, 渲染后的帧)参数，在处理线程中调用，应尽快返回
+            lookahead_frames (int): 前瞻缓冲帧数（离线处理）：帧延迟这么多帧再输出，期间用之后的检测结果
+                                    对漏检区间做前后插值，0表示不启用
+            backfill_frames (int): 人脸首次出现时向前补打码的帧数（需要启用前瞻缓冲，不超过缓冲帧数）
+            motion_gate (int): 运动门控的最大连续跳过帧数，0表示关闭，为None时沿用初始化时的设置；
+                               启用时按帧序串行处理，忽略pipeline_workers
+            roi_detection (int): 跟踪区域检测的全画面检测间隔，0表示关闭，为None时沿用初始化时的设置；
+                                 区域规划需要上一帧的跟踪结果，启用时按帧序串行处理，忽略pipeline_workers
             
         Returns:
             dict: 处理结果统计信息
@@ -335,8 +1153,56 @@ class VideoFaceDetector:
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"输入视频文件不存在: {input_path}")
         
+        # 检测参数的覆盖只对本次调用有效：同一实例（如常驻服务的检测器池）处理下一个视频时不受影响
+        saved_settings = (self.detect_size, self.detect_interval, self.motion_gate, self.roi_policy)
+        if detect_size is not None:
+            self.detect_size = detect_size
+        if detect_interval is not None:
+            self.detect_interval = max(1, detect_interval)
+        if motion_gate is not None:
+            self.motion_gate = MotionGate(max_skip=motion_gate) if motion_gate > 0 else None
+        if roi_detection is not None:
+            self.roi_policy = RoiDetectionPolicy(full_scan_interval=roi_detection) if roi_detection > 0 else None
+        try:
+            return self._process_video(input_path, output_path, show_preview, apply_mosaic, mosaic_size,
+                                       progress_callback, codec, pipeline_workers, start_frame, end_frame,
+                                       preroll_frames, io_backend, ffmpeg_options, collect_faces, sidecar_path,
+                                       replay_sidecar, frame_callback, lookahead_frames, backfill_frames)
+        finally:
+            self.detect_size, self.detect_interval, self.motion_gate, self.roi_policy = saved_settings
+    
+    def _process_video(self, input_path, output_path, show_preview, apply_mosaic, mosaic_size, progress_callback,
+                       codec, pipeline_workers, start_frame, end_frame, preroll_frames, io_backend, ffmpeg_options,
+                       collect_faces, sidecar_path, replay_sidecar, frame_callback, lookahead_frames, backfill_frames):
+        """
+        process_video的处理过程，本次调用的检测参数已经设置到实例上，其余参数见process_video
+        
+        Returns:
+            dict: 处理结果统计信息
+        """
+        if (sidecar_path or replay_sidecar) and (start_frame > 0 or end_frame is not None):
+            raise ValueError("检测结果缓存仅支持处理完整视频")
+        
+        self.lookahead_frames = max(0, lookahead_frames)
+        if backfill_frames and not self.lookahead_frames:
+            raise ValueError("向前补打码需要启用前瞻缓冲（lookahead_frames > 0）")
+        
+        # 每个视频从干净的跟踪状态开始
+        self.reset_tracking_state()
+        
+        ffmpeg_options = dict(ffmpeg_options or {})
+        if io_backend == 'ffmpeg':
+            from ffmpeg_io import FFmpegVideoReader, ffmpeg_available
+            if not ffmpeg_available():
+                raise RuntimeError("未找到ffmpeg，请安装ffmpeg或使用opencv读写后端")
+        elif io_backend != 'opencv':
+            raise ValueError(f"不支持的读写后端: {io_backend}")
+        
         # 打开视频文件
-        cap = cv2.VideoCapture(input_path)
+        if io_backend == 'ffmpeg':
+            cap = FFmpegVideoReader(input_path, threads=ffmpeg_options.get('threads', 0))
+        else:
+            cap = cv2.VideoCapture(input_path)
         
         if not cap.isOpened():
             raise ValueError(f"无法打开视频文件: {input_path}")
@@ -353,106 +1219,120 @@ class VideoFaceDetector:
         
         print(f"视频信息: {width}x{height}, {fps}fps, 总帧数: {total_frames}")
         print(f"输入视频编码器: {input_codec}")
+        if self.detect_size and max(width, height) > self.detect_size:
+            print(f"检测分辨率: 长边 {self.detect_size} 像素")
+        if self.detect_interval > 1:
+            print(f"关键帧检测: 每 {self.detect_interval} 帧检测一次，中间帧光流传播")
+        if self.motion_gate is not None:
+            print(f"运动门控: 画面静止时跳过检测，最多连续跳过 {self.motion_gate.max_skip} 帧")
+        if self.roi_policy is not None:
+            print(f"跟踪区域检测: 只在人脸轨迹周围检测，每 {self.roi_policy.full_scan_interval} 次检测做一次全画面检测")
+        
+        # 检测结果缓存：回放已有结果或记录本次的检测结果
+        recorder = None
+        replay = None
+        if sidecar_path or replay_sidecar:
+            from detection_sidecar import DetectionRecorder, DetectionSidecar
+            video_info = {'width': width, 'height': height, 'frames': total_frames,
+                          'size': os.path.getsize(input_path)}
+            key = self.detection_params()
+            try:
+                if replay_sidecar:
+                    replay = DetectionSidecar(replay_sidecar)
+                    if (replay.video_info['width'], replay.video_info['height']) != (width, height):
+                        raise ValueError(f"检测结果缓存与视频尺寸不一致: {replay_sidecar}")
+                    if replay.key != key:
+                        print("提示: 缓存中的检测参数与当前设置不同，按缓存中的检测结果渲染")
+                elif os.path.exists(sidecar_path):
+                    cached = DetectionSidecar(sidecar_path)
+                    if cached.matches(key, video_info):
+                        replay = cached
+                    else:
+                        print("检测结果缓存与当前模型、检测参数或视频不一致，重新检测")
+            except Exception:
+                cap.release()
+                raise
+            if replay is not None:
+                print(f"仅渲染模式: 回放检测结果缓存 {replay.path} ({replay.frame_count}帧)")
+            else:
+                recorder = DetectionRecorder()
         
         # 设置输出视频编码器
         out = None
-        if output_path:
-            if codec == 'auto':
-                # 自动模式：首先尝试使用与输入视频相同的编码器
-                if input_fourcc != 0:  # 确保获取到了有效的编码器信息
-                    print(f"自动模式：尝试使用输入视频的编码器: {input_codec}")
-                    out = cv2.VideoWriter(output_path, input_fourcc, fps, (width, height))
-                
-                # 如果输入编码器不可用，按优先级尝试常用编码器
-                fallback_codecs = ['h264', 'xvid', 'mp4v']
-                for fallback_codec in fallback_codecs:
-                    if not out or not out.isOpened():
-                        fourcc, codec_desc = get_codec_fourcc(fallback_codec)
-                        print(f"尝试使用 {codec_desc} 编码器")
-                        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-                        if out.isOpened():
-                            print(f"成功初始化 {codec_desc} 编码器")
-                            break
-            else:
-                # 指定编码器模式
-                fourcc, codec_desc = get_codec_fourcc(codec)
-                print(f"使用指定的 {codec_desc} 编码器")
-                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-                
-                # 如果指定的编码器不可用，尝试备用编码器
-                if not out.isOpened():
-                    print(f"{codec_desc} 编码器不可用，尝试备用编码器")
-                    fallback_codecs = ['h264', 'xvid', 'mp4v']
-                    for fallback_codec in fallback_codecs:
-                        if fallback_codec != codec:  # 跳过已经尝试过的编码器
-                            fourcc, fallback_desc = get_codec_fourcc(fallback_codec)
-                            print(f"尝试使用备用 {fallback_desc} 编码器")
-                            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-                            if out.isOpened():
-                                print(f"成功初始化备用 {fallback_desc} 编码器")
-                                break
-                
-            # 检查编码器是否成功初始化
-            if not out or not out.isOpened():
-                raise ValueError(f"无法初始化任何视频编码器，请检查输出路径和系统编码器支持: {output_path}")
+        if output_path and io_backend == 'ffmpeg':
+            from ffmpeg_io import FFmpegVideoWriter
+            # 只有处理完整视频时音轨才能与画面对齐
+            whole_video = start_frame == 0 and end_frame is None
+            out = FFmpegVideoWriter(
+                output_path, cap.get(cv2.CAP_PROP_FPS), width, height, codec=codec,
+                preset=ffmpeg_options.get('preset', 'medium'),
+                crf=ffmpeg_options.get('crf', 23),
+                threads=ffmpeg_options.get('threads', 0),
+                pix_fmt=ffmpeg_options.get('pix_fmt', 'yuv420p'),
+                audio_source=input_path if whole_video and ffmpeg_options.get('audio', True) else None
+            )
+        elif output_path:
+            out = open_video_writer(output_path, codec, fps, width, height, input_fourcc, input_codec)
         
-        # 统计信息
-        processed_frames = 0
-        frames_with_faces = 0
-        total_faces_detected = 0
+        # 分段处理：只处理[start_frame, end_frame)范围内的帧
+        frame_limit = None
+        if start_frame > 0 or end_frame is not None:
+            end_frame = total_frames if end_frame is None else min(end_frame, total_frames)
+            frame_limit = max(0, end_frame - start_frame)
+            total_frames = frame_limit
+            print(f"处理帧范围: {start_frame} - {end_frame}")
         
         # 记录开始时间
         start_time = time.time()
+        self.stage_timer = StageTimer()
+        self.frame_callback = frame_callback
+        self.events.reset(self.stage_timer)
+        self.events.emit({'event': 'start', 'input_path': input_path, 'output_path': output_path,
+                          'width': width, 'height': height, 'fps': fps, 'total': total_frames})
         
         print("开始处理视频...")
         
+        pipeline_stats = None
+        face_log = [] if collect_faces else None
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # 检测人脸
-                detected_faces = self.detect_faces_in_frame(frame)
-                
-                # 统一使用跟踪算法来保持两种模式的一致性
-                faces = self.track_faces_with_history(detected_faces)
-                
-                if apply_mosaic:
-                    # 马赛克模式
-                    result_frame = self.apply_mosaic_to_faces(frame, faces, mosaic_size)
-                else:
-                    # 预览模式，绘制检测框
-                    result_frame = self.draw_faces(frame, faces)
-                
-                # 更新统计信息（基于实际检测结果，不是跟踪结果）
-                processed_frames += 1
-                if len(detected_faces) > 0:
-                    frames_with_faces += 1
-                    total_faces_detected += len(detected_faces)
-                
-                # 保存到输出视频
-                if out:
-                    out.write(result_frame)
-                
-                # 显示预览
-                if show_preview:
-                    cv2.imshow('人脸检测', result_frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        print("用户中断处理")
-                        break
-                
-                # 调用进度回调
-                if progress_callback:
-                    should_continue = progress_callback(processed_frames, total_frames)
-                    if not should_continue:
-                        print("用户中断处理")
-                        break
-                
-                # 显示进度
-                if processed_frames % 30 == 0:
-                    progress = (processed_frames / total_frames) * 100
-                    print(f"处理进度: {progress:.1f}% ({processed_frames}/{total_frames})")
+            # 定位到预热起点，先用前面的帧预热跟踪状态；
+            # 卡尔曼滤波的速度和协方差需要足够的帧才能收敛到与从头处理相同的状态，段首输出才与单进程一致
+            if start_frame > 0:
+                preroll_frames = max(preroll_frames, self.tracker.warmup_frames)
+            warm_start = max(0, start_frame - preroll_frames)
+            if warm_start > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, warm_start)
+            if start_frame > warm_start:
+                warmed = self._warm_up_tracking(cap, start_frame - warm_start)
+                print(f"预热跟踪状态: {warmed}帧")
+            
+            if pipeline_workers and pipeline_workers > 1 and self.motion_gate is not None and not self.lookahead_frames:
+                # 运动门控要与上一次检测的帧比较并沿用其结果，多线程流水线的每个检测线程只看到部分帧
+                print("提示: 运动门控使用串行处理，忽略多线程流水线设置")
+                pipeline_workers = 0
+            if pipeline_workers and pipeline_workers > 1 and self.roi_policy is not None and not self.lookahead_frames:
+                # 区域规划读取上一帧跟踪后的预测位置，流水线中跟踪阶段与检测并行且落后若干帧
+                print("提示: 跟踪区域检测使用串行处理，忽略多线程流水线设置")
+                pipeline_workers = 0
+            
+            if self.lookahead_frames:
+                # 前瞻缓冲：延迟输出，用之后的检测结果双向补帧
+                if pipeline_workers and pipeline_workers > 1:
+                    print("提示: 前瞻补帧使用串行处理，忽略多线程流水线设置")
+                counters = self._process_frames_lookahead(cap, out, total_frames, show_preview, apply_mosaic,
+                                                          mosaic_size, progress_callback, frame_limit, face_log,
+                                                          recorder, replay, backfill_frames)
+            elif pipeline_workers and pipeline_workers > 1:
+                # 多线程流水线：读取、检测、跟踪、渲染、写入并行执行
+                from video_pipeline import ThreadedVideoPipeline
+                pipeline = ThreadedVideoPipeline(self, workers=pipeline_workers)
+                counters = pipeline.run(cap, out, total_frames, show_preview, apply_mosaic, mosaic_size,
+                                        progress_callback, frame_limit, face_log, recorder, replay)
+                pipeline_stats = pipeline.summary()
+            else:
+                counters = self._process_frames_serial(cap, out, total_frames, show_preview,
+                                                       apply_mosaic, mosaic_size, progress_callback, frame_limit,
+                                                       face_log, recorder, replay)
         
         finally:
             # 释放资源
@@ -461,6 +1341,23 @@ class VideoFaceDetector:
                 out.release()
             if show_preview:
                 cv2.destroyAllWindows()
+        # 处理正常结束时才检查编码结果，避免在finally中抛出异常掩盖原始错误
+        if output_path and io_backend == 'ffmpeg':
+            out.check_returncode()
+        
+        # 完整处理完视频后才保存检测结果缓存
+        if recorder is not None and sidecar_path:
+            if counters.get('interrupted'):
+                print("处理被中断，未保存检测结果缓存")
+            else:
+                recorder.save(sidecar_path, key, video_info)
+        
+        processed_frames = counters['processed_frames']
+        frames_with_faces = counters['frames_with_faces']
+        # 最后一次进度事件和逐帧消息的汇总
+        self.events.progress(processed_frames, total_frames, counters, force=True)
+        self.events.finish()
+        total_faces_detected = counters['total_faces_detected']
         
         # 计算处理时间和性能指标
         end_time = time.time()
@@ -474,8 +1371,32 @@ class VideoFaceDetector:
             'total_faces_detected': total_faces_detected,
             'detection_rate': frames_with_faces / processed_frames if processed_frames > 0 else 0,
             'processing_time': processing_time,
-            'fps_processed': fps_processed
+            'fps_processed': fps_processed,
+            'detect_interval': self.detect_interval,
+            'keyframes': self.keyframe_stats['keyframes'],
+            'propagated_frames': self.keyframe_stats['propagated_frames'],
+            'forced_redetections': self.keyframe_stats['forced_redetections'],
+            'multi_scale': self.multi_scale_policy.summary()
         }
+        result['timing'] = {
+            'stages': self.stage_timer.summary(processing_time),
+            'multi_scale_invocations': result['multi_scale']['invocations'],
+            'continuation_frames': self.continuation_frames
+        }
+        if pipeline_stats is not None:
+            result['pipeline'] = pipeline_stats
+        if 'lookahead' in counters:
+            result['lookahead'] = counters['lookahead']
+        if self.motion_gate is not None:
+            result['motion_gate'] = dict(self.motion_gate.stats, max_skip=self.motion_gate.max_skip)
+        if self.roi_policy is not None:
+            result['roi_detection'] = self.roi_policy.summary()
+        if face_log is not None:
+            result['tracked_faces'] = face_log
+        if replay is not None:
+            result['sidecar'] = {'mode': 'replay', 'path': replay.path}
+        elif recorder is not None and sidecar_path:
+            result['sidecar'] = {'mode': 'record', 'path': sidecar_path}
         
         print(f"\n处理完成!")
         print(f"总处理帧数: {result['processed_frames']}")
@@ -484,5 +1405,34 @@ class VideoFaceDetector:
         print(f"人脸检测率: {result['detection_rate']:.2%}")
         print(f"处理时间: {result['processing_time']:.2f}秒")
         print(f"处理速度: {result['fps_processed']:.2f}帧/秒")
+        if self.detect_interval > 1:
+            print(f"关键帧检测: {result['keyframes']}帧, 光流传播: {result['propagated_frames']}帧, "
+                  f"强制重新检测: {result['forced_redetections']}次")
+        multi_scale = result['multi_scale']
+        if multi_scale['invocations'] > 0:
+            scale_hits = ", ".join(f"{name}: {item['hits']}/{item['attempts']}"
+                                   for name, item in multi_scale['scales'].items())
+            print(f"多尺度回退: {multi_scale['invocations']}次 (跳过 {multi_scale['skipped']}, "
+                  f"精简 {multi_scale['thinned']}, 超出预算 {multi_scale['budget_exhausted']}), "
+                  f"各尺度命中: {scale_hits}")
+        if 'motion_gate' in result:
+            gate = result['motion_gate']
+            print(f"运动门控: 跳过检测 {gate['skipped']}/{gate['checked']}帧, 强制重新检测 {gate['forced']}次")
+        if 'roi_detection' in result:
+            roi = result['roi_detection']
+            print(f"跟踪区域检测: 区域检测 {roi['roi_frames']}次, 全画面检测 {roi['full_scans']}次 "
+                  f"(镜头切换 {roi['scene_changes']}次, 区域内未找到人脸 {roi['fallbacks']}次), "
+                  f"检测面积为全画面检测的 {roi['area_ratio']:.1%}")
+        if 'lookahead' in result:
+            lookahead = result['lookahead']
+            print(f"前瞻补帧: 缓冲{lookahead['frames']}帧, 插值 {lookahead['interpolated_boxes']}个人脸框, "
+                  f"向前补 {lookahead['backfilled_boxes']}个人脸框")
+        if pipeline_stats is not None:
+            utilisation = ", ".join(f"{name}: {item['utilisation']:.0%}"
+                                    for name, item in pipeline_stats['stages'].items())
+            print(f"流水线各阶段利用率: {utilisation}")
+        
+        # 结束事件（不含逐帧人脸框等大字段）
+        self.events.emit({'event': 'done', **{key: value for key, value in result.items() if key != 'tracked_faces'}})
         
         return result
\ No newline at end of file
@@ -0,0 +1,739 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+人脸跟踪模块
+提供关键帧之间的轻量级人脸框传播（基于金字塔LK光流），
+以及逐帧检测结果的多目标关联跟踪（IoU + 匈牙利匹配，恒速卡尔曼滤波预测和平滑，每个人脸独立延续打码）
+和静止画面的检测跳过（运动门控）
+"""
+
+from collections import deque
+
+import cv2
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment as _scipy_assignment
+except ImportError:
+    _scipy_assignment = None
+
+
+class OpticalFlowPropagator:
+    """
+    光流人脸框传播器
+    在关键帧上用检测结果初始化跟踪点（YuNet关键点 + 人脸框内角点），
+    在中间帧上用LK光流估计每个人脸的平移和缩放，并给出跟踪置信度
+    """
+
+    def __init__(self, max_corners=20, min_points=4, fb_threshold=1.0, min_confidence=0.5, work_size=640):
+        """
+        初始化光流传播器
+
+        Args:
+            max_corners (int): 每个人脸框内额外提取的角点数
+            min_points (int): 每个人脸至少需要保留的有效跟踪点数
+            fb_threshold (float): 前向-后向光流误差阈值（工作分辨率下的像素）
+            min_confidence (float): 每个人脸有效点比例的最低要求，低于该值时要求重新检测
+            work_size (int): 光流计算的工作分辨率（长边像素数）
+        """
+        self.max_corners = max_corners
+        self.min_points = min_points
+        self.fb_threshold = fb_threshold
+        self.min_confidence = min_confidence
+        self.work_size = work_size
+
+        self.lk_params = dict(
+            winSize=(21, 21),
+            maxLevel=3,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        )
+
+        self.reset()
+
+    def reset(self, frame=None, detections=None):
+        """
+        用关键帧的检测结果重新初始化跟踪状态
+
+        Args:
+            frame (numpy.ndarray): 关键帧图像，为None时仅清空状态
+            detections (numpy.ndarray): 形状为(N, 15)的检测结果（原始坐标）
+        """
+        self.prev_gray = None
+        self.points = np.empty((0, 1, 2), dtype=np.float32)
+        self.owners = np.empty(0, dtype=np.int32)
+        self.initial_counts = np.empty(0, dtype=np.int32)
+        self.detections = np.empty((0, 15), dtype=np.float32)
+        self.confidence = 0.0
+
+        if frame is None or detections is None or len(detections) == 0:
+            return
+
+        gray, scale = self._to_work_gray(frame)
+        frame_h, frame_w = gray.shape[:2]
+
+        points = []
+        owners = []
+        for index, det in enumerate(detections):
+            # YuNet的5个关键点
+            face_points = [det[4:14].reshape(5, 2) * scale]
+
+            # 人脸框内的角点
+            x, y, w, h = (det[:4] * scale).astype(int)
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(frame_w, x + w), min(frame_h, y + h)
+            if x1 - x0 > 4 and y1 - y0 > 4:
+                corners = cv2.goodFeaturesToTrack(gray[y0:y1, x0:x1], self.max_corners, 0.01, 3)
+                if corners is not None:
+                    face_points.append(corners.reshape(-1, 2) + (x0, y0))
+
+            face_points = np.concatenate(face_points).astype(np.float32)
+            points.append(face_points)
+            owners.append(np.full(len(face_points), index, dtype=np.int32))
+
+        self.prev_gray = gray
+        self.points = np.concatenate(points).reshape(-1, 1, 2)
+        self.owners = np.concatenate(owners)
+        self.initial_counts = np.bincount(self.owners, minlength=len(detections)).astype(np.int32)
+        self.detections = detections.astype(np.float32, copy=True)
+        self.confidence = 1.0
+
+    @property
+    def has_tracks(self):
+        """是否存在可传播的人脸"""
+        return self.prev_gray is not None and len(self.detections) > 0
+
+    def _to_work_gray(self, frame):
+        """
+        转换为工作分辨率的灰度图
+
+        Args:
+            frame (numpy.ndarray): 输入的图像帧
+
+        Returns:
+            tuple: (灰度图, 原始坐标到工作坐标的缩放比例)
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape[:2]
+        longest = max(width, height)
+        if not self.work_size or longest <= self.work_size:
+            return gray, 1.0
+        scale = self.work_size / longest
+        gray = cv2.resize(gray, (max(1, int(round(width * scale))), max(1, int(round(height * scale)))),
+                          interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def propagate(self, frame):
+        """
+        将上一帧的人脸框传播到当前帧
+
+        Args:
+            frame (numpy.ndarray): 当前图像帧
+
+        Returns:
+            numpy.ndarray: 形状为(N, 15)的传播结果（原始坐标）；
+                           跟踪置信度过低时返回None，调用方应重新检测
+        """
+        if not self.has_tracks:
+            return None
+
+        gray, scale = self._to_work_gray(frame)
+
+        # 前向光流 + 后向光流校验
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, next_points, None, **self.lk_params)
+        fb_error = np.linalg.norm((self.points - back_points).reshape(-1, 2), axis=1)
+        valid = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.fb_threshold)
+
+        face_count = len(self.detections)
+        valid_counts = np.bincount(self.owners[valid], minlength=face_count)
+        ratios = valid_counts / np.maximum(self.initial_counts, 1)
+        self.confidence = float(ratios.min())
+        if valid_counts.min() < self.min_points or self.confidence < self.min_confidence:
+            return None
+
+        old_points = self.points.reshape(-1, 2)
+        new_points = next_points.reshape(-1, 2)
+        frame_h, frame_w = frame.shape[:2]
+        detections = self.detections.copy()
+
+        for index in range(face_count):
+            member = valid & (self.owners == index)
+            old_p = old_points[member]
+            new_p = new_points[member]
+
+            # 平移：有效点位移的中位数
+            dx, dy = np.median(new_p - old_p, axis=0) / scale
+
+            # 缩放：点对距离比值的中位数（MedianFlow）
+            old_d = np.linalg.norm(old_p[:, None, :] - old_p[None, :, :], axis=2)
+            new_d = np.linalg.norm(new_p[:, None, :] - new_p[None, :, :], axis=2)
+            pair = old_d > 1e-3
+            ratio = float(np.median(new_d[pair] / old_d[pair])) if np.any(pair) else 1.0
+
+            x, y, w, h = detections[index, :4]
+            cx, cy = x + w / 2.0, y + h / 2.0
+
+            # 以人脸中心为基准缩放关键点，再整体平移
+            coords = detections[index, 4:14].reshape(5, 2)
+            coords[:, 0] = (coords[:, 0] - cx) * ratio + cx + dx
+            coords[:, 1] = (coords[:, 1] - cy) * ratio + cy + dy
+            detections[index, 4:14] = coords.ravel()
+
+            w, h = w * ratio, h * ratio
+            cx, cy = cx + dx, cy + dy
+            detections[index, :4] = (cx - w / 2.0, cy - h / 2.0, w, h)
+
+            # 人脸中心移出画面时视为跟踪丢失
+            if not (0 <= cx < frame_w and 0 <= cy < frame_h):
+                return None
+
+        # 仅保留有效点继续跟踪
+        self.prev_gray = gray
+        self.points = next_points[valid].reshape(-1, 1, 2)
+        self.owners = self.owners[valid]
+        self.detections = detections
+        return detections
+
+
+def box_iou_matrix(boxes_a, boxes_b):
+    """
+    计算两组人脸框两两之间的IoU（向量化）
+
+    Args:
+        boxes_a (numpy.ndarray): 形状为(N, 4)的人脸框 [x, y, w, h]
+        boxes_b (numpy.ndarray): 形状为(M, 4)的人脸框 [x, y, w, h]
+
+    Returns:
+        numpy.ndarray: 形状为(N, M)的IoU矩阵
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    ih = np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def _hungarian(cost):
+    """
+    匈牙利算法（最短增广路 + 势函数），要求行数不超过列数
+
+    Args:
+        cost (numpy.ndarray): 形状为(N, M)的代价矩阵，N <= M
+
+    Returns:
+        numpy.ndarray: 每一行分配到的列索引
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # 列j当前分配给的行（从1开始，0表示未分配）
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        min_cost = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            current_row = owner[col]
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+            better = ~used[1:] & (reduced < min_cost[1:])
+            min_cost[1:][better] = reduced[better]
+            way[1:][better] = col
+            free = np.flatnonzero(~used[1:]) + 1
+            next_col = free[np.argmin(min_cost[free])]
+            delta = min_cost[next_col]
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_cost[~used] -= delta
+            col = next_col
+            if owner[col] == 0:
+                break
+        while col:
+            previous = way[col]
+            owner[col] = owner[previous]
+            col = previous
+    assignment = np.empty(n, dtype=np.int64)
+    assigned = owner[1:] > 0
+    assignment[owner[1:][assigned] - 1] = np.flatnonzero(assigned)
+    return assignment
+
+
+def linear_assignment(cost):
+    """
+    求解线性分配问题（总代价最小的一一匹配）
+    安装了SciPy时使用scipy.optimize.linear_sum_assignment，否则使用NumPy实现的匈牙利算法
+
+    Args:
+        cost (numpy.ndarray): 形状为(N, M)的代价矩阵
+
+    Returns:
+        tuple: (行索引数组, 列索引数组)，共min(N, M)对
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if _scipy_assignment is not None:
+        rows, cols = _scipy_assignment(cost)
+        return rows.astype(np.int64), cols.astype(np.int64)
+    if cost.shape[0] <= cost.shape[1]:
+        return np.arange(cost.shape[0]), _hungarian(cost)
+    cols = _hungarian(cost.T)
+    order = np.argsort(cols)
+    return cols[order], np.arange(cost.shape[1])[order]
+
+
+class KalmanBoxFilter:
+    """
+    人脸框的恒速卡尔曼滤波（批量）
+    状态为 [cx, cy, w, h, vcx, vcy, vw, vh]，观测为人脸框的中心和尺寸；
+    所有轨迹的状态和协方差保存在(N, 8)和(N, 8, 8)数组中，一次矩阵运算完成全部轨迹的预测和更新。
+    过程噪声和观测噪声与人脸尺寸成比例，远近不同的人脸平滑程度一致
+    """
+
+    # 状态收敛所需的帧数：同一检测序列从不同的初始状态开始滤波，约30帧后输出的人脸框相差不到0.1像素
+    settle_frames = 30
+
+    def __init__(self, position_weight=1.0 / 20, velocity_weight=1.0 / 160):
+        """
+        初始化滤波器
+
+        Args:
+            position_weight (float): 位置和尺寸噪声的标准差（相对人脸尺寸）
+            velocity_weight (float): 速度噪声的标准差（相对人脸尺寸，每帧）
+        """
+        self.position_weight = position_weight
+        self.velocity_weight = velocity_weight
+        self.transition = np.eye(8)
+        self.transition[:4, 4:] = np.eye(4)
+
+    @staticmethod
+    def to_measurements(boxes):
+        """[x, y, w, h] 转换为 [cx, cy, w, h]"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        return np.concatenate([boxes[:, :2] + boxes[:, 2:] / 2.0, boxes[:, 2:]], axis=1)
+
+    @staticmethod
+    def to_boxes(mean):
+        """状态转换为 [x, y, w, h] 人脸框（宽高至少为1像素）"""
+        size = np.maximum(mean[:, 2:4], 1.0)
+        return np.concatenate([mean[:, :2] - size / 2.0, size], axis=1).astype(np.float32)
+
+    def _scale(self, mean):
+        """每个状态分量噪声的基准尺寸：x方向用宽度，y方向用高度"""
+        size = np.maximum(mean[:, 2:4], 1.0)
+        return np.tile(size, 4)
+
+    def initiate(self, boxes):
+        """
+        用首次检测到的人脸框初始化状态（速度为0，速度的不确定性较大）
+
+        Args:
+            boxes (numpy.ndarray): 形状为(N, 4)的人脸框
+
+        Returns:
+            tuple: (状态(N, 8), 协方差(N, 8, 8))
+        """
+        measurement = self.to_measurements(boxes)
+        mean = np.concatenate([measurement, np.zeros_like(measurement)], axis=1)
+        scale = self._scale(mean)
+        std = np.concatenate([2 * self.position_weight * scale[:, :4], 10 * self.velocity_weight * scale[:, 4:]], axis=1)
+        covariance = np.zeros((len(mean), 8, 8))
+        covariance[:, np.arange(8), np.arange(8)] = std ** 2
+        return mean, covariance
+
+    def predict(self, mean, covariance):
+        """
+        预测下一帧的状态
+
+        Args:
+            mean (numpy.ndarray): 状态(N, 8)
+            covariance (numpy.ndarray): 协方差(N, 8, 8)
+
+        Returns:
+            tuple: 预测后的(状态, 协方差)
+        """
+        scale = self._scale(mean)
+        std = np.concatenate([self.position_weight * scale[:, :4], self.velocity_weight * scale[:, 4:]], axis=1)
+        mean = mean @ self.transition.T
+        covariance = self.transition @ covariance @ self.transition.T
+        covariance[:, np.arange(8), np.arange(8)] += std ** 2
+        return mean, covariance
+
+    def update(self, mean, covariance, boxes):
+        """
+        用检测到的人脸框校正状态
+
+        Args:
+            mean (numpy.ndarray): 预测状态(N, 8)
+            covariance (numpy.ndarray): 预测协方差(N, 8, 8)
+            boxes (numpy.ndarray): 对应的检测框(N, 4)
+
+        Returns:
+            tuple: 校正后的(状态, 协方差)
+        """
+        if len(mean) == 0:
+            return mean, covariance
+        std = self.position_weight * self._scale(mean)[:, :4]
+        innovation_cov = covariance[:, :4, :4].copy()
+        innovation_cov[:, np.arange(4), np.arange(4)] += std ** 2
+        # 卡尔曼增益 K = P H^T S^-1（S对称，通过求解线性方程组得到）
+        gain = np.linalg.solve(innovation_cov, covariance[:, :4, :]).transpose(0, 2, 1)
+        innovation = self.to_measurements(boxes) - mean[:, :4]
+        mean = mean + np.einsum('nij,nj->ni', gain, innovation)
+        covariance = covariance - gain @ covariance[:, :4, :]
+        return mean, covariance
+
+
+class MultiFaceTracker:
+    """
+    多人脸关联跟踪器
+    每帧用IoU + 匈牙利匹配把检测结果关联到已有轨迹，每条轨迹独立记录年龄和连续丢失帧数：
+    某个人脸短暂漏检时，仅该人脸沿用最后位置继续打码，连续丢失超过max_misses帧后删除轨迹。
+    轨迹状态保存在NumPy数组中；只有候选匹配不唯一的轨迹和检测才进入匈牙利算法，
+    大多数帧的关联是向量化的一一匹配，多人脸场景下每帧开销与人脸数量基本成线性关系。
+    启用卡尔曼滤波时，关联使用各轨迹预测的当前位置，漏检期间人脸框按估计的速度继续移动和缩放，
+    检测到的帧输出滤波后的位置以减少抖动
+    """
+
+    def __init__(self, max_misses=5, iou_threshold=0.3, kalman=True):
+        """
+        初始化跟踪器
+
+        Args:
+            max_misses (int): 轨迹连续未匹配时最多延续的帧数
+            iou_threshold (float): 检测与轨迹关联所需的最低IoU
+            kalman (bool): 是否使用恒速卡尔曼滤波预测和平滑人脸框，False时漏检期间沿用最后位置
+        """
+        self.max_misses = max_misses
+        self.iou_threshold = iou_threshold
+        self.kalman = KalmanBoxFilter() if kalman else None
+        self.reset()
+
+    def reset(self):
+        """清空全部轨迹"""
+        self.boxes = np.empty((0, 4), dtype=np.float32)   # 每条轨迹当前的人脸框 [x, y, w, h]
+        self.mean = np.empty((0, 8))                      # 卡尔曼滤波状态 [cx, cy, w, h, vcx, vcy, vw, vh]
+        self.covariance = np.empty((0, 8, 8))             # 卡尔曼滤波协方差
+        self.ids = np.empty(0, dtype=np.int64)            # 轨迹编号
+        self.ages = np.empty(0, dtype=np.int32)           # 轨迹存在的帧数
+        self.hits = np.empty(0, dtype=np.int32)           # 累计匹配到检测的帧数
+        self.misses = np.empty(0, dtype=np.int32)         # 连续未匹配的帧数
+        self.next_id = 0
+        self.output_ids = np.empty(0, dtype=np.int64)
+        self.output_misses = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def warmup_frames(self):
+        """从视频中间开始处理时，重建与从头处理一致的轨迹状态至少需要的预热帧数"""
+        return self.kalman.settle_frames if self.kalman is not None else 0
+
+    def predicted_boxes(self):
+        """
+        各轨迹在下一帧的预测位置（不修改轨迹状态；只读取一次状态数组，可在其他线程中调用）
+
+        Returns:
+            numpy.ndarray: 形状为(N, 4)的人脸框，未启用卡尔曼滤波时为当前位置
+        """
+        if self.kalman is None:
+            return self.boxes.copy()
+        mean = self.mean
+        return self.kalman.to_boxes(mean @ self.kalman.transition.T)
+
+    def associate(self, detections):
+        """
+        将检测结果关联到当前轨迹
+
+        Args:
+            detections (numpy.ndarray): 形状为(M, 4)的检测框
+
+        Returns:
+            tuple: (轨迹索引数组, 检测索引数组)，每对的IoU不低于iou_threshold
+        """
+        if len(self.boxes) == 0 or len(detections) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        iou = box_iou_matrix(self.boxes, detections)
+        candidate = iou >= self.iou_threshold
+        row_counts = candidate.sum(axis=1)
+        col_counts = candidate.sum(axis=0)
+
+        # 只有一个候选且对方也只有这一个候选的，直接匹配
+        unique = candidate & (row_counts[:, None] == 1) & (col_counts[None, :] == 1)
+        track_index, det_index = np.nonzero(unique)
+
+        # 其余存在多个候选的轨迹和检测组成的子矩阵交给匈牙利算法
+        rows = np.flatnonzero(candidate.any(axis=1) & ~unique.any(axis=1))
+        cols = np.flatnonzero(candidate.any(axis=0) & ~unique.any(axis=0))
+        if len(rows) and len(cols):
+            sub_iou = iou[np.ix_(rows, cols)]
+            sub_rows, sub_cols = linear_assignment(1.0 - sub_iou)
+            keep = sub_iou[sub_rows, sub_cols] >= self.iou_threshold
+            track_index = np.concatenate([track_index, rows[sub_rows[keep]]])
+            det_index = np.concatenate([det_index, cols[sub_cols[keep]]])
+        return track_index, det_index
+
+    def update(self, detections):
+        """
+        用当前帧的检测结果更新轨迹
+
+        Args:
+            detections (list | numpy.ndarray): 当前帧检测到的人脸框 [(x, y, w, h), ...]
+
+        Returns:
+            tuple: (输出人脸框数组, 本帧延续打码的轨迹数)。输出按检测顺序排列（已有轨迹的检测为滤波后的位置），
+                   其后是本帧未匹配但仍在延续期内的轨迹（预测位置，未启用卡尔曼滤波时为最后位置）
+        """
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 4)
+        if self.kalman is not None and len(self.ids):
+            self.mean, self.covariance = self.kalman.predict(self.mean, self.covariance)
+            self.boxes = self.kalman.to_boxes(self.mean)
+        track_index, det_index = self.associate(detections)
+
+        matched = np.zeros(len(self.ids), dtype=bool)
+        matched[track_index] = True
+        output = detections.copy()
+        if self.kalman is not None:
+            self.mean[track_index], self.covariance[track_index] = self.kalman.update(
+                self.mean[track_index], self.covariance[track_index], detections[det_index])
+            self.boxes[track_index] = self.kalman.to_boxes(self.mean[track_index])
+            output[det_index] = self.boxes[track_index]
+        else:
+            self.boxes[track_index] = detections[det_index]
+        self.hits[track_index] += 1
+        self.misses[track_index] = 0
+        self.misses[~matched] += 1
+        self.ages += 1
+
+        # 删除连续丢失超过延续帧数的轨迹
+        alive = self.misses <= self.max_misses
+        coasting = alive & ~matched
+        coasting_boxes = self.boxes[coasting]
+        output_ids = np.empty(len(detections), dtype=np.int64)
+        output_ids[det_index] = self.ids[track_index]
+        coasting_ids = self.ids[coasting]
+        coasting_misses = self.misses[coasting]
+        self._keep(alive)
+
+        # 未匹配的检测建立新轨迹
+        new = np.ones(len(detections), dtype=bool)
+        new[det_index] = False
+        count = int(new.sum())
+        if count:
+            self.boxes = np.concatenate([self.boxes, detections[new]])
+            if self.kalman is not None:
+                mean, covariance = self.kalman.initiate(detections[new])
+                self.mean = np.concatenate([self.mean, mean])
+                self.covariance = np.concatenate([self.covariance, covariance])
+            output_ids[new] = np.arange(self.next_id, self.next_id + count)
+            self.ids = np.concatenate([self.ids, output_ids[new]])
+            self.ages = np.concatenate([self.ages, np.ones(count, dtype=np.int32)])
+            self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int32)])
+            self.misses = np.concatenate([self.misses, np.zeros(count, dtype=np.int32)])
+            self.next_id += count
+
+        # 输出框对应的轨迹编号和连续未检测到的帧数（检测到的为0）
+        self.output_ids = np.concatenate([output_ids, coasting_ids])
+        self.output_misses = np.concatenate([np.zeros(len(detections), dtype=np.int32), coasting_misses])
+        return np.concatenate([output, coasting_boxes]), len(coasting_boxes)
+
+    def _keep(self, mask):
+        """仅保留mask选中的轨迹"""
+        self.boxes = self.boxes[mask]
+        if self.kalman is not None:
+            self.mean = self.mean[mask]
+            self.covariance = self.covariance[mask]
+        self.ids = self.ids[mask]
+        self.ages = self.ages[mask]
+        self.hits = self.hits[mask]
+        self.misses = self.misses[mask]
+
+
+class LookaheadGapFiller:
+    """
+    前瞻缓冲的双向补帧（离线处理）
+    最近size帧的跟踪结果（及调用方附带的帧数据）先进入环形缓冲区，离开缓冲区时才输出：
+    某个人脸在缓冲区内重新被检测到时，漏检区间的人脸框改为前后两次检测位置的线性插值；
+    人脸首次出现时，把人脸框向前补到之前的backfill帧，覆盖检测器开始检出之前的几帧。
+    缓冲区只保存帧的引用，内存占用上限为size帧
+    """
+
+    def __init__(self, size, backfill=0):
+        """
+        初始化补帧器
+
+        Args:
+            size (int): 前瞻缓冲的帧数，超过该长度的漏检区间不做插值
+            backfill (int): 人脸首次出现时向前补的帧数（不超过size）
+        """
+        self.size = max(1, size)
+        self.backfill = min(max(0, backfill), self.size)
+        self.reset()
+
+    def reset(self):
+        """清空缓冲区"""
+        self.entries = deque()  # 每帧一项: [附带数据, {轨迹编号: 人脸框}]
+        self.last_seen = {}     # 轨迹编号 -> (最后检测到的帧序号, 人脸框)
+        self.next_index = 0
+        self.stats = {'interpolated_boxes': 0, 'backfilled_boxes': 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, payload, ids, boxes, misses):
+        """
+        加入一帧的跟踪结果
+
+        Args:
+            payload: 调用方附带的数据（如帧图像），原样随输出返回
+            ids (numpy.ndarray): 人脸框对应的轨迹编号
+            boxes (numpy.ndarray): 形状为(N, 4)的人脸框
+            misses (numpy.ndarray): 每个人脸连续未检测到的帧数，0表示本帧检测到
+
+        Returns:
+            list: 离开缓冲区的帧 [(附带数据, 人脸框列表), ...]
+        """
+        index = self.next_index
+        self.next_index += 1
+        first = index - len(self.entries)  # 缓冲区第一项的帧序号
+        current = {}
+        for track_id, box, miss in zip(ids.tolist(), np.asarray(boxes, dtype=np.float32), misses.tolist()):
+            current[track_id] = box
+            if miss:
+                continue
+            previous = self.last_seen.get(track_id)
+            if previous is not None:
+                # 漏检区间：前后两次检测位置之间线性插值（替换延续打码的预测位置）
+                last_index, last_box = previous
+                for j in range(max(last_index + 1, first), index):
+                    t = (j - last_index) / (index - last_index)
+                    self.entries[j - first][1][track_id] = last_box + (box - last_box) * t
+                    self.stats['interpolated_boxes'] += 1
+            else:
+                # 首次出现：向前补backfill帧
+                for j in range(max(index - self.backfill, first), index):
+                    self.entries[j - first][1].setdefault(track_id, box)
+                    self.stats['backfilled_boxes'] += 1
+            self.last_seen[track_id] = (index, box)
+        self.entries.append([payload, current])
+
+        ready = []
+        while len(self.entries) > self.size:
+            ready.append(self._pop())
+        return ready
+
+    def flush(self):
+        """
+        输出缓冲区中剩余的全部帧
+
+        Returns:
+            list: [(附带数据, 人脸框列表), ...]
+        """
+        ready = []
+        while self.entries:
+            ready.append(self._pop())
+        return ready
+
+    def _pop(self):
+        """输出最早的一帧，并清理已超出缓冲范围的轨迹记录"""
+        payload, boxes = self.entries.popleft()
+        oldest = self.next_index - len(self.entries) - 1
+        if len(self.last_seen) > len(boxes):
+            self.last_seen = {key: value for key, value in self.last_seen.items() if value[0] >= oldest}
+        return payload, [tuple(int(value) for value in box) for box in boxes.values()]
+
+
+class MotionGate:
+    """
+    运动门控：画面静止时跳过人脸检测
+    把帧缩小到很小的灰度图（长边work_size像素），与上一次运行检测的帧比较：
+    人脸区域（按margin向外扩大）和画面其余部分的变化像素比例都低于阈值时，认为画面静止，
+    直接沿用上一次的检测结果；连续跳过max_skip帧后强制重新检测
+    """
+
+    def __init__(self, max_skip=30, face_threshold=0.02, scene_threshold=0.005, pixel_threshold=12,
+                 margin=0.5, work_size=96):
+        """
+        初始化运动门控
+
+        Args:
+            max_skip (int): 最多连续跳过检测的帧数
+            face_threshold (float): 人脸区域内变化像素比例的阈值
+            scene_threshold (float): 人脸区域以外变化像素比例的阈值（用于发现新进入画面的人脸）
+            pixel_threshold (int): 灰度差超过该值的像素视为变化
+            margin (float): 人脸区域向外扩大的比例（相对人脸宽高）
+            work_size (int): 比较用灰度图的长边像素数
+        """
+        self.max_skip = max(1, max_skip)
+        self.face_threshold = face_threshold
+        self.scene_threshold = scene_threshold
+        self.pixel_threshold = pixel_threshold
+        self.margin = margin
+        self.work_size = work_size
+        self.reset()
+
+    def reset(self):
+        """清空参考帧和统计"""
+        self.reference = None  # 上一次运行检测的帧（缩小的灰度图）
+        self.current = None    # 最近一次check的帧（缩小的灰度图）
+        self.skipped_in_row = 0
+        self.stats = {'checked': 0, 'skipped': 0, 'forced': 0}
+
+    def _small_gray(self, frame):
+        """缩小为比较用的灰度图，返回(灰度图, 原始坐标到缩小坐标的比例)"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape[:2]
+        scale = min(1.0, self.work_size / max(width, height))
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA), scale
+
+    def check(self, frame, boxes):
+        """
+        判断当前帧能否跳过检测
+
+        Args:
+            frame (numpy.ndarray): 当前帧
+            boxes (list): 上一次检测结果的人脸框 [(x, y, w, h), ...]
+
+        Returns:
+            bool: True表示画面静止，可以沿用上一次的检测结果
+        """
+        small, scale = self._small_gray(frame)
+        self.stats['checked'] += 1
+        self.current = small
+        if self.reference is None or self.reference.shape != small.shape:
+            return False
+        if self.skipped_in_row >= self.max_skip:
+            self.stats['forced'] += 1
+            return False
+
+        changed = cv2.absdiff(small, self.reference) > self.pixel_threshold
+        face_mask = np.zeros(small.shape, dtype=bool)
+        for x, y, w, h in boxes:
+            x0 = int((x - w * self.margin) * scale)
+            y0 = int((y - h * self.margin) * scale)
+            x1 = int(np.ceil((x + w * (1 + self.margin)) * scale))
+            y1 = int(np.ceil((y + h * (1 + self.margin)) * scale))
+            face_mask[max(0, y0):max(0, y1), max(0, x0):max(0, x1)] = True
+
+        face_pixels = np.count_nonzero(face_mask)
+        scene_pixels = face_mask.size - face_pixels
+        if face_pixels and np.count_nonzero(changed & face_mask) > self.face_threshold * face_pixels:
+            return False
+        if scene_pixels and np.count_nonzero(changed & ~face_mask) > self.scene_threshold * scene_pixels:
+            return False
+
+        self.skipped_in_row += 1
+        self.stats['skipped'] += 1
+        return True
+
+    def detected(self):
+        """当前帧运行了检测：以它作为新的参考帧"""
+        self.reference = self.current
+        self.skipped_in_row = 0
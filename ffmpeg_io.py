@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FFmpeg管道读写后端
+通过ffmpeg子进程以rawvideo格式解码/编码视频帧，可控制编码预设、CRF、线程数和像素格式，
+并可把源文件的音轨直接复制到输出。接口与cv2.VideoCapture / cv2.VideoWriter保持一致，
+process_video可以无差别地使用。
+"""
+
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+
+# 编码器名称到ffmpeg视频编码器的映射
+FFMPEG_CODECS = {
+    'auto': 'libx264',
+    'h264': 'libx264',
+    'h265': 'libx265',
+    'av1': 'libaom-av1',
+    'xvid': 'libxvid',
+    'mp4v': 'mpeg4'
+}
+
+
+def ffmpeg_available():
+    """
+    检查系统中是否可以使用ffmpeg
+
+    Returns:
+        bool: ffmpeg是否可用
+    """
+    return shutil.which('ffmpeg') is not None
+
+
+class FFmpegVideoReader:
+    """
+    基于ffmpeg管道的视频读取器
+    解码后的BGR帧直接读入预分配的numpy缓冲区（环形复用），避免逐帧分配内存。
+    注意：read()返回的数组会在读取ring_size帧之后被覆盖，需要长期持有的帧应自行复制。
+    """
+
+    def __init__(self, path, threads=0, ring_size=2):
+        """
+        初始化读取器
+
+        Args:
+            path (str): 输入视频文件路径
+            threads (int): ffmpeg解码线程数，0表示自动
+            ring_size (int): 预分配的帧缓冲区数量
+        """
+        self.path = path
+        self.threads = threads
+        self.process = None
+        self.position = 0
+        self.start_frame = 0
+
+        # 视频属性通过OpenCV读取，无需依赖ffprobe
+        probe = cv2.VideoCapture(path)
+        self.opened = probe.isOpened()
+        self.properties = {
+            cv2.CAP_PROP_FPS: probe.get(cv2.CAP_PROP_FPS),
+            cv2.CAP_PROP_FRAME_WIDTH: probe.get(cv2.CAP_PROP_FRAME_WIDTH),
+            cv2.CAP_PROP_FRAME_HEIGHT: probe.get(cv2.CAP_PROP_FRAME_HEIGHT),
+            cv2.CAP_PROP_FRAME_COUNT: probe.get(cv2.CAP_PROP_FRAME_COUNT),
+            cv2.CAP_PROP_FOURCC: probe.get(cv2.CAP_PROP_FOURCC)
+        }
+        probe.release()
+
+        self.width = int(self.properties[cv2.CAP_PROP_FRAME_WIDTH])
+        self.height = int(self.properties[cv2.CAP_PROP_FRAME_HEIGHT])
+        self.frame_bytes = self.width * self.height * 3
+        self.buffers = []
+        self.next_buffer = 0
+        self.ensure_buffers(ring_size)
+
+    def ensure_buffers(self, count):
+        """
+        确保至少有count个帧缓冲区（多线程流水线中同时在处理的帧较多）
+
+        Args:
+            count (int): 需要的缓冲区数量
+        """
+        while len(self.buffers) < count:
+            self.buffers.append(np.empty((self.height, self.width, 3), dtype=np.uint8))
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.start_frame + self.position)
+        return self.properties.get(prop, 0.0)
+
+    def set(self, prop, value):
+        """
+        只支持在开始读取前设置起始帧（通过ffmpeg的-ss输入定位实现）
+        """
+        if prop != cv2.CAP_PROP_POS_FRAMES or self.process is not None:
+            return False
+        self.start_frame = int(value)
+        return True
+
+    def _start(self):
+        """启动ffmpeg解码子进程"""
+        cmd = ['ffmpeg', '-loglevel', 'error', '-nostdin']
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        fps = self.properties[cv2.CAP_PROP_FPS]
+        if self.start_frame > 0 and fps > 0:
+            cmd += ['-ss', f"{self.start_frame / fps:.6f}"]
+        cmd += ['-i', self.path, '-map', '0:v:0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=self.frame_bytes)
+
+    def read(self):
+        """
+        读取下一帧
+
+        Returns:
+            tuple: (是否成功, 帧数组)
+        """
+        if not self.opened:
+            return False, None
+        if self.process is None:
+            self._start()
+
+        frame = self.buffers[self.next_buffer]
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False, None
+            filled += count
+
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        """结束解码子进程"""
+        if self.process is not None:
+            self.process.stdout.close()
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait()
+            self.process = None
+        self.opened = False
+
+
+class FFmpegVideoWriter:
+    """
+    基于ffmpeg管道的视频写入器
+    帧以rawvideo BGR格式写入ffmpeg标准输入，由ffmpeg按指定的编码器、预设、CRF和线程数编码，
+    可选地从源文件复制音轨
+    """
+
+    def __init__(self, path, fps, width, height, codec='auto', preset='medium', crf=23, threads=0,
+                 pix_fmt='yuv420p', audio_source=None, output_args=None):
+        """
+        初始化写入器
+
+        Args:
+            path (str): 输出视频文件路径
+            fps (float): 帧率
+            width (int): 帧宽度
+            height (int): 帧高度
+            codec (str): 编码器名称（'h264'、'h265'、'av1'、'xvid'、'mp4v'、'auto'）或ffmpeg编码器名
+            preset (str): 编码预设（如ultrafast、veryfast、medium、slow）
+            crf (int): 恒定质量因子，值越小质量越高
+            threads (int): 编码线程数，0表示自动
+            pix_fmt (str): 输出像素格式
+            audio_source (str): 音轨来源文件，为None时输出不含音频
+            output_args (list): 附加的ffmpeg输出参数（如码流过滤器）
+        """
+        self.path = path
+        self.frame_shape = (height, width, 3)
+        fps = fps if fps and fps > 0 else 25.0
+        vcodec = FFMPEG_CODECS.get(codec.lower(), codec)
+
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{width}x{height}", '-r', f"{fps:.6f}", '-i', '-']
+        if audio_source:
+            cmd += ['-i', audio_source, '-map', '0:v:0', '-map', '1:a?', '-c:a', 'copy']
+        cmd += ['-c:v', vcodec, '-pix_fmt', pix_fmt]
+        if vcodec in ('libx264', 'libx265'):
+            cmd += ['-preset', preset, '-crf', str(crf)]
+        elif vcodec == 'libaom-av1':
+            cmd += ['-crf', str(crf), '-b:v', '0']
+        if threads:
+            cmd += ['-threads', str(threads)]
+        if output_args:
+            cmd += list(output_args)
+        cmd.append(path)
+
+        print(f"使用ffmpeg编码: {vcodec}, preset={preset}, crf={crf}, threads={threads or 'auto'}, pix_fmt={pix_fmt}")
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        self.returncode = None
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def write(self, frame):
+        """
+        写入一帧（直接传递数组内存，不额外复制）
+
+        Args:
+            frame (numpy.ndarray): BGR图像帧
+        """
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"帧尺寸不匹配: {frame.shape}，期望 {self.frame_shape}")
+        self.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+
+    def release(self):
+        """
+        结束编码并等待ffmpeg写完文件
+        通常在finally中调用，编码失败时只打印警告而不抛出异常，以免掩盖正在传播的异常；
+        正常结束后应再调用check_returncode()确认输出文件完整
+        """
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.returncode = self.process.wait()
+        self.process = None
+        if self.returncode != 0:
+            print(f"警告: ffmpeg编码失败，退出码: {self.returncode}")
+
+    def check_returncode(self):
+        """
+        确认ffmpeg已正常结束，应在release()之后调用
+
+        Raises:
+            RuntimeError: ffmpeg以非零退出码结束
+        """
+        if self.returncode:
+            raise RuntimeError(f"ffmpeg编码失败，退出码: {self.returncode}")
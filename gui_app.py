@@ -12,21 +12,143 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
+import queue
+import time
 import os
 import sys
 from pathlib import Path
 import cv2
 from PIL import Image, ImageTk
 
-# 导入我们的人脸检测模块
+# 导入我们的人脸检测模块（混合检测器在选中时才导入，避免启动时加载DeepFace）
 from face_detector import VideoFaceDetector
-try:
-    from deepface_detector import HybridFaceDetector
-    HYBRID_AVAILABLE = True
-except ImportError:
-    HYBRID_AVAILABLE = False
+from detector_registry import deepface_installed, load_detector_class
+HYBRID_AVAILABLE = deepface_installed()
+if not HYBRID_AVAILABLE:
     print("警告: HybridFaceDetector不可用，将仅使用YuNet检测器")
 
+# 界面刷新间隔（毫秒）：处理线程只写入更新队列，界面线程按此频率取出并合并后刷新
+UI_REFRESH_MS = 100
+# 预览缩略图的刷新间隔（秒）和宽度（像素）
+THUMBNAIL_INTERVAL = 1.0
+THUMBNAIL_WIDTH = 320
+
+
+class UIUpdateQueue:
+    """
+    处理线程与界面线程之间的更新队列
+    tkinter不是线程安全的，处理线程不直接操作控件：
+    - 日志、完成、出错等消息逐条放入队列
+    - 进度和缩略图只保留最新一份（合并），界面线程每次刷新只处理最新状态
+    """
+    
+    def __init__(self, thumbnail_interval=THUMBNAIL_INTERVAL, thumbnail_width=THUMBNAIL_WIDTH):
+        """
+        初始化更新队列
+        
+        Args:
+            thumbnail_interval (float): 两次缩略图之间的最短间隔（秒）
+            thumbnail_width (int): 缩略图宽度（像素）
+        """
+        self.messages = queue.Queue()
+        self.thumbnail_interval = thumbnail_interval
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_enabled = False
+        self.running = False
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """
+        开始新的处理过程
+        """
+        with self._lock:
+            self._progress = None
+            self._thumbnail = None
+        self._last_thumbnail_time = None
+        self.start_time = time.perf_counter()
+        self.running = True
+    
+    def post(self, kind, *payload):
+        """
+        放入一条需要逐条送达的消息（可在任意线程调用）
+        
+        Args:
+            kind (str): 消息类型，'log'、'done'、'error'或'finished'
+            *payload: 消息内容
+        """
+        self.messages.put((kind,) + payload)
+    
+    def progress_callback(self, processed, total):
+        """
+        process_video的进度回调（处理线程中调用）：只记录最新进度
+        
+        Args:
+            processed (int): 已处理帧数
+            total (int): 总帧数
+            
+        Returns:
+            bool: 是否继续处理
+        """
+        with self._lock:
+            self._progress = (processed, total, time.perf_counter() - self.start_time)
+        return self.running
+    
+    def frame_callback(self, index, frame):
+        """
+        process_video的逐帧回调（处理线程中调用）：按间隔生成缩小的RGB缩略图
+        
+        Args:
+            index (int): 帧序号
+            frame (numpy.ndarray): 渲染后的BGR帧
+        """
+        if not self.thumbnail_enabled:
+            return
+        now = time.perf_counter()
+        if self._last_thumbnail_time is not None and now - self._last_thumbnail_time < self.thumbnail_interval:
+            return
+        self._last_thumbnail_time = now
+        height, width = frame.shape[:2]
+        size = (self.thumbnail_width, max(1, round(height * self.thumbnail_width / width)))
+        # 缩放生成新数组，不保留对复用帧缓冲区的引用
+        thumbnail = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        with self._lock:
+            self._thumbnail = thumbnail
+    
+    def drain(self):
+        """
+        取出自上次以来的全部更新（界面线程中调用）
+        
+        Returns:
+            tuple: (消息列表, 最新进度(已处理帧数, 总帧数, 已用时间)或None, 最新缩略图或None)
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            progress, self._progress = self._progress, None
+            thumbnail, self._thumbnail = self._thumbnail, None
+        return messages, progress, thumbnail
+
+
+def format_eta(seconds):
+    """
+    把剩余秒数格式化为 分:秒 或 时:分:秒
+    
+    Args:
+        seconds (float): 剩余秒数
+        
+    Returns:
+        str: 格式化后的时间
+    """
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
 class VideoFaceDetectorGUI:
     """
     视频人脸检测工具的图形用户界面
@@ -48,7 +170,7 @@ class VideoFaceDetectorGUI:
         """
         self.root = root
         self.root.title("视频人脸检测工具 v1.0")
-        self.root.geometry("800x700")
+        self.root.geometry("800x900")
         self.root.resizable(True, True)
         
         # 应用变量
@@ -63,6 +185,11 @@ class VideoFaceDetectorGUI:
         self.detector = None
         self.current_thread = None
         
+        # 处理线程的界面更新队列和预览缩略图
+        self.updates = UIUpdateQueue()
+        self.show_thumbnail = tk.BooleanVar(value=False)
+        self.thumbnail_image = None
+        
         # 创建界面
         self.create_widgets()
         
@@ -217,6 +344,16 @@ class VideoFaceDetectorGUI:
         
         self.progress_label = ttk.Label(progress_frame, text="就绪")
         self.progress_label.grid(row=1, column=0, sticky=tk.W)
+        
+        # 处理速度和预计剩余时间
+        self.speed_label = ttk.Label(progress_frame, text="")
+        self.speed_label.grid(row=2, column=0, sticky=tk.W)
+        
+        # 处理结果缩略图（低频刷新）
+        ttk.Checkbutton(progress_frame, text="显示预览缩略图", variable=self.show_thumbnail,
+                        command=self.on_thumbnail_toggled).grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        self.thumbnail_label = ttk.Label(progress_frame)
+        self.thumbnail_label.grid(row=4, column=0, pady=(5, 0))
     
     def create_log_frame(self, parent, row):
         """
@@ -274,11 +411,14 @@ class VideoFaceDetectorGUI:
     
     def log_message(self, message):
         """
-        在日志区域显示消息
+        在日志区域显示消息（在处理线程中调用时转为放入更新队列）
         
         Args:
             message: 要显示的消息
         """
+        if threading.current_thread() is not threading.main_thread():
+            self.updates.post('log', message)
+            return
         self.log_text.insert(tk.END, f"{message}\n")
         self.log_text.see(tk.END)
         self.root.update_idletasks()
@@ -295,6 +435,77 @@ class VideoFaceDetectorGUI:
         self.progress_label.config(text=message)
         self.root.update_idletasks()
     
+    def on_thumbnail_toggled(self):
+        """
+        切换预览缩略图：处理线程只在开启时生成缩略图
+        """
+        self.updates.thumbnail_enabled = self.show_thumbnail.get()
+        if not self.updates.thumbnail_enabled:
+            self.thumbnail_label.config(image='')
+            self.thumbnail_image = None
+    
+    def poll_updates(self):
+        """
+        定时取出处理线程的更新并刷新界面（界面线程中运行，处理期间每UI_REFRESH_MS毫秒一次）
+        """
+        messages, progress, thumbnail = self.updates.drain()
+        
+        if progress is not None:
+            processed, total, elapsed = progress
+            percent = processed / total * 100 if total > 0 else 0
+            self.progress_var.set(percent)
+            self.progress_label.config(text=f"处理进度: {processed}/{total}")
+            fps = processed / elapsed if elapsed > 0 else 0
+            eta = (total - processed) / fps if fps > 0 and total > processed else 0
+            self.speed_label.config(text=f"速度: {fps:.1f} 帧/秒    预计剩余: {format_eta(eta)}")
+        
+        if thumbnail is not None and self.show_thumbnail.get():
+            self.thumbnail_image = ImageTk.PhotoImage(Image.fromarray(thumbnail))
+            self.thumbnail_label.config(image=self.thumbnail_image)
+        
+        finished = False
+        for kind, *payload in messages:
+            if kind == 'log':
+                self.log_text.insert(tk.END, f"{payload[0]}\n")
+                self.log_text.see(tk.END)
+            elif kind == 'done':
+                self.show_result(payload[0])
+            elif kind == 'error':
+                self.log_message(f"处理出错: {payload[0]}")
+                messagebox.showerror("错误", f"处理失败: {payload[0]}")
+            elif kind == 'finished':
+                finished = True
+        
+        if finished:
+            # 恢复UI状态
+            self.is_processing = False
+            self.start_button.config(state=tk.NORMAL)
+            self.stop_button.config(state=tk.DISABLED)
+            self.update_progress(0, "就绪")
+            self.speed_label.config(text="")
+        else:
+            self.root.after(UI_REFRESH_MS, self.poll_updates)
+    
+    def show_result(self, result):
+        """
+        显示处理结果（界面线程中调用）
+        
+        Args:
+            result (dict): process_video的处理结果
+        """
+        self.update_progress(100, "处理完成")
+        self.log_message("\n=== 处理完成 ===")
+        self.log_message(f"总处理帧数: {result['processed_frames']}")
+        self.log_message(f"检测到人脸的帧数: {result['frames_with_faces']}")
+        self.log_message(f"总检测人脸数: {result['total_faces_detected']}")
+        self.log_message(f"人脸检测率: {result['detection_rate']:.2%}")
+        self.log_message(f"处理时间: {result['processing_time']:.2f}秒")
+        self.log_message(f"平均速度: {result['fps_processed']:.1f} 帧/秒")
+        
+        # 询问是否打开输出文件
+        if messagebox.askyesno("完成", "处理完成！是否打开输出文件所在目录？"):
+            self.open_output_dir()
+    
     def validate_inputs(self):
         """
         验证输入参数
@@ -343,40 +554,58 @@ class VideoFaceDetectorGUI:
         
         # 清空日志
         self.log_text.delete(1.0, tk.END)
-        
-        # 在新线程中处理视频
-        self.current_thread = threading.Thread(target=self.process_video_thread)
+        self.update_progress(0, "开始处理视频...")
+        self.speed_label.config(text="")
+        
+        # 处理线程读取的界面参数在界面线程中取出
+        self.updates.reset()
+        self.updates.thumbnail_enabled = self.show_thumbnail.get()
+        options = {
+            'detector_type': self.detector_var.get(),
+            'enable_deepface': self.deepface_var.get(),
+            'input_path': self.input_file.get(),
+            'output_path': self.output_file.get(),
+            'apply_mosaic': self.processing_mode.get() == "mosaic",
+            'mosaic_size': self.mosaic_size.get()
+        }
+        
+        # 在新线程中处理视频，界面线程定时取出更新
+        self.current_thread = threading.Thread(target=self.process_video_thread, args=(options,))
         self.current_thread.daemon = True
         self.current_thread.start()
+        self.root.after(UI_REFRESH_MS, self.poll_updates)
     
     def stop_processing(self):
         """
         停止视频处理
         """
-        self.is_processing = False
+        self.updates.running = False
         self.log_message("用户请求停止处理...")
     
-    def process_video_thread(self):
+    def process_video_thread(self, options):
         """
-        在后台线程中处理视频
+        在后台线程中处理视频（不直接操作界面控件，所有更新经由更新队列）
+        
+        Args:
+            options (dict): 启动处理时从界面读取的参数
         """
         try:
             # 初始化检测器
             self.log_message("初始化人脸检测器...")
             
-            detector_type = self.detector_var.get()
+            detector_type = options['detector_type']
+            if HYBRID_AVAILABLE and detector_type.startswith("Hybrid"):
+                HybridFaceDetector = load_detector_class('hybrid')
             if HYBRID_AVAILABLE and detector_type == "Hybrid (DeepFace)":
-                enable_deepface = self.deepface_var.get()
                 self.detector = HybridFaceDetector(
                     primary_backend='deepface',
-                    enable_deepface=enable_deepface
+                    enable_deepface=options['enable_deepface']
                 )
                 self.log_message("使用 Hybrid (DeepFace) 检测器")
             elif HYBRID_AVAILABLE and detector_type == "Hybrid (YuNet)":
-                enable_deepface = self.deepface_var.get()
                 self.detector = HybridFaceDetector(
                     primary_backend='yunet',
-                    enable_deepface=enable_deepface
+                    enable_deepface=options['enable_deepface']
                 )
                 self.log_message("使用 Hybrid (YuNet) 检测器")
             else:
@@ -384,10 +613,10 @@ class VideoFaceDetectorGUI:
                 self.log_message("使用 YuNet 检测器")
             
             # 获取参数
-            input_path = self.input_file.get()
-            output_path = self.output_file.get()
-            apply_mosaic = self.processing_mode.get() == "mosaic"
-            mosaic_size = self.mosaic_size.get()
+            input_path = options['input_path']
+            output_path = options['output_path']
+            apply_mosaic = options['apply_mosaic']
+            mosaic_size = options['mosaic_size']
             
             self.log_message(f"输入文件: {input_path}")
             self.log_message(f"输出文件: {output_path}")
@@ -395,42 +624,23 @@ class VideoFaceDetectorGUI:
             if apply_mosaic:
                 self.log_message(f"马赛克大小: {mosaic_size}")
             
-            # 开始处理
-            self.update_progress(0, "开始处理视频...")
-            
-            # 这里需要修改 VideoFaceDetector 来支持进度回调
             result = self.process_video_with_progress(
                 input_path, output_path, apply_mosaic, mosaic_size
             )
             
-            if self.is_processing:  # 检查是否被用户停止
-                self.update_progress(100, "处理完成")
-                self.log_message("\n=== 处理完成 ===")
-                self.log_message(f"总处理帧数: {result['processed_frames']}")
-                self.log_message(f"检测到人脸的帧数: {result['frames_with_faces']}")
-                self.log_message(f"总检测人脸数: {result['total_faces_detected']}")
-                self.log_message(f"人脸检测率: {result['detection_rate']:.2%}")
-                self.log_message(f"处理时间: {result['processing_time']:.2f}秒")
-                
-                # 询问是否打开输出文件
-                if messagebox.askyesno("完成", "处理完成！是否打开输出文件所在目录？"):
-                    self.open_output_dir()
+            if self.updates.running:  # 检查是否被用户停止
+                self.updates.post('done', result)
             
         except Exception as e:
-            self.log_message(f"处理出错: {str(e)}")
-            messagebox.showerror("错误", f"处理失败: {str(e)}")
+            self.updates.post('error', str(e))
         
         finally:
-            # 恢复UI状态
-            self.is_processing = False
-            self.start_button.config(state=tk.NORMAL)
-            self.stop_button.config(state=tk.DISABLED)
-            if not self.is_processing:
-                self.update_progress(0, "就绪")
+            self.updates.running = False
+            self.updates.post('finished')
     
     def process_video_with_progress(self, input_path, output_path, apply_mosaic, mosaic_size):
         """
-        带进度回调的视频处理
+        带进度回调的视频处理：进度和缩略图写入更新队列，由界面线程定时刷新
         
         Args:
             input_path: 输入视频路径
@@ -441,38 +651,14 @@ class VideoFaceDetectorGUI:
         Returns:
             dict: 处理结果
         """
-        # 这是一个简化版本，实际需要修改 VideoFaceDetector 来支持进度回调
-        # 这里我们模拟进度更新
-        
-        cap = cv2.VideoCapture(input_path)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap.release()
-        
-        # 使用自定义的进度回调
-        class ProgressCallback:
-            def __init__(self, gui, total_frames):
-                self.gui = gui
-                self.total_frames = total_frames
-                self.processed = 0
-            
-            def update(self, processed_frames):
-                self.processed = processed_frames
-                progress = (processed_frames / self.total_frames) * 100
-                self.gui.update_progress(progress, f"处理进度: {processed_frames}/{self.total_frames}")
-                return self.gui.is_processing  # 返回是否继续处理
-        
-        callback = ProgressCallback(self, total_frames)
-        
-        # 调用检测器处理视频（带进度回调）
-        result = self.detector.process_video(
+        return self.detector.process_video(
             input_path, output_path, 
             show_preview=False, 
             apply_mosaic=apply_mosaic, 
             mosaic_size=mosaic_size,
-            progress_callback=callback.update
+            progress_callback=self.updates.progress_callback,
+            frame_callback=self.updates.frame_callback
         )
-        
-        return result
     
     def preview_input(self):
         """
@@ -524,6 +710,7 @@ class VideoFaceDetectorGUI:
         """
         if self.is_processing:
             if messagebox.askokcancel("退出", "正在处理视频，确定要退出吗？"):
+                self.updates.running = False
                 self.is_processing = False
                 self.root.destroy()
         else:
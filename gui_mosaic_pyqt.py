@@ -7,7 +7,10 @@
 
 import sys
 import os
+import json
 import subprocess
+import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
@@ -16,34 +19,141 @@ try:
         QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
         QLabel, QPushButton, QFileDialog, QRadioButton, QButtonGroup,
         QSlider, QLineEdit, QMessageBox, QFrame, QSpacerItem, QSizePolicy,
-        QTextEdit, QScrollArea
+        QTextEdit, QScrollArea, QProgressBar
     )
-    from PyQt5.QtCore import Qt, QThread, pyqtSignal
-    from PyQt5.QtGui import QFont
+    from PyQt5.QtCore import Qt, QThread, QPointF, pyqtSignal
+    from PyQt5.QtGui import QFont, QPainter, QPen, QColor, QPolygonF
 except ImportError:
     print("错误: 需要安装PyQt5")
     print("请运行: pip install PyQt5")
     sys.exit(1)
 
+from stage_timing import STAGES
+
 class ProcessingThread(QThread):
-    """处理视频的后台线程"""
+    """处理视频的后台线程
+    常驻处理服务在运行时把任务提交给服务（复用已加载的模型），否则启动main.py子进程。
+    子进程在标准输出中只输出jsonl事件，其余文本在标准错误中，两者合并读取；输出行和进度事件在本线程中合并，
+    每SIGNAL_INTERVAL秒最多向界面线程发送一次信号，界面线程不会因每一行输出被唤醒
+    """
     
     finished = pyqtSignal(bool, str)  # 完成信号 (成功, 消息)
-    output_received = pyqtSignal(str)  # 输出信号 (输出内容)
+    output_received = pyqtSignal(str)  # 输出信号 (合并后的多行输出内容)
+    progress_updated = pyqtSignal(dict)  # 进度信号 (最新的进度事件)
+    
+    # 两次向界面线程发送信号之间的最短间隔（秒）
+    SIGNAL_INTERVAL = 0.1
     
-    def __init__(self, command):
+    def __init__(self, command, job=None, client=None):
         """初始化处理线程
         
         Args:
             command: 要执行的命令列表
+            job: 提交给常驻处理服务的任务参数，为None时总是启动子进程
+            client: 常驻处理服务客户端，为None时连接默认地址
         """
         super().__init__()
         self.command = command
+        self.job = job
+        self.job_id = None
+        self.client = client
+        self.process = None
+        self.cancelled = False
+        self.pending_lines = []
+        self.latest_progress = None
+        self.last_signal_time = 0.0
+        
+    def handle_line(self, line):
+        """处理一行子进程输出：JSON进度事件只保留最新一条，其余作为日志文本
+        
+        Args:
+            line: 去掉换行符的输出行
+        """
+        if line.startswith("{"):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            if isinstance(event, dict) and "event" in event:
+                if event["event"] == "progress":
+                    self.latest_progress = event
+                return
+        self.pending_lines.append(line)
+        
+    def flush(self, force=False):
+        """把合并后的输出和最新进度发送给界面线程
+        
+        Args:
+            force: 忽略发送间隔立即发送（处理结束时）
+        """
+        now = time.monotonic()
+        if not force and now - self.last_signal_time < self.SIGNAL_INTERVAL:
+            return
+        self.last_signal_time = now
+        if self.pending_lines:
+            self.output_received.emit("\n".join(self.pending_lines))
+            self.pending_lines = []
+        if self.latest_progress is not None:
+            self.progress_updated.emit(self.latest_progress)
+            self.latest_progress = None
+        
+    def cancel(self):
+        """取消处理：取消处理服务中的任务，或结束main.py子进程
+        可在任意线程中调用；任务尚未提交或子进程尚未启动时，在提交/启动后立即取消
+        """
+        self.cancelled = True
+        if self.client is not None and self.job_id is not None:
+            self.client.cancel(self.job_id)
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+        
+    def run_with_daemon(self):
+        """通过常驻处理服务执行任务"""
+        job = self.client.submit(**self.job)
+        self.job_id = job['job_id']
+        self.output_received.emit(f"已提交到处理服务 {self.client.url}: 任务 {self.job_id}")
+        if self.cancelled:
+            self.client.cancel(self.job_id)
+        
+        final = job
+        for event in self.client.events(self.job_id):
+            final = event
+            # 服务的任务状态转换为与jsonl进度事件相同的格式
+            processed, total, elapsed = event['processed'], event['total'], event['elapsed']
+            fps = processed / elapsed if elapsed > 0 else 0.0
+            self.latest_progress = {
+                "event": "progress", "processed": processed, "total": total,
+                "percent": event['progress'] * 100, "elapsed": elapsed, "fps": fps,
+                "eta": (total - processed) / fps if fps > 0 and total > processed else 0.0
+            }
+            self.flush()
+        self.flush(force=True)
+        
+        if final['state'] == 'done':
+            result = final['result']
+            self.output_received.emit(f"总处理帧数: {result['processed_frames']}")
+            self.output_received.emit(f"处理速度: {result['fps_processed']:.2f}帧/秒")
+            self.finished.emit(True, "处理完成！")
+        elif final['state'] == 'cancelled':
+            self.finished.emit(False, "任务已取消")
+        else:
+            self.finished.emit(False, f"处理失败: {final['error']}")
         
     def run(self):
         """执行处理任务"""
+        if self.job is not None:
+            if self.client is None:
+                from mosaic_daemon import DaemonClient
+                self.client = DaemonClient()
+            if self.client.is_running():
+                try:
+                    self.run_with_daemon()
+                except Exception as e:
+                    self.finished.emit(False, f"处理服务调用失败: {str(e)}")
+                return
+        
         try:
-            process = subprocess.Popen(
+            self.process = process = subprocess.Popen(
                 self.command,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,  # 将stderr重定向到stdout
@@ -51,19 +161,25 @@ class ProcessingThread(QThread):
                 bufsize=1,  # 行缓冲
                 universal_newlines=True
             )
+            if self.cancelled:
+                process.terminate()
             
-            # 实时读取输出
+            # 实时读取输出，合并后按间隔发送
             while True:
                 output = process.stdout.readline()
                 if output == '' and process.poll() is not None:
                     break
                 if output:
-                    self.output_received.emit(output.strip())
+                    self.handle_line(output.strip())
+                    self.flush()
+            self.flush(force=True)
             
             # 等待进程结束
             process.wait()
             
-            if process.returncode == 0:
+            if self.cancelled:
+                self.finished.emit(False, "任务已取消")
+            elif process.returncode == 0:
                 self.finished.emit(True, "处理完成！")
             else:
                 self.finished.emit(False, f"处理失败，退出码: {process.returncode}")
@@ -71,6 +187,60 @@ class ProcessingThread(QThread):
         except Exception as e:
             self.finished.emit(False, f"执行失败: {str(e)}")
 
+class ThroughputGraph(QWidget):
+    """处理速度曲线：显示相邻两次进度事件之间的瞬时帧率"""
+    
+    def __init__(self, capacity=120, parent=None):
+        """初始化曲线
+        
+        Args:
+            capacity: 保留的采样点数
+            parent: 父部件
+        """
+        super().__init__(parent)
+        self.points = deque(maxlen=capacity)
+        self.last_sample = None
+        self.setMinimumHeight(70)
+        
+    def clear(self):
+        """清空曲线"""
+        self.points.clear()
+        self.last_sample = None
+        self.update()
+        
+    def add_progress(self, event):
+        """根据进度事件添加一个采样点
+        
+        Args:
+            event: 进度事件
+        """
+        sample = (event["elapsed"], event["processed"])
+        if self.last_sample is not None and sample[0] > self.last_sample[0]:
+            self.points.append((sample[1] - self.last_sample[1]) / (sample[0] - self.last_sample[0]))
+            self.update()
+        self.last_sample = sample
+        
+    def paintEvent(self, event):
+        """绘制曲线"""
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#f5f5f5"))
+        painter.setPen(QColor("#cccccc"))
+        painter.drawRect(self.rect().adjusted(0, 0, -1, -1))
+        if len(self.points) < 2:
+            return
+        
+        peak = max(self.points) or 1.0
+        width, height = self.width(), self.height()
+        step = width / (self.points.maxlen - 1)
+        polyline = QPolygonF([QPointF(i * step, height - 4 - (height - 20) * value / peak)
+                              for i, value in enumerate(self.points)])
+        pen = QPen(QColor("#4CAF50"))
+        pen.setWidth(2)
+        painter.setPen(pen)
+        painter.drawPolyline(polyline)
+        painter.setPen(QColor("#666666"))
+        painter.drawText(6, 14, f"当前 {self.points[-1]:.1f} 帧/秒  峰值 {peak:.1f} 帧/秒")
+
 class MosaicGUI(QMainWindow):
     """视频人脸打码GUI主类"""
     
@@ -81,7 +251,7 @@ class MosaicGUI(QMainWindow):
         self.setGeometry(100, 100, 600, 500)
         
         # 固定窗口大小，禁用调整大小
-        self.setFixedSize(600, 800)
+        self.setFixedSize(600, 940)
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowMaximizeButtonHint)
         
         # 初始化变量
@@ -135,7 +305,10 @@ class MosaicGUI(QMainWindow):
         # 8. 延续帧数设置
         self.create_continuation_frames_selector(layout)
         
-        # 9. 输出日志区域
+        # 9. 处理进度和处理速度曲线
+        self.create_progress_area(layout)
+        
+        # 10. 输出日志区域
         self.create_output_log(layout)
         
         # 控制按钮
@@ -383,6 +556,25 @@ class MosaicGUI(QMainWindow):
         
         layout.addLayout(frames_layout)
         
+    def create_progress_area(self, layout):
+        """创建进度条、进度信息和处理速度曲线
+        
+        Args:
+            layout: 父布局
+        """
+        layout.addWidget(self.create_section_label("处理进度:"))
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+        
+        self.progress_label = QLabel("等待开始")
+        layout.addWidget(self.progress_label)
+        
+        self.throughput_graph = ThroughputGraph()
+        layout.addWidget(self.throughput_graph)
+        
     def create_output_log(self, layout):
         """创建输出日志区域
         
@@ -444,6 +636,12 @@ class MosaicGUI(QMainWindow):
         """)
         button_layout.addWidget(self.start_button)
         
+        # 取消处理按钮（处理中可用）
+        self.cancel_button = QPushButton("取消处理")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        button_layout.addWidget(self.cancel_button)
+        
         layout.addLayout(button_layout)
         
     def select_input_file(self):
@@ -599,8 +797,33 @@ class MosaicGUI(QMainWindow):
         # 编码器
         cmd.extend(["--codec", self.codec])
         
+        # 进度以JSON事件输出，由界面直接解析
+        cmd.extend(["--progress-format", "jsonl", "--progress-interval", "0.25"])
+        
         return cmd
         
+    def build_job(self, output_file):
+        """构建提交给常驻处理服务的任务参数
+        
+        Args:
+            output_file: 输出文件路径
+            
+        Returns:
+            dict: 任务参数；预览模式需要显示窗口，不通过服务处理，返回None
+        """
+        if self.output_mode == "preview":
+            return None
+        return {
+            "input_path": os.path.abspath(self.input_file),
+            "output_path": os.path.abspath(output_file),
+            "detector": self.detector,
+            "deepface_backend": self.profile_detector,
+            "continuation_frames": self.continuation_frames,
+            "apply_mosaic": True,
+            "mosaic_size": self.mosaic_size,
+            "codec": self.codec
+        }
+        
     def start_processing(self):
         """开始处理视频"""
         if not self.validate_inputs():
@@ -622,21 +845,60 @@ class MosaicGUI(QMainWindow):
         if reply != QMessageBox.Yes:
             return
             
-        # 禁用开始按钮
+        # 禁用开始按钮，启用取消按钮
         self.start_button.setEnabled(False)
         self.start_button.setText("处理中...")
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setText("取消处理")
         
         # 清空输出日志
         self.output_text.clear()
         self.output_text.append(f"执行命令: {' '.join(cmd)}")
         self.output_text.append("=" * 50)
         
-        # 创建并启动处理线程
-        self.processing_thread = ProcessingThread(cmd)
+        # 重置进度显示
+        self.progress_bar.setValue(0)
+        self.progress_label.setText("启动中...")
+        self.throughput_graph.clear()
+        
+        # 创建并启动处理线程（常驻处理服务在运行时优先使用）
+        job = self.build_job(cmd[cmd.index("--output") + 1]) if "--output" in cmd else None
+        self.processing_thread = ProcessingThread(cmd, job)
         self.processing_thread.finished.connect(self.on_processing_finished)
         self.processing_thread.output_received.connect(self.on_output_received)
+        self.processing_thread.progress_updated.connect(self.on_progress_updated)
         self.processing_thread.start()
         
+    def cancel_processing(self):
+        """取消正在进行的处理（常驻处理服务中的任务或main.py子进程）"""
+        if self.processing_thread is None or not self.processing_thread.isRunning():
+            return
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setText("正在取消...")
+        self.progress_label.setText("正在取消...")
+        self.processing_thread.cancel()
+        
+    def closeEvent(self, event):
+        """关闭窗口时取消正在进行的处理，并等待处理线程结束
+        
+        Args:
+            event: 关闭事件
+        """
+        if self.processing_thread is not None and self.processing_thread.isRunning():
+            reply = QMessageBox.question(
+                self,
+                "确认退出",
+                "正在处理视频，退出将取消当前任务。是否退出？",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+            self.processing_thread.cancel()
+            self.processing_thread.wait()
+        event.accept()
+        
     def on_processing_finished(self, success, message):
         """处理完成时的回调
         
@@ -644,12 +906,18 @@ class MosaicGUI(QMainWindow):
             success: 是否成功
             message: 结果消息
         """
-        # 恢复开始按钮
+        # 恢复开始按钮，禁用取消按钮
         self.start_button.setEnabled(True)
         self.start_button.setText("开始处理")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setText("取消处理")
         
         # 显示结果
-        if success:
+        if self.processing_thread is not None and self.processing_thread.cancelled:
+            self.progress_label.setText("已取消")
+            self.output_text.append(message)
+        elif success:
+            self.progress_bar.setValue(100)
             if self.output_mode == "mosaic":
                 output_file = self.generate_output_filename()
                 QMessageBox.information(self, "成功", f"处理完成！\n输出文件: {output_file}")
@@ -658,6 +926,25 @@ class MosaicGUI(QMainWindow):
         else:
             QMessageBox.critical(self, "错误", message)
             
+    def on_progress_updated(self, event):
+        """接收到进度事件时的回调
+        
+        Args:
+            event: 进度事件（processed、total、percent、fps、eta，子进程模式下还有人脸数和各阶段耗时）
+        """
+        self.progress_bar.setValue(int(event["percent"]))
+        eta = int(event["eta"])
+        text = (f"{event['processed']}/{event['total']} 帧  {event['fps']:.1f} 帧/秒  "
+                f"剩余 {eta // 60:02d}:{eta % 60:02d}")
+        if "frames_with_faces" in event:
+            text += f"  有人脸 {event['frames_with_faces']} 帧"
+        stages = event.get("stages")
+        if stages:
+            slowest = max(stages, key=stages.get)
+            text += f"  耗时最多: {STAGES.get(slowest, slowest)}"
+        self.progress_label.setText(text)
+        self.throughput_graph.add_progress(event)
+        
     def on_output_received(self, output):
         """接收到程序输出时的回调
         
@@ -11,12 +11,11 @@
 import argparse
 import sys
 import os
-from face_detector import VideoFaceDetector
-try:
-    from deepface_detector import HybridFaceDetector
-    DEEPFACE_AVAILABLE = True
-except ImportError:
-    DEEPFACE_AVAILABLE = False
+# 检测器后端在选中时才导入，默认的YuNet路径不会导入DeepFace/TensorFlow
+from detector_registry import DETECTORS, create_detector
+
+# --model可直接使用的模型变体名称（与model_selector.MODEL_VARIANTS一致，此处不导入以免启动时加载OpenCV）
+MODEL_CHOICES = ('auto', 'fp32', 'int8', 'int8bq')
 
 def parse_arguments():
     """
@@ -39,7 +38,20 @@ def parse_arguments():
   python main.py video.mp4 --mosaic --output mosaic.mp4  # 应用马赛克并保存
   python main.py video.mp4 --mosaic --mosaic-size 10 --preview  # 细腻马赛克预览
   python main.py video.mp4 --continuation-frames 10 --mosaic --output output.mp4  # 延续打码10帧策略
+  python main.py video.mp4 --lookahead 30 --backfill-frames 5 --mosaic --output out.mp4  # 离线前瞻补帧：漏检区间前后插值
   python main.py video.mp4 --output result.mp4 --codec h264     # 使用H.264编码器输出
+  python main.py video.mp4 --detect-size 640 --mosaic --output out.mp4  # 长边缩小到640像素再检测（适合1080p/4K）
+  python main.py video.mp4 --detect-interval 4 --mosaic --output out.mp4  # 每4帧检测一次，中间帧光流跟踪
+  python main.py video.mp4 --motion-gate 25 --mosaic --output out.mp4  # 静止画面跳过检测（监控、讲座录像），最多连续跳过25帧
+  python main.py video.mp4 --roi-detection 30 --mosaic --output out.mp4  # 只在人脸轨迹周围检测，每30次检测做一次全画面检测
+  python main.py video.mp4 --pipeline-workers 4 --mosaic --output out.mp4  # 多线程流水线（4个检测线程）
+  python main.py video.mp4 --segments 8 --mosaic --output out.mp4  # 长视频分8段多进程并行处理
+  python main.py video.mp4 --io-backend ffmpeg --ffmpeg-preset veryfast --ffmpeg-crf 20 --mosaic --output out.mp4  # ffmpeg管道编码并保留音轨
+  python main.py video.mp4 --smart-render --mosaic --output out.mp4  # 只重新编码含人脸的GOP，其余直接复制码流
+  python main.py video.mp4 --sidecar video.faces.npz --mosaic --output out.mp4  # 检测并保存检测结果缓存
+  python main.py video.mp4 --render-from-sidecar video.faces.npz --mosaic --mosaic-size 20 --output out.mp4  # 只调整打码参数，不重新检测
+  python main.py video.mp4 --daemon --mosaic --output out.mp4  # 提交给常驻处理服务（python mosaic_daemon.py serve）
+  python main.py video.mp4 --multi-scale-budget 15 --mosaic --output out.mp4  # 多尺度回退检测每帧最多15毫秒
         """
     )
     
@@ -61,7 +73,8 @@ def parse_arguments():
     
     parser.add_argument(
         '--model',
-        help='自定义YuNet模型文件路径（可选）'
+        help="YuNet模型：auto（按本机测量结果自动选择，没有缓存时先测量）、fp32、int8、int8bq 或自定义模型文件路径"
+             "（默认：使用已缓存的测量结果，没有缓存时使用fp32）"
     )
     
     parser.add_argument(
@@ -79,7 +92,7 @@ def parse_arguments():
     
     parser.add_argument(
         '--detector',
-        choices=['yunet', 'deepface', 'hybrid'],
+        choices=list(DETECTORS),
         default='yunet',
         help='选择人脸检测器：yunet（默认，快速）、deepface（高精度）、hybrid（混合模式）'
     )
@@ -98,6 +111,20 @@ def parse_arguments():
         help='无人脸检测时延续打码的帧数（默认：5帧）'
     )
     
+    parser.add_argument(
+        '--lookahead',
+        type=int,
+        default=0,
+        help='离线前瞻补帧的缓冲帧数：输出延迟N帧，人脸重新被检测到时对漏检区间按前后位置插值打码（默认：0，不启用）'
+    )
+    
+    parser.add_argument(
+        '--backfill-frames',
+        type=int,
+        default=0,
+        help='人脸首次被检测到时向前补打码的帧数，需要同时指定 --lookahead，不超过缓冲帧数（默认：0）'
+    )
+    
     parser.add_argument(
         '--codec', '--encoder',
         choices=['h264', 'auto'],
@@ -105,6 +132,165 @@ def parse_arguments():
         help='输出视频编码器：h264（H.264/AVC）、auto（自动选择，默认）'
     )
     
+    parser.add_argument(
+        '--detect-size',
+        type=int,
+        default=None,
+        help='检测分辨率（长边像素数，例如640，YuNet和DeepFace检测均适用），帧缩小后检测再映射回原始坐标；默认使用原始分辨率'
+    )
+    
+    parser.add_argument(
+        '--detect-interval',
+        type=int,
+        default=1,
+        help='关键帧检测间隔：每N帧运行一次完整检测，中间帧用光流传播人脸框（默认：1，每帧检测）'
+    )
+    
+    parser.add_argument(
+        '--motion-gate',
+        type=int,
+        default=0,
+        help='运动门控：缩小的灰度帧与上次检测的帧相比，人脸区域及其余画面都没有变化时沿用上次的检测结果，'
+             '最多连续跳过N帧检测（适合监控、讲座等静止画面，默认：0，每帧检测）'
+    )
+    
+    parser.add_argument(
+        '--roi-detection',
+        type=int,
+        default=0,
+        help='跟踪区域检测：已有人脸轨迹时只在预测位置周围的区域内检测，'
+             '每N次检测或镜头切换时做一次全画面检测以发现新出现的人脸（默认：0，关闭）'
+    )
+    
+    parser.add_argument(
+        '--multi-scale',
+        choices=['adaptive', 'always', 'off'],
+        default='adaptive',
+        help='无人脸帧的多尺度回退检测策略：adaptive（默认，命中率低时自动精简）、always（始终尝试全部尺度）、off（关闭）'
+    )
+    
+    parser.add_argument(
+        '--multi-scale-budget',
+        type=float,
+        default=None,
+        help='多尺度回退检测的单帧时间预算（毫秒，可选）'
+    )
+    
+    parser.add_argument(
+        '--pipeline-workers',
+        type=int,
+        default=0,
+        help='多线程流水线的检测线程数（读取/检测/跟踪/渲染/写入并行），0表示串行处理（默认：0）'
+    )
+    
+    parser.add_argument(
+        '--segments',
+        type=int,
+        default=1,
+        help='把视频按帧序号切成N段，在N个进程中并行处理后按顺序拼接（仅YuNet检测器，默认：1，不分段）'
+    )
+    
+    parser.add_argument(
+        '--segment-preroll',
+        type=int,
+        default=30,
+        help='分段处理时每段开始前用于预热跟踪状态的帧数（默认：30）'
+    )
+    
+    parser.add_argument(
+        '--io-backend',
+        choices=['opencv', 'ffmpeg'],
+        default='opencv',
+        help='视频读写后端：opencv（默认）、ffmpeg（通过管道调用ffmpeg，可设置编码参数并保留音轨）'
+    )
+    
+    parser.add_argument(
+        '--ffmpeg-preset',
+        default='medium',
+        help='ffmpeg编码预设，如ultrafast、veryfast、medium、slow（默认：medium）'
+    )
+    
+    parser.add_argument(
+        '--ffmpeg-crf',
+        type=int,
+        default=23,
+        help='ffmpeg恒定质量因子CRF，值越小质量越高（默认：23）'
+    )
+    
+    parser.add_argument(
+        '--ffmpeg-threads',
+        type=int,
+        default=0,
+        help='ffmpeg编解码线程数，0表示自动（默认：0）'
+    )
+    
+    parser.add_argument(
+        '--ffmpeg-pix-fmt',
+        default='yuv420p',
+        help='ffmpeg输出像素格式（默认：yuv420p）'
+    )
+    
+    parser.add_argument(
+        '--no-audio',
+        action='store_true',
+        help='ffmpeg后端不复制源文件音轨'
+    )
+    
+    parser.add_argument(
+        '--sidecar',
+        help='检测结果缓存文件（.npz）：不存在或与当前检测参数不一致时检测并写入，一致时直接回放'
+    )
+    
+    parser.add_argument(
+        '--render-from-sidecar',
+        help='仅渲染模式：从检测结果缓存回放检测结果并重新跟踪、打码，不运行检测器'
+    )
+    
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='提交给常驻处理服务（复用已加载的模型），服务未运行时在本进程处理'
+    )
+    
+    parser.add_argument(
+        '--daemon-url',
+        default=None,
+        help='常驻处理服务地址（默认：http://127.0.0.1:8765）'
+    )
+    
+    parser.add_argument(
+        '--log-level',
+        choices=['debug', 'info', 'warning', 'error'],
+        default='info',
+        help='处理日志级别：debug时输出逐帧消息（如延续打码，按时间限速），默认只输出汇总（默认：info）'
+    )
+    
+    parser.add_argument(
+        '--progress-format',
+        choices=['text', 'jsonl'],
+        default='text',
+        help='进度输出格式：text（"处理进度"文本行）或 jsonl（每行一个JSON事件，含帧数、fps、预计剩余时间、各阶段耗时和人脸数，供GUI解析）（默认：text）'
+    )
+    
+    parser.add_argument(
+        '--progress-interval',
+        type=float,
+        default=None,
+        help='进度输出的最短间隔（秒），默认text每30帧一次、jsonl每0.5秒一次'
+    )
+    
+    parser.add_argument(
+        '--timing',
+        action='store_true',
+        help='处理结束后打印分阶段耗时表（解码/检测/多尺度回退/跟踪/渲染/编码的累计时间和p50/p95/p99）'
+    )
+    
+    parser.add_argument(
+        '--smart-render',
+        action='store_true',
+        help='两遍智能重编码：先检测需要打码的帧，只重新编码包含人脸的GOP，其余GOP直接复制码流（需要ffmpeg和--mosaic --output）'
+    )
+    
     return parser.parse_args()
 
 def validate_input(args):
@@ -136,69 +322,301 @@ def validate_input(args):
             print(f"错误: 输出目录不存在: {output_dir}")
             return False
     
+    # 检查检测分辨率
+    if args.detect_size is not None and args.detect_size < 0:
+        print(f"错误: 检测分辨率必须为正整数: {args.detect_size}")
+        return False
+    
+    if args.detect_interval < 1:
+        print(f"错误: 关键帧检测间隔必须大于等于1: {args.detect_interval}")
+        return False
+    
+    if args.motion_gate < 0:
+        print(f"错误: 运动门控的最大跳过帧数不能为负数: {args.motion_gate}")
+        return False
+    
+    if args.roi_detection < 0:
+        print(f"错误: 跟踪区域检测的全画面检测间隔不能为负数: {args.roi_detection}")
+        return False
+    
+    if args.lookahead < 0 or args.backfill_frames < 0:
+        print("错误: 前瞻缓冲帧数和向前补打码帧数不能为负数")
+        return False
+    
+    if args.backfill_frames and not args.lookahead:
+        print("错误: --backfill-frames 需要同时指定 --lookahead")
+        return False
+    
+    if args.smart_render and not (args.mosaic and args.output):
+        print("错误: 智能重编码需要同时指定 --mosaic 和 --output")
+        return False
+    
+    if args.io_backend == 'ffmpeg' or args.smart_render:
+        import shutil
+        if shutil.which('ffmpeg') is None:
+            print("错误: 未找到ffmpeg，请先安装ffmpeg或使用 --io-backend opencv")
+            return False
+    
+    if args.render_from_sidecar and not os.path.exists(args.render_from_sidecar):
+        print(f"错误: 检测结果缓存不存在: {args.render_from_sidecar}")
+        return False
+    
+    if (args.sidecar or args.render_from_sidecar) and args.segments > 1:
+        print("错误: 检测结果缓存不支持分段并行处理")
+        return False
+    
     # 检查自定义模型文件
-    if args.model and not os.path.exists(args.model):
+    if args.model and args.model not in MODEL_CHOICES and not os.path.exists(args.model):
         print(f"错误: YuNet模型文件不存在: {args.model}")
         return False
     
     return True
 
+def build_daemon_job(args, ffmpeg_options):
+    """
+    把命令行参数转换为常驻处理服务的任务参数
+    
+    Args:
+        args (argparse.Namespace): 命令行参数
+        ffmpeg_options (dict): ffmpeg读写后端参数
+        
+    Returns:
+        dict: 任务参数（路径均为绝对路径，服务进程的工作目录可能不同）
+    """
+    def absolute(path):
+        return os.path.abspath(path) if path else None
+    
+    return {
+        'input_path': absolute(args.input_video),
+        'output_path': absolute(args.output),
+        'detector': args.detector,
+        'model': args.model if args.model in MODEL_CHOICES else absolute(args.model),
+        'deepface_backend': args.deepface_backend,
+        'multi_scale': args.multi_scale,
+        'multi_scale_budget_ms': args.multi_scale_budget,
+        'continuation_frames': args.continuation_frames,
+        'apply_mosaic': args.mosaic,
+        'mosaic_size': args.mosaic_size,
+        'codec': args.codec,
+        'detect_size': args.detect_size,
+        'detect_interval': args.detect_interval,
+        'pipeline_workers': args.pipeline_workers,
+        'io_backend': args.io_backend,
+        'ffmpeg_options': ffmpeg_options,
+        'sidecar_path': absolute(args.sidecar),
+        'replay_sidecar': absolute(args.render_from_sidecar),
+        'lookahead_frames': args.lookahead,
+        'backfill_frames': args.backfill_frames,
+        'motion_gate': args.motion_gate,
+        'roi_detection': args.roi_detection
+    }
+
+def run_with_daemon(args, ffmpeg_options):
+    """
+    尝试把任务交给常驻处理服务
+    
+    Args:
+        args (argparse.Namespace): 命令行参数
+        ffmpeg_options (dict): ffmpeg读写后端参数
+        
+    Returns:
+        bool: 任务是否由处理服务完成；服务未运行或任务不支持时返回False
+    """
+    if args.preview or args.smart_render or args.segments > 1 or args.progress_format != 'text':
+        print("提示: 预览、智能重编码、分段处理和jsonl进度输出不通过处理服务执行，改为本进程处理")
+        return False
+    
+    from mosaic_daemon import DaemonClient
+    client = DaemonClient(args.daemon_url)
+    if not client.is_running():
+        print(f"提示: 处理服务未运行 ({client.url})，改为本进程处理")
+        return False
+    
+    final = client.run(**build_daemon_job(args, ffmpeg_options))
+    if final['state'] == 'failed':
+        raise RuntimeError(final['error'])
+    if final['state'] == 'cancelled':
+        print("任务已取消")
+        sys.exit(1)
+    
+    result = final['result']
+    print(f"\n处理完成! (处理服务任务 {final['job_id']})")
+    print(f"总处理帧数: {result['processed_frames']}")
+    print(f"检测到人脸的帧数: {result['frames_with_faces']}")
+    print(f"人脸检测率: {result['detection_rate']:.2%}")
+    print(f"处理时间: {result['processing_time']:.2f}秒")
+    print(f"处理速度: {result['fps_processed']:.2f}帧/秒")
+    if args.timing and 'timing' in result:
+        print_timing(result['timing'])
+    return True
+
+def print_timing(timing):
+    """
+    打印分阶段耗时表
+    
+    Args:
+        timing (dict): process_video结果中的'timing'
+    """
+    from stage_timing import format_timing_table
+    print("\n分阶段耗时:")
+    print(format_timing_table(timing))
+
 def main():
     """
     主函数
     """
-    print("视频人脸检测工具 v1.0")
-    print("=" * 40)
-    
     # 解析命令行参数
     args = parse_arguments()
     
+    # jsonl进度输出时标准输出只包含JSON事件（供GUI逐行解析），其余输出改到标准错误
+    if args.progress_format == 'jsonl':
+        from event_log import reserve_stdout_for_events
+        reserve_stdout_for_events()
+    
+    print("视频人脸检测工具 v1.0")
+    print("=" * 40)
+    
     # 验证输入参数
     if not validate_input(args):
         sys.exit(1)
     
+    # 处理日志级别
+    from event_log import set_log_level
+    set_log_level(args.log_level)
+    
     try:
-        # 创建人脸检测器
-        if args.detector == 'yunet':
-            print("初始化YuNet人脸检测器...")
-            detector = VideoFaceDetector(model_path=args.model, continuation_frames=args.continuation_frames)
-        elif args.detector == 'deepface':
-            if not DEEPFACE_AVAILABLE:
-                print("错误: DeepFace不可用，请先安装DeepFace或选择其他检测器")
-                print("安装命令: pip install deepface")
-                sys.exit(1)
-            print(f"初始化DeepFace检测器 - 后端: {args.deepface_backend}...")
-            detector = HybridFaceDetector(primary_backend=args.deepface_backend, enable_deepface=True, continuation_frames=args.continuation_frames)
-        elif args.detector == 'hybrid':
-            if not DEEPFACE_AVAILABLE:
-                print("错误: DeepFace不可用，回退到YuNet检测器")
-                detector = VideoFaceDetector(model_path=args.model, continuation_frames=args.continuation_frames)
-            else:
-                print(f"初始化混合检测器（YuNet + DeepFace） - DeepFace后端: {args.deepface_backend}...")
-                detector = HybridFaceDetector(primary_backend='yunet', enable_deepface=True, deepface_backend=args.deepface_backend, continuation_frames=args.continuation_frames)
-        else:
-            print("错误: 未知的检测器类型")
+        # ffmpeg读写后端参数
+        ffmpeg_options = {
+            'preset': args.ffmpeg_preset,
+            'crf': args.ffmpeg_crf,
+            'threads': args.ffmpeg_threads,
+            'pix_fmt': args.ffmpeg_pix_fmt,
+            'audio': not args.no_audio
+        }
+        
+        # 常驻处理服务：复用已加载的模型，本进程只负责提交任务和显示进度
+        if args.daemon and run_with_daemon(args, ffmpeg_options):
+            if args.output and os.path.exists(args.output):
+                output_size = os.path.getsize(args.output) / (1024 * 1024)  # MB
+                print(f"输出文件已保存: {args.output} ({output_size:.1f} MB)")
+            return
+        
+        # YuNet检测器的通用参数
+        detector_kwargs = {
+            'multi_scale': args.multi_scale,
+            'multi_scale_budget_ms': args.multi_scale_budget
+        }
+        
+        # 创建人脸检测器（只导入所选的检测器后端）
+        try:
+            detector = create_detector(args.detector, model_path=args.model,
+                                       continuation_frames=args.continuation_frames,
+                                       deepface_backend=args.deepface_backend, **detector_kwargs)
+        except RuntimeError as e:
+            print(f"错误: {e}")
             sys.exit(1)
         
+        # 进度输出格式
+        from event_log import create_event_log
+        detector.events = create_event_log(args.progress_format, args.progress_interval)
+        if args.progress_format != 'text' and args.segments > 1:
+            print("提示: 分段并行处理的各进程使用文本进度输出")
+        
         # 处理视频
         print(f"输入视频: {args.input_video}")
         if args.output:
             print(f"输出视频: {args.output}")
             print(f"输出编码器: {args.codec}")
+            if args.io_backend == 'ffmpeg':
+                print(f"读写后端: ffmpeg (preset={args.ffmpeg_preset}, crf={args.ffmpeg_crf})")
         if args.preview:
             print("实时预览: 启用 (按 'q' 键退出预览)")
         if args.mosaic:
             print(f"马赛克模式: 启用 (块大小: {args.mosaic_size})")
+        if args.detect_size:
+            print(f"检测分辨率: 长边 {args.detect_size} 像素")
+        if args.detect_interval > 1:
+            print(f"关键帧检测间隔: {args.detect_interval} 帧")
+        if args.pipeline_workers > 1:
+            print(f"多线程流水线: {args.pipeline_workers} 个检测线程")
+        if args.lookahead:
+            print(f"前瞻补帧: 缓冲 {args.lookahead} 帧, 向前补 {args.backfill_frames} 帧")
+        if args.motion_gate:
+            print(f"运动门控: 最多连续跳过 {args.motion_gate} 帧检测")
+        if args.roi_detection:
+            print(f"跟踪区域检测: 每 {args.roi_detection} 次检测做一次全画面检测")
         
         print("\n开始处理...")
-        result = detector.process_video(
-            input_path=args.input_video,
-            output_path=args.output,
-            show_preview=args.preview,
-            apply_mosaic=args.mosaic,
-            mosaic_size=args.mosaic_size,
-            codec=args.codec
-        )
+        if args.smart_render:
+            from smart_render import smart_render
+            result = smart_render(
+                detector,
+                input_path=args.input_video,
+                output_path=args.output,
+                mosaic_size=args.mosaic_size,
+                codec=args.codec,
+                ffmpeg_options=ffmpeg_options,
+                detect_size=args.detect_size,
+                detect_interval=args.detect_interval,
+                pipeline_workers=args.pipeline_workers,
+                sidecar_path=args.sidecar,
+                replay_sidecar=args.render_from_sidecar,
+                lookahead_frames=args.lookahead,
+                backfill_frames=args.backfill_frames,
+                motion_gate=args.motion_gate,
+                roi_detection=args.roi_detection
+            )
+        elif args.segments > 1 and args.detector == 'yunet':
+            if args.lookahead:
+                print("提示: 分段并行处理不使用前瞻补帧")
+            from segment_parallel import process_video_segments
+            # 使用主进程已解析的模型文件，各工作进程不再各自查找缓存或测量
+            detector_kwargs['model_path'] = detector.model_path
+            detector_kwargs['continuation_frames'] = args.continuation_frames
+            result = process_video_segments(
+                input_path=args.input_video,
+                output_path=args.output,
+                segments=args.segments,
+                preroll_frames=args.segment_preroll,
+                detector_kwargs=detector_kwargs,
+                apply_mosaic=args.mosaic,
+                mosaic_size=args.mosaic_size,
+                codec=args.codec,
+                detect_size=args.detect_size,
+                detect_interval=args.detect_interval,
+                motion_gate=args.motion_gate,
+                roi_detection=args.roi_detection,
+                io_backend=args.io_backend,
+                ffmpeg_options=ffmpeg_options
+            )
+        else:
+            if args.segments > 1:
+                print("提示: 分段并行处理仅支持YuNet检测器，改为单进程处理")
+            result = detector.process_video(
+                input_path=args.input_video,
+                output_path=args.output,
+                show_preview=args.preview,
+                apply_mosaic=args.mosaic,
+                mosaic_size=args.mosaic_size,
+                codec=args.codec,
+                detect_size=args.detect_size,
+                detect_interval=args.detect_interval,
+                pipeline_workers=args.pipeline_workers,
+                io_backend=args.io_backend,
+                ffmpeg_options=ffmpeg_options,
+                sidecar_path=args.sidecar,
+                replay_sidecar=args.render_from_sidecar,
+                lookahead_frames=args.lookahead,
+                backfill_frames=args.backfill_frames,
+                motion_gate=args.motion_gate,
+                roi_detection=args.roi_detection
+            )
+        
+        if args.timing:
+            if 'timing' in result:
+                print_timing(result['timing'])
+            else:
+                print("提示: 分段并行处理不提供分阶段耗时")
         
         # 显示处理结果摘要
         print("\n" + "=" * 40)
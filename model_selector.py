@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YuNet模型变体自动选择
+models/目录提供fp32、int8、int8bq三种YuNet模型。量化模型在支持VNNI等指令的CPU上更快，
+在其他CPU上可能反而更慢，int8bq还需要OpenCV 4.9以上才能加载。
+本模块在当前CPU上按检测分辨率对各变体做小规模基准测试，在校准图像上检查量化模型与fp32的结果一致性，
+选出一致性达标且最快的变体，结果按机器、OpenCV版本、检测分辨率和模型文件缓存。
+测量只在显式要求时运行（本脚本或model_path='auto'），默认创建检测器时只读取缓存，没有缓存时使用fp32。
+
+使用方法:
+    python model_selector.py                     # 查看（必要时测量）本机的选择结果
+    python model_selector.py --detect-size 640 --force
+    python model_selector.py --calibration sample.mp4
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from detection_sidecar import model_sha256
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# 变体名称 -> 模型文件（fp32为基准，排在第一位）
+MODEL_VARIANTS = {
+    'fp32': 'face_detection_yunet_2023mar.onnx',
+    'int8': 'face_detection_yunet_2023mar_int8.onnx',
+    'int8bq': 'face_detection_yunet_2023mar_int8bq.onnx'
+}
+
+# 未设置检测分辨率时按此长边测量（各变体的速度比与分辨率关系不大）
+DEFAULT_BENCHMARK_SIZE = 640
+
+# 缓存目录，可用环境变量FACE_MOSAIC_CACHE_DIR修改
+CACHE_DIR_ENV = 'FACE_MOSAIC_CACHE_DIR'
+
+# 本进程内已确定的选择结果：{缓存键: 选择结果}
+_selections = {}
+
+
+def variant_path(name):
+    """
+    模型变体的文件路径
+
+    Args:
+        name (str): 变体名称
+
+    Returns:
+        str: 模型文件路径
+    """
+    return os.path.join(MODELS_DIR, MODEL_VARIANTS[name])
+
+
+def cache_path():
+    """
+    选择结果缓存文件路径
+
+    Returns:
+        str: JSON文件路径
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'face_mosaic')
+    return os.path.join(cache_dir, 'model_selection.json')
+
+
+def selection_key(detect_size):
+    """
+    缓存键：机器、OpenCV版本、测量分辨率和各模型文件的哈希，任何一项变化都会重新测量
+
+    Args:
+        detect_size (int): 检测分辨率（长边像素数）
+
+    Returns:
+        str: 缓存键
+    """
+    models = ','.join(f"{name}:{model_sha256(variant_path(name))[:12]}" for name in MODEL_VARIANTS)
+    return (f"{platform.node()}|{platform.machine()}|{platform.processor()}|{os.cpu_count()}|"
+            f"opencv {cv2.__version__}|{detect_size or DEFAULT_BENCHMARK_SIZE}|{models}")
+
+
+def calibration_frames(detect_size=None, video_path=None, count=6):
+    """
+    准备校准图像（长边缩放到测量分辨率）
+
+    Args:
+        detect_size (int): 检测分辨率（长边像素数）
+        video_path (str): 从该视频均匀抽取帧，为None时使用合成人脸画面（不同人脸数量和大小，含一帧无人脸）
+        count (int): 帧数
+
+    Returns:
+        list: BGR图像列表
+    """
+    long_edge = detect_size or DEFAULT_BENCHMARK_SIZE
+    frames = []
+    if video_path:
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for index in np.linspace(0, max(0, total - 1), count).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+        cap.release()
+        if not frames:
+            raise ValueError(f"无法从校准视频读取帧: {video_path}")
+    else:
+        from synthetic_video import synthetic_frames
+        for seed, faces in enumerate([1, 2, 3, 5, 0, 4][:count]):
+            frame, _ = next(synthetic_frames(width=1280, height=720, duration=0.1, faces=faces, seed=seed))
+            frames.append(frame)
+
+    scaled = []
+    for frame in frames:
+        scale = long_edge / max(frame.shape[:2])
+        size = (max(1, round(frame.shape[1] * scale)), max(1, round(frame.shape[0] * scale)))
+        scaled.append(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+    return scaled
+
+
+def _box_iou(a, b):
+    """计算两个(x, y, w, h)矩形框的IoU"""
+    iw = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detection_agreement(reference, candidate, iou_threshold=0.5):
+    """
+    比较两个模型在同一组图像上的检测结果
+
+    Args:
+        reference (list): 基准模型每帧的人脸框列表
+        candidate (list): 待比较模型每帧的人脸框列表
+        iou_threshold (float): 视为同一人脸的最小IoU
+
+    Returns:
+        tuple: (F1一致性 0~1, 匹配人脸框的平均IoU)；两边都没有人脸时一致性为1
+    """
+    matched = 0
+    total = 0
+    ious = []
+    for ref_boxes, cand_boxes in zip(reference, candidate):
+        total += len(ref_boxes) + len(cand_boxes)
+        remaining = list(cand_boxes)
+        for box in ref_boxes:
+            if not remaining:
+                break
+            scores = [_box_iou(box, other) for other in remaining]
+            best = int(np.argmax(scores))
+            if scores[best] >= iou_threshold:
+                matched += 1
+                ious.append(scores[best])
+                remaining.pop(best)
+    agreement = 2 * matched / total if total > 0 else 1.0
+    return agreement, float(np.mean(ious)) if ious else 1.0
+
+
+def _create_yunet(model_path):
+    """用与VideoFaceDetector相同的参数创建YuNet检测器"""
+    return cv2.FaceDetectorYN.create(model=model_path, config="", input_size=(320, 320),
+                                     score_threshold=0.6, nms_threshold=0.3, top_k=5000)
+
+
+def _detect(detector, frame):
+    """检测一帧，返回人脸框列表"""
+    detector.setInputSize((frame.shape[1], frame.shape[0]))
+    _, faces = detector.detect(frame)
+    return [] if faces is None else [tuple(float(v) for v in face[:4]) for face in faces]
+
+
+def benchmark_variants(detect_size=None, frames=None, rounds=3):
+    """
+    在当前CPU上测量各模型变体的检测耗时，并计算与fp32的一致性
+
+    Args:
+        detect_size (int): 检测分辨率（长边像素数）
+        frames (list): 校准图像，为None时使用calibration_frames()
+        rounds (int): 测量轮数（各变体交替测量，取每帧耗时的中位数）
+
+    Returns:
+        dict: 变体名称 -> {available, ms_per_frame, agreement, mean_iou, error}
+    """
+    frames = frames if frames is not None else calibration_frames(detect_size)
+    detectors = {}
+    results = {}
+    for name in MODEL_VARIANTS:
+        try:
+            detectors[name] = _create_yunet(variant_path(name))
+            results[name] = {'available': True}
+        except cv2.error:
+            # 例如int8bq需要OpenCV 4.9以上
+            results[name] = {'available': False, 'error': f"当前OpenCV {cv2.__version__} 无法加载该模型"}
+
+    # 预热并记录检测结果
+    outputs = {name: [_detect(detector, frame) for frame in frames] for name, detector in detectors.items()}
+
+    samples = {name: [] for name in detectors}
+    for _ in range(rounds):
+        for name, detector in detectors.items():
+            start = time.perf_counter()
+            for frame in frames:
+                _detect(detector, frame)
+            samples[name].append((time.perf_counter() - start) / len(frames))
+
+    for name in detectors:
+        agreement, mean_iou = detection_agreement(outputs['fp32'], outputs[name]) if 'fp32' in outputs else (0.0, 0.0)
+        results[name].update(ms_per_frame=statistics.median(samples[name]) * 1000,
+                             agreement=agreement, mean_iou=mean_iou)
+    return results
+
+
+def choose_variant(results, min_agreement=0.95, min_speedup=1.05):
+    """
+    选出一致性达标且最快的变体；量化模型必须比fp32快min_speedup倍以上才会被选中（避免测量噪声导致来回切换）
+
+    Args:
+        results (dict): benchmark_variants的返回值
+        min_agreement (float): 与fp32的最低一致性
+        min_speedup (float): 相对fp32的最低加速比
+
+    Returns:
+        str: 变体名称
+    """
+    if not results.get('fp32', {}).get('available'):
+        raise ValueError("fp32模型不可用，无法选择模型变体")
+    baseline = results['fp32']['ms_per_frame']
+    best = 'fp32'
+    for name, item in results.items():
+        if name == 'fp32' or not item['available'] or item['agreement'] < min_agreement:
+            continue
+        if baseline / item['ms_per_frame'] >= min_speedup and item['ms_per_frame'] < results[best]['ms_per_frame']:
+            best = name
+    return best
+
+
+def _load_cache():
+    """读取缓存文件，不存在或损坏时返回空字典"""
+    try:
+        with open(cache_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(key, selection):
+    """写入缓存文件（先写临时文件再改名，多个进程同时写入也不会损坏）"""
+    path = cache_path()
+    cache = _load_cache()
+    cache[key] = selection
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"警告: 无法保存模型选择缓存: {e}")
+
+
+def cached_selection(detect_size=None):
+    """
+    读取已缓存的选择结果，不运行测量
+
+    Args:
+        detect_size (int): 检测分辨率（长边像素数）
+
+    Returns:
+        dict: 选择结果（同select_model），没有缓存时返回None
+    """
+    key = selection_key(detect_size)
+    if key in _selections:
+        return _selections[key]
+    cached = _load_cache().get(key)
+    if cached is None or cached.get('variant') not in MODEL_VARIANTS:
+        return None
+    selection = dict(cached, path=variant_path(cached['variant']), cached=True)
+    _selections[key] = selection
+    print(f"YuNet模型: {selection['variant']}（本机测量结果缓存）")
+    return selection
+
+
+def select_model(detect_size=None, force=False, calibration_video=None, min_agreement=0.95, min_speedup=1.05):
+    """
+    选择本机最合适的YuNet模型变体（优先使用缓存）
+
+    Args:
+        detect_size (int): 检测分辨率（长边像素数）
+        force (bool): 忽略缓存重新测量
+        calibration_video (str): 用该视频的帧作为校准图像，为None时使用合成画面
+        min_agreement (float): 量化模型与fp32的最低一致性
+        min_speedup (float): 量化模型相对fp32的最低加速比
+
+    Returns:
+        dict: {variant, path, results, cached}
+    """
+    key = selection_key(detect_size)
+    if not force:
+        selection = cached_selection(detect_size)
+        if selection is not None:
+            return selection
+
+    print("正在测量本机各YuNet模型变体的速度（结果会缓存，只需一次）...")
+    results = benchmark_variants(detect_size, calibration_frames(detect_size, calibration_video))
+    variant = choose_variant(results, min_agreement, min_speedup)
+    selection = {'variant': variant, 'results': results, 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    _save_cache(key, selection)
+    selection = dict(selection, path=variant_path(variant), cached=False)
+    _selections[key] = selection
+    print(f"YuNet模型自动选择: {variant} ({results[variant]['ms_per_frame']:.1f}ms/帧)")
+    return selection
+
+
+def resolve_model_path(model_path=None, detect_size=None):
+    """
+    把VideoFaceDetector的model_path参数解析为模型文件路径
+
+    Args:
+        model_path (str): None（使用缓存的选择结果，没有缓存时使用fp32）、'auto'（没有缓存时先测量）、
+                          变体名称（'fp32'、'int8'、'int8bq'）或模型文件路径
+        detect_size (int): 检测分辨率（长边像素数），按此分辨率查找缓存或测量
+
+    Returns:
+        str: 模型文件路径
+    """
+    if model_path in MODEL_VARIANTS:
+        return variant_path(model_path)
+    if model_path not in (None, 'auto'):
+        return model_path
+    try:
+        # 测量耗时数秒，且多个进程同时测量会互相干扰，只在显式要求时运行
+        selection = select_model(detect_size) if model_path == 'auto' else cached_selection(detect_size)
+    except Exception as e:
+        print(f"警告: 模型变体自动选择失败（{e}），使用fp32模型")
+        return variant_path('fp32')
+    return selection['path'] if selection is not None else variant_path('fp32')
+
+
+def print_results(selection):
+    """
+    打印各变体的测量结果
+
+    Args:
+        selection (dict): select_model的返回值
+    """
+    print(f"\n{'变体':<10}{'可用':>6}{'耗时(ms/帧)':>14}{'一致性':>10}{'平均IoU':>10}")
+    print("-" * 52)
+    for name, item in selection['results'].items():
+        if not item['available']:
+            print(f"{name:<10}{'否':>6}  {item.get('error', '')}")
+            continue
+        mark = '  ← 选用' if name == selection['variant'] else ''
+        print(f"{name:<10}{'是':>6}{item['ms_per_frame']:>14.2f}{item['agreement']:>10.1%}{item['mean_iou']:>10.3f}{mark}")
+    print("-" * 52)
+    source = '缓存' if selection['cached'] else '本次测量'
+    print(f"选用: {selection['variant']} ({source}, 缓存文件: {cache_path()})")
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='为本机选择最快的YuNet模型变体')
+    parser.add_argument('--detect-size', type=int, default=None,
+                        help=f'检测分辨率（长边像素数，默认按{DEFAULT_BENCHMARK_SIZE}测量）')
+    parser.add_argument('--force', action='store_true', help='忽略缓存重新测量')
+    parser.add_argument('--calibration', default=None, help='用该视频的帧作为校准图像（默认：合成人脸画面）')
+    parser.add_argument('--min-agreement', type=float, default=0.95, help='量化模型与fp32的最低一致性（默认：0.95）')
+    args = parser.parse_args()
+
+    selection = select_model(args.detect_size, force=args.force or bool(args.calibration),
+                             calibration_video=args.calibration, min_agreement=args.min_agreement)
+    print_results(selection)
+
+
+if __name__ == "__main__":
+    main()
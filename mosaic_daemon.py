@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻处理服务
+在本机HTTP端口上接收处理任务，复用预先加载好的检测器实例（YuNet模型、可选的DeepFace），
+避免每个任务都重新启动进程、导入OpenCV和加载模型。支持任务状态查询、进度流和取消。
+
+使用方法:
+    python mosaic_daemon.py serve [--port 8765] [--workers 1] [--warm yunet:2]
+    python mosaic_daemon.py status [任务ID]
+    python mosaic_daemon.py cancel 任务ID
+    python mosaic_daemon.py shutdown
+
+接口（均为JSON）:
+    GET  /health              服务状态和检测器池
+    GET  /jobs                全部任务
+    POST /jobs                提交任务，返回任务ID
+    GET  /jobs/<id>           任务状态
+    GET  /jobs/<id>/events    进度流（每行一个JSON，任务结束后关闭连接）
+    POST /jobs/<id>/cancel    取消任务
+    POST /shutdown            停止服务
+"""
+
+import argparse
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 任务参数中传给process_video的字段及默认值
+PROCESS_OPTIONS = {
+    'output_path': None,
+    'apply_mosaic': False,
+    'mosaic_size': 30,  # 与命令行 --mosaic-size 的默认值一致
+    'codec': 'auto',
+    'detect_size': None,
+    'detect_interval': None,
+    'pipeline_workers': 0,
+    'io_backend': 'opencv',
+    'ffmpeg_options': None,
+    'sidecar_path': None,
+    'replay_sidecar': None,
+    'lookahead_frames': 0,
+    'backfill_frames': 0,
+    'motion_gate': None,
+    'roi_detection': None
+}
+
+# 任务参数中决定检测器实例的字段及默认值（相同配置的任务共用检测器池）
+DETECTOR_OPTIONS = {
+    'detector': 'yunet',
+    'model': None,
+    'deepface_backend': 'mtcnn',
+    'multi_scale': 'adaptive',
+    'multi_scale_budget_ms': None
+}
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+
+class DetectorPool:
+    """
+    预加载的检测器池
+    按检测器配置分组保存空闲实例，任务开始时取出、结束后放回
+    """
+
+    def __init__(self):
+        self.idle = {}
+        self.created = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def config_key(options):
+        """
+        检测器配置的键
+
+        Args:
+            options (dict): 任务参数
+
+        Returns:
+            tuple: 配置键
+        """
+        config = {name: options.get(name, default) for name, default in DETECTOR_OPTIONS.items()}
+        if config['detector'] == 'yunet':
+            # YuNet检测器不使用DeepFace后端，避免同一配置分成多组
+            config['deepface_backend'] = DETECTOR_OPTIONS['deepface_backend']
+        return tuple(config.items())
+
+    def _create(self, key):
+        """创建一个检测器实例"""
+        from detector_registry import create_detector
+        config = dict(key)
+        detector = create_detector(
+            config['detector'], model_path=config['model'], deepface_backend=config['deepface_backend'],
+            multi_scale=config['multi_scale'], multi_scale_budget_ms=config['multi_scale_budget_ms']
+        )
+        with self._lock:
+            self.created[key] = self.created.get(key, 0) + 1
+        return detector
+
+    def warm(self, options, count=1):
+        """
+        预先创建检测器实例
+
+        Args:
+            options (dict): 检测器配置
+            count (int): 创建数量
+        """
+        key = self.config_key(options)
+        detectors = [self._create(key) for _ in range(count)]
+        with self._lock:
+            self.idle.setdefault(key, []).extend(detectors)
+
+    def acquire(self, options):
+        """
+        取出一个空闲检测器，没有时新建
+
+        Args:
+            options (dict): 任务参数
+
+        Returns:
+            tuple: (配置键, 检测器)
+        """
+        key = self.config_key(options)
+        with self._lock:
+            idle = self.idle.get(key)
+            if idle:
+                return key, idle.pop()
+        return key, self._create(key)
+
+    def release(self, key, detector):
+        """把检测器放回池中"""
+        with self._lock:
+            self.idle.setdefault(key, []).append(detector)
+
+    def summary(self):
+        """
+        检测器池状态
+
+        Returns:
+            list: 每种配置的已创建数量和空闲数量
+        """
+        with self._lock:
+            return [{'config': dict(key), 'created': count, 'idle': len(self.idle.get(key, []))}
+                    for key, count in self.created.items()]
+
+
+class Job:
+    """
+    一个处理任务及其状态
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, options):
+        self.id = str(next(self._ids))
+        self.options = options
+        self.state = 'queued'
+        self.processed = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.changed = threading.Condition()
+
+    def update(self, **fields):
+        """更新状态并唤醒等待进度的连接"""
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+    def to_dict(self):
+        """
+        任务状态的JSON表示
+
+        Returns:
+            dict: 任务状态
+        """
+        # 在锁内读取，避免读到状态已更新而结果尚未写入的中间状态
+        with self.changed:
+            return {
+                'job_id': self.id,
+                'state': self.state,
+                'input_path': self.options.get('input_path'),
+                'output_path': self.options.get('output_path'),
+                'processed': self.processed,
+                'total': self.total,
+                'progress': self.processed / self.total if self.total > 0 else 0.0,
+                'elapsed': (self.finished_at or time.time()) - (self.started_at or self.created_at),
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class MosaicDaemon:
+    """
+    处理服务：任务队列 + 工作线程 + 检测器池
+    """
+
+    def __init__(self, workers=1):
+        """
+        初始化服务
+
+        Args:
+            workers (int): 同时处理的任务数
+        """
+        self.pool = DetectorPool()
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, options):
+        """
+        提交任务
+
+        Args:
+            options (dict): 任务参数，必须包含input_path
+
+        Returns:
+            Job: 新任务
+        """
+        if not options.get('input_path'):
+            raise ValueError("缺少input_path")
+        unknown = set(options) - set(PROCESS_OPTIONS) - set(DETECTOR_OPTIONS) - {'input_path', 'continuation_frames'}
+        if unknown:
+            raise ValueError(f"未知的任务参数: {', '.join(sorted(unknown))}")
+        job = Job(options)
+        self.jobs[job.id] = job
+        self.queue.put(job)
+        print(f"任务 {job.id} 已提交: {options['input_path']}")
+        return job
+
+    def cancel(self, job):
+        """请求取消任务（排队中的任务直接取消，运行中的任务在下一帧停止）"""
+        job.cancel_event.set()
+        if job.state == 'queued':
+            job.update(state='cancelled', finished_at=time.time())
+
+    def _worker(self):
+        """工作线程：依次执行队列中的任务"""
+        while True:
+            job = self.queue.get()
+            if job.state != 'queued':
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job):
+        """执行一个任务"""
+        options = job.options
+        job.update(state='running', started_at=time.time())
+        print(f"任务 {job.id} 开始处理")
+
+        def progress_callback(processed, total):
+            job.update(processed=processed, total=total)
+            return not job.cancel_event.is_set()
+
+        key, detector = self.pool.acquire(options)
+        try:
+            # 延续帧数只影响跟踪，直接设置到复用的检测器上
+            detector.max_continuation_frames = max(1, options.get('continuation_frames', 5))
+            process_kwargs = {name: options.get(name, default) for name, default in PROCESS_OPTIONS.items()}
+            result = detector.process_video(options['input_path'], progress_callback=progress_callback,
+                                            **process_kwargs)
+            state = 'cancelled' if job.cancel_event.is_set() else 'done'
+            job.update(state=state, result=json.loads(json.dumps(result, default=str)),
+                       finished_at=time.time())
+        except Exception as e:
+            job.update(state='failed', error=str(e), finished_at=time.time())
+        finally:
+            self.pool.release(key, detector)
+        print(f"任务 {job.id} 结束: {job.state}")
+
+    def events(self, job, timeout=1.0):
+        """
+        任务进度流：状态或进度变化时产出一条记录，任务结束后停止
+
+        Args:
+            job (Job): 任务
+            timeout (float): 无变化时的心跳间隔（秒）
+
+        Yields:
+            dict: 任务状态
+        """
+        last = None
+        while True:
+            with job.changed:
+                snapshot = (job.state, job.processed)
+                if snapshot == last and job.state not in FINISHED_STATES:
+                    job.changed.wait(timeout)
+                    snapshot = (job.state, job.processed)
+            if snapshot != last or snapshot[0] in FINISHED_STATES:
+                # 以产出的记录为准判断是否结束，保证最后一条一定是结束状态
+                event = job.to_dict()
+                last = (event['state'], event['processed'])
+                yield event
+                if event['state'] in FINISHED_STATES:
+                    return
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理（JSON接口）"""
+
+    daemon = None
+    server_version = 'MosaicDaemon/1.0'
+
+    def log_message(self, format, *args):
+        # 进度流请求频繁，不逐条打印访问日志
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_from_path(self, parts):
+        job = self.daemon.jobs.get(parts[1]) if len(parts) > 1 else None
+        if job is None:
+            self._send_json({'error': '任务不存在'}, 404)
+        return job
+
+    def do_GET(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if parts == ['health']:
+            self._send_json({'status': 'ok', 'workers': len(self.daemon.workers), 'pool': self.daemon.pool.summary(),
+                             'queued': sum(j.state == 'queued' for j in self.daemon.jobs.values())})
+        elif parts == ['jobs']:
+            self._send_json([job.to_dict() for job in self.daemon.jobs.values()])
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job_from_path(parts)
+            if job:
+                self._send_json(job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            job = self._job_from_path(parts)
+            if job:
+                # 逐行输出JSON，任务结束后关闭连接
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                try:
+                    for event in self.daemon.events(job):
+                        self.wfile.write((json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+        else:
+            self._send_json({'error': '未知的接口'}, 404)
+
+    def do_POST(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json({'error': '请求不是有效的JSON'}, 400)
+            return
+
+        if parts == ['jobs']:
+            try:
+                job = self.daemon.submit(payload)
+            except ValueError as e:
+                self._send_json({'error': str(e)}, 400)
+                return
+            self._send_json(job.to_dict(), 201)
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            job = self._job_from_path(parts)
+            if job:
+                self.daemon.cancel(job)
+                self._send_json(job.to_dict())
+        elif parts == ['shutdown']:
+            self._send_json({'status': 'stopping'})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._send_json({'error': '未知的接口'}, 404)
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, warm=None):
+    """
+    创建处理服务（预加载检测器并绑定端口，不开始监听）
+
+    Args:
+        host (str): 监听地址，默认只监听本机
+        port (int): 监听端口，0表示由系统分配
+        workers (int): 同时处理的任务数
+        warm (list): 预加载的检测器，如 [('yunet', 2), ('hybrid', 1)]
+
+    Returns:
+        ThreadingHTTPServer: HTTP服务，其daemon属性为MosaicDaemon实例
+    """
+    daemon = MosaicDaemon(workers=workers)
+    for name, count in warm or [('yunet', workers)]:
+        print(f"预加载检测器: {name} x{count}")
+        daemon.pool.warm({'detector': name}, count)
+
+    handler = type('RequestHandler', (_RequestHandler,), {'daemon': daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.daemon = daemon
+    return server
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, warm=None):
+    """
+    启动处理服务（阻塞直到收到停止请求）
+
+    Args:
+        host (str): 监听地址，默认只监听本机
+        port (int): 监听端口
+        workers (int): 同时处理的任务数
+        warm (list): 预加载的检测器，如 [('yunet', 2), ('hybrid', 1)]
+    """
+    server = create_server(host, port, workers, warm)
+    print(f"处理服务已启动: http://{host}:{server.server_port} (工作线程 {workers})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("处理服务已停止")
+
+
+class DaemonClient:
+    """
+    处理服务客户端（供命令行和GUI使用）
+    """
+
+    def __init__(self, url=None, timeout=5.0):
+        """
+        初始化客户端
+
+        Args:
+            url (str): 服务地址，默认 http://127.0.0.1:8765
+            timeout (float): 普通请求的超时时间（秒）
+        """
+        self.url = (url or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}").rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            message = json.loads(e.read().decode('utf-8') or '{}').get('error', str(e))
+            raise RuntimeError(f"处理服务返回错误: {message}") from None
+
+    def is_running(self):
+        """
+        检查服务是否在运行
+
+        Returns:
+            bool: 服务是否可用
+        """
+        try:
+            return self._request('GET', '/health', timeout=1.0).get('status') == 'ok'
+        except (OSError, ValueError, RuntimeError):
+            return False
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def submit(self, **options):
+        """
+        提交任务
+
+        Args:
+            **options: 任务参数（input_path必填，其余同process_video和检测器参数）
+
+        Returns:
+            dict: 任务状态，包含job_id
+        """
+        return self._request('POST', '/jobs', options)
+
+    def status(self, job_id=None):
+        """查询一个任务（job_id为None时返回全部任务）"""
+        return self._request('GET', f"/jobs/{job_id}" if job_id else '/jobs')
+
+    def cancel(self, job_id):
+        """取消任务"""
+        return self._request('POST', f"/jobs/{job_id}/cancel")
+
+    def shutdown(self):
+        """停止服务"""
+        return self._request('POST', '/shutdown')
+
+    def events(self, job_id):
+        """
+        读取任务进度流
+
+        Args:
+            job_id (str): 任务ID
+
+        Yields:
+            dict: 任务状态，最后一条为结束状态
+        """
+        request = urllib.request.Request(f"{self.url}/jobs/{job_id}/events")
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line.decode('utf-8'))
+
+    def run(self, print_progress=True, **options):
+        """
+        提交任务并等待完成，按与main.py相同的格式打印进度
+
+        Args:
+            print_progress (bool): 是否打印进度
+            **options: 任务参数
+
+        Returns:
+            dict: 任务的最终状态
+        """
+        job = self.submit(**options)
+        job_id = job['job_id']
+        if print_progress:
+            print(f"已提交到处理服务: 任务 {job_id}")
+        final = job
+        last_printed = 0
+        try:
+            for event in self.events(job_id):
+                final = event
+                processed, total = event['processed'], event['total']
+                if print_progress and processed - last_printed >= 30:
+                    last_printed = processed
+                    progress = processed / total * 100 if total > 0 else 0
+                    print(f"处理进度: {progress:.1f}% ({processed}/{total})", flush=True)
+        except KeyboardInterrupt:
+            self.cancel(job_id)
+            raise
+        return final
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='视频人脸打码常驻处理服务')
+    parser.add_argument('--url', help=f'服务地址（客户端命令使用，默认 http://{DEFAULT_HOST}:{DEFAULT_PORT}）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='启动处理服务')
+    serve_parser.add_argument('--host', default=DEFAULT_HOST, help='监听地址（默认只监听本机）')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认：{DEFAULT_PORT}）')
+    serve_parser.add_argument('--workers', type=int, default=1, help='同时处理的任务数（默认：1）')
+    serve_parser.add_argument('--warm', action='append', default=None,
+                              help='预加载的检测器，格式为 名称[:数量]，可重复指定（默认：yunet:工作线程数）')
+
+    status_parser = subparsers.add_parser('status', help='查看任务状态')
+    status_parser.add_argument('job_id', nargs='?', help='任务ID，省略时列出全部任务')
+
+    cancel_parser = subparsers.add_parser('cancel', help='取消任务')
+    cancel_parser.add_argument('job_id', help='任务ID')
+
+    subparsers.add_parser('shutdown', help='停止处理服务')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        warm = None
+        if args.warm:
+            warm = []
+            for item in args.warm:
+                name, _, count = item.partition(':')
+                warm.append((name, int(count or 1)))
+        serve(args.host, args.port, args.workers, warm)
+        return
+
+    client = DaemonClient(args.url)
+    if not client.is_running():
+        print(f"错误: 处理服务未运行 ({client.url})")
+        sys.exit(1)
+    if args.command == 'status':
+        print(json.dumps(client.status(args.job_id), ensure_ascii=False, indent=2))
+    elif args.command == 'cancel':
+        print(json.dumps(client.cancel(args.job_id), ensure_ascii=False, indent=2))
+    elif args.command == 'shutdown':
+        client.shutdown()
+        print("已请求停止处理服务")
+
+
+if __name__ == "__main__":
+    main()
@@ -62,9 +62,54 @@ def check_dependencies():
     
     return True
 
+def run_mosaic_with_daemon(client, input_file, output_file):
+    """
+    通过常驻处理服务执行视频打码（复用已加载的模型）
+    
+    Args:
+        client (DaemonClient): 处理服务客户端
+        input_file (str): 输入视频文件路径
+        output_file (str): 输出视频文件路径
+        
+    Returns:
+        bool: 处理是否成功
+    """
+    print(f"🚀 开始处理视频: {input_file}")
+    print(f"📁 输出文件: {output_file}")
+    print(f"⚙️  使用配置: 混合检测器 + RetinaFace后端 + 延续15帧（常驻处理服务 {client.url}）")
+    print("\n" + "="*60)
+    
+    try:
+        final = client.run(
+            input_path=os.path.abspath(input_file),
+            output_path=os.path.abspath(output_file),
+            detector="hybrid",
+            deepface_backend="retinaface",
+            continuation_frames=15,
+            apply_mosaic=True,
+            mosaic_size=30  # 与子进程方式（main.py默认值）一致
+        )
+    except KeyboardInterrupt:
+        print("\n⏹️  用户中断处理（已取消服务端任务）")
+        return False
+    except Exception as e:
+        print(f"❌ 处理服务调用失败: {e}")
+        return False
+    
+    if final['state'] != 'done':
+        print(f"❌ 处理失败: {final.get('error') or final['state']}")
+        return False
+    
+    print("\n" + "="*60)
+    print(f"✅ 处理完成! 输出文件: {output_file}")
+    file_size = os.path.getsize(output_file) / (1024 * 1024)  # MB
+    print(f"📊 文件大小: {file_size:.2f} MB")
+    return True
+
 def run_mosaic(input_file, output_file):
     """
     执行视频打码处理
+    常驻处理服务在运行时直接提交任务，否则启动main.py子进程
     
     Args:
         input_file (str): 输入视频文件路径
@@ -73,6 +118,11 @@ def run_mosaic(input_file, output_file):
     Returns:
         bool: 处理是否成功
     """
+    from mosaic_daemon import DaemonClient
+    client = DaemonClient()
+    if client.is_running():
+        return run_mosaic_with_daemon(client, input_file, output_file)
+    
     # 构建命令参数
     cmd = [
         "python", "main.py",
@@ -81,6 +131,7 @@ def run_mosaic(input_file, output_file):
         "--deepface-backend", "retinaface",  # 侧脸检测优化
         "--continuation-frames", "15",       # 延续15帧
         "--mosaic",                          # 启用打码
+        "--mosaic-size", "30",               # 马赛克块大小
         "--output", output_file              # 指定输出文件
     ]
     
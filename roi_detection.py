@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跟踪区域检测（ROI检测）
+已有人脸轨迹时，只在各轨迹预测位置周围的扩大区域内运行检测：
+各区域按人脸大小缩放后拼接成一张小图，YuNet只运行一次，检测结果再按区域映射回原始坐标。
+为发现新出现的人脸，按固定间隔或在镜头切换时做一次全画面检测。
+"""
+
+import cv2
+import numpy as np
+
+
+def inference_area(width, height):
+    """
+    检测器实际处理的像素数：YuNet把输入尺寸补齐到32的倍数
+
+    Args:
+        width (int): 输入宽度
+        height (int): 输入高度
+
+    Returns:
+        int: 像素数
+    """
+    return (-(-width // 32) * 32) * (-(-height // 32) * 32)
+
+
+def plan_regions(boxes, frame_shape, margin=0.4, face_size=56):
+    """
+    根据人脸框规划检测区域
+
+    每个人脸框向外扩大margin（相对人脸宽高），重叠的区域合并为一个；
+    区域的缩放比例使其中最小的人脸缩放到约face_size像素（只缩小不放大）
+
+    Args:
+        boxes (numpy.ndarray): 形状为(N, 4)的人脸框 [x, y, w, h]（通常为轨迹的预测位置）
+        frame_shape (tuple): 帧的形状 (高, 宽, ...)
+        margin (float): 区域向外扩大的比例
+        face_size (int): 人脸在拼接图中的目标尺寸（像素）
+
+    Returns:
+        list: 检测区域 [(x0, y0, x1, y1, 缩放比例), ...]，坐标为整数且在画面内
+    """
+    height, width = frame_shape[:2]
+    regions = []
+    for x, y, w, h in np.asarray(boxes, dtype=np.float64).reshape(-1, 4):
+        side = max(w, h)
+        if side <= 0:
+            continue
+        cx, cy = x + w / 2.0, y + h / 2.0
+        half = side * (0.5 + margin)
+        region = [int(np.floor(max(0.0, cx - half))), int(np.floor(max(0.0, cy - half))),
+                  int(np.ceil(min(width, cx + half))), int(np.ceil(min(height, cy + half))), side]
+        if region[2] > region[0] and region[3] > region[1]:
+            regions.append(region)
+
+    # 合并重叠的区域（合并后的区域可能与其他区域重叠，重复直到不再变化）
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]), min(a[4], b[4])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return [(x0, y0, x1, y1, min(1.0, face_size / side)) for x0, y0, x1, y1, side in regions]
+
+
+class RoiMosaic:
+    """
+    检测区域拼接图
+    各区域按自己的比例缩放后用货架算法（按高度从高到低逐行排列）拼接，区域之间留出间隔，
+    避免检测器把相邻区域的内容拼成一个人脸
+    """
+
+    def __init__(self, frame, regions, gap=8):
+        """
+        裁剪、缩放并拼接检测区域
+
+        Args:
+            frame (numpy.ndarray): 原始帧
+            regions (list): plan_regions的返回值
+            gap (int): 区域之间的间隔（像素）
+        """
+        sizes = []
+        for x0, y0, x1, y1, scale in regions:
+            sizes.append((max(1, int(round((x1 - x0) * scale))), max(1, int(round((y1 - y0) * scale)))))
+
+        # 货架排列：逐个尝试每行放入的区域宽度上限，取拼接图（按检测器的32像素对齐）面积最小的排列
+        order = sorted(range(len(regions)), key=lambda i: -sizes[i][1])
+        best = None
+        for row_width in sorted({sum(sizes[i][0] + gap for i in order[:k]) - gap for k in range(1, len(order) + 1)}):
+            if row_width < max(w for w, _ in sizes):
+                continue
+            layout = self._shelf_layout(order, sizes, row_width, gap)
+            if best is None or inference_area(*layout[1:]) < inference_area(*best[1:]):
+                best = layout
+        positions, canvas_width, canvas_height = best
+
+        self.image = np.zeros((canvas_height, canvas_width) + frame.shape[2:], dtype=frame.dtype)
+        # 每个区域一行：[原图x0, 原图y0, 水平比例, 垂直比例, 拼接图x, 拼接图y, 宽, 高]
+        self.tiles = np.zeros((len(regions), 8), dtype=np.float64)
+        for i, (x0, y0, x1, y1, _) in enumerate(regions):
+            w, h = sizes[i]
+            tx, ty = positions[i]
+            crop = frame[y0:y1, x0:x1]
+            if (w, h) != (x1 - x0, y1 - y0):
+                crop = cv2.resize(crop, (w, h), interpolation=cv2.INTER_AREA)
+            self.image[ty:ty + h, tx:tx + w] = crop
+            # 实际比例按取整后的尺寸计算，映射回原图时与缩放完全对应
+            self.tiles[i] = (x0, y0, w / (x1 - x0), h / (y1 - y0), tx, ty, w, h)
+
+    @staticmethod
+    def _shelf_layout(order, sizes, row_width, gap):
+        """
+        按给定的行宽逐行排列区域
+
+        Returns:
+            tuple: (每个区域的位置列表, 拼接图宽, 拼接图高)
+        """
+        positions = [None] * len(sizes)
+        x = y = row_height = canvas_width = 0
+        for i in order:
+            w, h = sizes[i]
+            if x > 0 and x + w > row_width:
+                y += row_height + gap
+                x = row_height = 0
+            positions[i] = (x, y)
+            x += w + gap
+            row_height = max(row_height, h)
+            canvas_width = max(canvas_width, x - gap)
+        return positions, canvas_width, y + row_height
+
+    @property
+    def area(self):
+        """检测器实际处理的面积（按32像素对齐）"""
+        return inference_area(self.image.shape[1], self.image.shape[0])
+
+    def map_back(self, detections):
+        """
+        把拼接图上的检测结果映射回原始帧坐标
+
+        中心不在任何区域内的检测结果（跨越间隔的误检）被丢弃
+
+        Args:
+            detections (numpy.ndarray): 形状为(N, 15)的检测结果（拼接图坐标）
+
+        Returns:
+            numpy.ndarray: 形状为(M, 15)的检测结果（原始帧坐标）
+        """
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 15)
+        if len(detections) == 0 or len(self.tiles) == 0:
+            return np.empty((0, 15), dtype=np.float32)
+        cx = detections[:, 0] + detections[:, 2] / 2.0
+        cy = detections[:, 1] + detections[:, 3] / 2.0
+        tiles = self.tiles
+        inside = ((cx[:, None] >= tiles[:, 4]) & (cx[:, None] < tiles[:, 4] + tiles[:, 6]) &
+                  (cy[:, None] >= tiles[:, 5]) & (cy[:, None] < tiles[:, 5] + tiles[:, 7]))
+        keep = inside.any(axis=1)
+        owner = tiles[inside.argmax(axis=1)[keep]]
+        result = detections[keep].astype(np.float64)
+
+        # 坐标：(拼接图坐标 - 区域在拼接图中的位置) / 比例 + 区域在原图中的位置；宽高只除以比例
+        result[:, 0:14:2] = (result[:, 0:14:2] - owner[:, 4:5]) / owner[:, 2:3] + owner[:, 0:1]
+        result[:, 1:14:2] = (result[:, 1:14:2] - owner[:, 5:6]) / owner[:, 3:4] + owner[:, 1:2]
+        result[:, 2] = detections[keep, 2] / owner[:, 2]
+        result[:, 3] = detections[keep, 3] / owner[:, 3]
+        return result.astype(np.float32)
+
+
+class RoiDetectionPolicy:
+    """
+    ROI检测策略：决定每次检测使用全画面还是轨迹周围的区域，并统计检测面积
+    以下情况做全画面检测：没有可跟踪的人脸、距上次全画面检测已达full_scan_interval次、
+    镜头切换（缩小的灰度图与上一帧的平均差异超过scene_threshold）
+    """
+
+    def __init__(self, full_scan_interval=30, scene_threshold=30.0, margin=0.4, face_size=56):
+        """
+        初始化ROI检测策略
+
+        Args:
+            full_scan_interval (int): 每隔多少次检测做一次全画面检测
+            scene_threshold (float): 判定镜头切换的平均灰度差
+            margin (float): 检测区域相对人脸框向外扩大的比例
+            face_size (int): 人脸在拼接图中的目标尺寸（像素）
+        """
+        self.full_scan_interval = max(1, full_scan_interval)
+        self.scene_threshold = scene_threshold
+        self.margin = margin
+        self.face_size = face_size
+        self.reset()
+
+    def reset(self):
+        """清空状态和统计"""
+        self.previous = None
+        self.since_full_scan = 0
+        # 区域内没有找到人脸时是否回退到全画面检测（全画面也没有找到后关闭，重新找到人脸时打开）
+        self.allow_fallback = True
+        self.stats = {'roi_frames': 0, 'full_scans': 0, 'scene_changes': 0, 'fallbacks': 0,
+                      'inferred_area': 0, 'full_area': 0}
+
+    def plan(self, frame, boxes):
+        """
+        规划本次检测
+
+        Args:
+            frame (numpy.ndarray): 当前帧
+            boxes (numpy.ndarray): 各轨迹在当前帧的预测位置 (N, 4)
+
+        Returns:
+            list: 检测区域（见plan_regions），None表示做全画面检测
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+        previous, self.previous = self.previous, small
+        if previous is not None and cv2.absdiff(small, previous).mean() > self.scene_threshold:
+            self.stats['scene_changes'] += 1
+            return None
+        if len(boxes) == 0 or self.since_full_scan + 1 >= self.full_scan_interval:
+            return None
+        regions = plan_regions(boxes, frame.shape, self.margin, self.face_size)
+        return regions or None
+
+    def record(self, inferred_area, full_area, roi, found=True):
+        """
+        记录一次检测
+
+        Args:
+            inferred_area (int): 检测器实际处理的像素数
+            full_area (int): 同一帧全画面检测时处理的像素数
+            roi (bool): 是否为区域检测
+            found (bool): 是否检测到人脸
+        """
+        if found:
+            self.allow_fallback = True
+        elif not roi:
+            self.allow_fallback = False
+        self.stats['inferred_area'] += inferred_area
+        self.stats['full_area'] += full_area
+        if roi:
+            self.stats['roi_frames'] += 1
+            self.since_full_scan += 1
+        else:
+            self.stats['full_scans'] += 1
+            self.since_full_scan = 0
+
+    def summary(self):
+        """
+        统计汇总
+
+        Returns:
+            dict: 区域检测和全画面检测的次数、镜头切换次数、区域内未找到人脸改为全画面检测的次数，
+                  以及检测面积相对每次都全画面检测的比例（不含多尺度回退）
+        """
+        stats = self.stats
+        summary = {key: stats[key] for key in ('roi_frames', 'full_scans', 'scene_changes', 'fallbacks')}
+        summary['full_scan_interval'] = self.full_scan_interval
+        summary['area_ratio'] = stats['inferred_area'] / stats['full_area'] if stats['full_area'] else 1.0
+        return summary
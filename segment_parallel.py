@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段并行视频处理
+按帧序号把长视频切成若干时间段，每段在独立进程中用自己的VideoFaceDetector处理，
+最后按顺序拼接各段输出并汇总统计信息
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from face_detector import VideoFaceDetector, open_video_writer
+
+
+def plan_segments(total_frames, segments, min_segment_frames=1):
+    """
+    按帧序号均匀划分时间段
+
+    Args:
+        total_frames (int): 视频总帧数
+        segments (int): 期望的段数
+        min_segment_frames (int): 每段的最少帧数
+
+    Returns:
+        list: [(起始帧, 结束帧), ...]，结束帧不包含
+    """
+    segments = max(1, min(segments, total_frames // max(1, min_segment_frames)))
+    bounds = [round(total_frames * i / segments) for i in range(segments + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(segments) if bounds[i + 1] > bounds[i]]
+
+
+def _process_segment(task):
+    """
+    工作进程入口：处理一个时间段
+
+    Args:
+        task (dict): 段参数，包括输入/输出路径、帧范围、预热帧数、检测器参数和处理参数
+
+    Returns:
+        dict: 该段的process_video结果
+    """
+    detector = VideoFaceDetector(**task['detector_kwargs'])
+    result = detector.process_video(
+        input_path=task['input_path'],
+        output_path=task['output_path'],
+        start_frame=task['start_frame'],
+        end_frame=task['end_frame'],
+        preroll_frames=task['preroll_frames'],
+        **task['process_kwargs']
+    )
+    result['start_frame'] = task['start_frame']
+    result['end_frame'] = task['end_frame']
+    result['output_path'] = task['output_path']
+    return result
+
+
+def concat_segments(segment_paths, output_path, codec='auto', audio_source=None):
+    """
+    按顺序拼接各段输出
+    系统中有ffmpeg时使用concat demuxer直接复制码流，否则用OpenCV逐帧重新写入
+
+    Args:
+        segment_paths (list): 各段视频文件路径（按顺序）
+        output_path (str): 拼接后的输出路径
+        codec (str): OpenCV回退拼接时使用的编码器
+        audio_source (str): 音轨来源文件（通常为源视频），拼接时复制其音轨；为None时输出不含音频
+    """
+    if shutil.which('ffmpeg'):
+        list_path = output_path + '.segments.txt'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        cmd = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_source:
+            # 各段只包含部分时间范围，无法各自携带对齐的音轨，在拼接时整体复制源文件的音轨
+            cmd += ['-i', audio_source, '-map', '0:v', '-map', '1:a?']
+        cmd += ['-c', 'copy', output_path]
+        try:
+            subprocess.run(cmd, check=True)
+            return
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg拼接失败，改用OpenCV拼接: {e}")
+        finally:
+            os.remove(list_path)
+
+    if audio_source:
+        print("提示: OpenCV拼接不支持音轨，输出不含音频")
+    out = None
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            if out is None:
+                fps = int(cap.get(cv2.CAP_PROP_FPS))
+                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+                input_codec = "".join([chr((fourcc >> 8 * i) & 0xFF) for i in range(4)])
+                out = open_video_writer(output_path, codec, fps, width, height, fourcc, input_codec)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        if out is not None:
+            out.release()
+
+
+def merge_segment_results(results, processing_time):
+    """
+    汇总各段的处理统计
+
+    Args:
+        results (list): 各段的process_video结果（按顺序）
+        processing_time (float): 整体墙钟耗时（秒）
+
+    Returns:
+        dict: 与process_video结果格式一致的汇总统计，'segments'中保留各段结果
+    """
+    processed_frames = sum(r['processed_frames'] for r in results)
+    frames_with_faces = sum(r['frames_with_faces'] for r in results)
+
+    multi_scale = None
+    for r in results:
+        segment_stats = r.get('multi_scale')
+        if segment_stats is None:
+            continue
+        if multi_scale is None:
+            multi_scale = {
+                'mode': segment_stats['mode'],
+                'invocations': 0, 'skipped': 0, 'thinned': 0, 'budget_exhausted': 0,
+                'scales': {name: {'attempts': 0, 'hits': 0} for name in segment_stats['scales']}
+            }
+        for key in ('invocations', 'skipped', 'thinned', 'budget_exhausted'):
+            multi_scale[key] += segment_stats[key]
+        for name, item in segment_stats['scales'].items():
+            multi_scale['scales'][name]['attempts'] += item['attempts']
+            multi_scale['scales'][name]['hits'] += item['hits']
+    if multi_scale is not None:
+        for item in multi_scale['scales'].values():
+            item['hit_rate'] = item['hits'] / item['attempts'] if item['attempts'] > 0 else 0.0
+
+    return {
+        'processed_frames': processed_frames,
+        'frames_with_faces': frames_with_faces,
+        'total_faces_detected': sum(r['total_faces_detected'] for r in results),
+        'detection_rate': frames_with_faces / processed_frames if processed_frames > 0 else 0,
+        'processing_time': processing_time,
+        'fps_processed': processed_frames / processing_time if processing_time > 0 else 0,
+        'cpu_time': sum(r['processing_time'] for r in results),
+        'keyframes': sum(r.get('keyframes', 0) for r in results),
+        'propagated_frames': sum(r.get('propagated_frames', 0) for r in results),
+        'forced_redetections': sum(r.get('forced_redetections', 0) for r in results),
+        'multi_scale': multi_scale,
+        'segments': results
+    }
+
+
+def process_video_segments(input_path, output_path=None, segments=4, workers=None, preroll_frames=30,
+                           detector_kwargs=None, **process_kwargs):
+    """
+    分段并行处理视频
+
+    Args:
+        input_path (str): 输入视频文件路径
+        output_path (str): 输出视频文件路径，如果为None则不保存
+        segments (int): 时间段数量
+        workers (int): 工作进程数，默认与段数相同
+        preroll_frames (int): 每段开始前用于预热跟踪状态的帧数
+        detector_kwargs (dict): 传给每个工作进程中VideoFaceDetector的参数
+        **process_kwargs: 传给process_video的其他参数（如apply_mosaic、mosaic_size、codec）
+
+    Returns:
+        dict: 汇总后的处理结果统计信息
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"输入视频文件不存在: {input_path}")
+
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频文件: {input_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    # 每段至少要比预热帧数长，否则预热开销得不偿失
+    ranges = plan_segments(total_frames, segments, min_segment_frames=max(1, preroll_frames))
+    workers = workers or len(ranges)
+    print(f"分段并行处理: {len(ranges)}段, {workers}个进程, 每段预热{preroll_frames}帧")
+
+    # 分段模式下预览和进度回调无法跨进程工作
+    process_kwargs.pop('show_preview', None)
+    process_kwargs.pop('progress_callback', None)
+
+    temp_dir = None
+    if output_path:
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        temp_dir = tempfile.mkdtemp(prefix='.segments_', dir=output_dir)
+    extension = os.path.splitext(output_path)[1] if output_path else ''
+
+    tasks = []
+    for index, (start, end) in enumerate(ranges):
+        tasks.append({
+            'input_path': input_path,
+            'output_path': os.path.join(temp_dir, f"segment_{index:04d}{extension}") if temp_dir else None,
+            'start_frame': start,
+            'end_frame': end,
+            'preroll_frames': preroll_frames,
+            'detector_kwargs': detector_kwargs or {},
+            'process_kwargs': process_kwargs
+        })
+
+    start_time = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_process_segment, tasks))
+
+        if output_path:
+            print(f"拼接{len(results)}个分段输出...")
+            # ffmpeg后端与单进程处理一致，保留源文件音轨
+            ffmpeg_options = process_kwargs.get('ffmpeg_options') or {}
+            keep_audio = process_kwargs.get('io_backend') == 'ffmpeg' and ffmpeg_options.get('audio', True)
+            concat_segments([r['output_path'] for r in results], output_path, process_kwargs.get('codec', 'auto'),
+                            audio_source=input_path if keep_audio else None)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    result = merge_segment_results(results, time.time() - start_time)
+
+    print(f"\n分段处理完成!")
+    print(f"总处理帧数: {result['processed_frames']}")
+    print(f"检测到人脸的帧数: {result['frames_with_faces']}")
+    print(f"人脸检测率: {result['detection_rate']:.2%}")
+    print(f"处理时间: {result['processing_time']:.2f}秒 (各段累计 {result['cpu_time']:.2f}秒)")
+    print(f"处理速度: {result['fps_processed']:.2f}帧/秒")
+
+    return result
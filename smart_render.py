@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+智能重编码（两遍处理）
+第一遍只做检测和跟踪，得到每帧需要打码的人脸框（含延续打码帧）；
+第二遍按关键帧把源视频切成GOP，只有与打码帧重叠的GOP解码、打码并重新编码，
+其余GOP直接复制码流，最后按顺序拼接并复制源文件音轨。
+人脸稀疏的长视频可以大幅减少耗时和重复编码带来的画质损失。
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import cv2
+
+from face_detector import open_video_writer
+from ffmpeg_io import FFmpegVideoReader, FFmpegVideoWriter, ffmpeg_available
+
+# 源视频编码（OpenCV FourCC）到重新编码时使用的编码器，保证拼接后码流格式一致
+SOURCE_CODECS = {
+    'avc1': 'h264',
+    'h264': 'h264',
+    'H264': 'h264',
+    'hev1': 'h265',
+    'hvc1': 'h265',
+    'hevc': 'h265',
+    'mp4v': 'mp4v'
+}
+
+# 块文件中使用的码流过滤器：把参数集（SPS/PPS、VOL头）写入每个关键帧，
+# 拼接不同编码器输出的块时解码器可以在块边界切换参数集
+CHUNK_BITSTREAM_FILTERS = {
+    'h264': 'h264_mp4toannexb',
+    'h265': 'hevc_mp4toannexb',
+    'mp4v': 'dump_extra=freq=keyframe'
+}
+
+# framecrc输出中数据包标志位
+_PKT_FLAG_KEY = 0x1
+_PKT_FLAG_DISCARD = 0x4
+_NOPTS_VALUE = -9223372036854775808
+
+
+def read_keyframes(input_path):
+    """
+    列出视频流中关键帧的帧序号（显示顺序）
+    不依赖ffprobe：用ffmpeg的framecrc格式输出每个数据包的时间戳和标志位，
+    按pts排序得到显示顺序
+
+    Args:
+        input_path (str): 输入视频文件路径
+
+    Returns:
+        tuple: (关键帧序号列表, 视频帧总数)
+    """
+    output = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', input_path,
+         '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-'],
+        capture_output=True, text=True, check=True
+    ).stdout
+
+    packets = []
+    for line in output.splitlines():
+        if line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) < 6:
+            continue
+        dts, pts = int(fields[1]), int(fields[2])
+        flags = _PKT_FLAG_KEY
+        for field in fields[6:]:
+            if field.startswith('F='):
+                flags = int(field[2:], 16)
+        # 解码时会被丢弃的数据包不对应输出帧
+        if flags & _PKT_FLAG_DISCARD:
+            continue
+        packets.append((dts if pts == _NOPTS_VALUE else pts, bool(flags & _PKT_FLAG_KEY)))
+
+    order = sorted(range(len(packets)), key=lambda i: packets[i][0])
+    keyframes = sorted(rank for rank, i in enumerate(order) if packets[i][1])
+    return keyframes, len(packets)
+
+
+def plan_chunks(keyframes, total_frames, face_frames):
+    """
+    按关键帧划分GOP，并把相邻的同类GOP合并为处理块
+
+    Args:
+        keyframes (list): 关键帧序号（显示顺序，升序）
+        total_frames (int): 视频帧总数
+        face_frames (list): 每帧是否需要打码
+
+    Returns:
+        tuple: (处理块列表[(起始帧, 结束帧, 是否重新编码), ...]，GOP总数，需重新编码的GOP数)
+    """
+    bounds = sorted(set(k for k in keyframes if 0 <= k < total_frames) | {0}) + [total_frames]
+    chunks = []
+    dirty_gops = 0
+    for start, end in zip(bounds, bounds[1:]):
+        dirty = any(face_frames[start:end])
+        dirty_gops += dirty
+        if chunks and chunks[-1][2] == dirty:
+            chunks[-1] = (chunks[-1][0], end, dirty)
+        else:
+            chunks.append((start, end, dirty))
+    return chunks, len(bounds) - 1, dirty_gops
+
+
+def _split_at_frames(input_path, boundaries, pattern, codec):
+    """
+    用segment muxer在指定关键帧处切分视频流（直接复制码流）
+
+    Args:
+        input_path (str): 输入视频文件路径
+        boundaries (list): 切分点帧序号（除0以外的各块起始帧）
+        pattern (str): 输出文件名模板，如 chunk_%05d.mkv
+        codec (str): 源视频编码（SOURCE_CODECS中的取值）
+    """
+    cmd = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-i', input_path,
+           '-map', '0:v:0', '-c', 'copy', '-bsf:v', CHUNK_BITSTREAM_FILTERS[codec],
+           '-f', 'segment', '-segment_format', 'matroska', '-reset_timestamps', '1']
+    if boundaries:
+        cmd += ['-segment_frames', ','.join(str(b) for b in boundaries)]
+    else:
+        # 只有一个块时设置一个不会触发的切分点
+        cmd += ['-segment_time', '1e9']
+    cmd.append(pattern)
+    subprocess.run(cmd, check=True)
+
+
+def _redact_chunk(detector, chunk_path, output_path, faces, fps, width, height, codec, mosaic_size,
+                  ffmpeg_options):
+    """
+    解码一个处理块，对人脸打码后重新编码
+
+    Args:
+        detector (VideoFaceDetector): 用于渲染马赛克的检测器
+        chunk_path (str): 复制得到的块文件
+        output_path (str): 重新编码后的块文件
+        faces (list): 该块内每帧的人脸框列表
+        fps (float): 帧率
+        width (int): 帧宽度
+        height (int): 帧高度
+        codec (str): 编码器名称
+        mosaic_size (int): 马赛克块大小
+        ffmpeg_options (dict): 编码参数
+    """
+    reader = FFmpegVideoReader(chunk_path, threads=ffmpeg_options.get('threads', 0))
+    writer = FFmpegVideoWriter(
+        output_path, fps, width, height, codec=codec,
+        preset=ffmpeg_options.get('preset', 'medium'),
+        crf=ffmpeg_options.get('crf', 23),
+        threads=ffmpeg_options.get('threads', 0),
+        pix_fmt=ffmpeg_options.get('pix_fmt', 'yuv420p'),
+        output_args=['-bsf:v', CHUNK_BITSTREAM_FILTERS[codec]]
+    )
+    written = 0
+    try:
+        while written < len(faces):
+            ret, frame = reader.read()
+            if not ret:
+                break
+            writer.write(detector.apply_mosaic_to_faces(frame, faces[written], mosaic_size, in_place=True))
+            written += 1
+    finally:
+        reader.release()
+        writer.release()
+    writer.check_returncode()
+    if written != len(faces):
+        raise RuntimeError(f"处理块帧数不一致: {chunk_path} 解码 {written} 帧，期望 {len(faces)} 帧")
+
+
+def _concat_chunks(chunk_paths, durations, input_path, output_path, audio=True):
+    """
+    拼接各处理块（复制码流），并从源文件复制音轨
+
+    Args:
+        chunk_paths (list): 按顺序的块文件路径
+        durations (list): 各块的精确时长（秒），用于计算后续块的时间戳偏移
+        input_path (str): 源视频文件（音轨来源）
+        output_path (str): 输出视频文件路径
+        audio (bool): 是否复制音轨
+    """
+    list_path = output_path + '.chunks.txt'
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path, duration in zip(chunk_paths, durations):
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            # 含B帧的块起始时间戳不为0，按帧数给出时长才能让各块首尾相接
+            f.write(f"file '{escaped}'\nduration {duration:.6f}\n")
+    cmd = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio:
+        cmd += ['-i', input_path, '-map', '0:v:0', '-map', '1:a?']
+    cmd += ['-c', 'copy', output_path]
+    try:
+        subprocess.run(cmd, check=True)
+    finally:
+        os.remove(list_path)
+
+
+def _render_full(detector, input_path, output_path, tracked_faces, mosaic_size, codec, ffmpeg_options):
+    """
+    回退方案：按第一遍的跟踪结果逐帧打码并整体重新编码（无需再次检测）
+    有ffmpeg时通过ffmpeg管道编码，使用相同的编码参数并复制源文件音轨；否则使用OpenCV编码
+
+    Args:
+        detector (VideoFaceDetector): 用于渲染马赛克的检测器
+        input_path (str): 输入视频文件路径
+        output_path (str): 输出视频文件路径
+        tracked_faces (list): 每帧的人脸框列表
+        mosaic_size (int): 马赛克块大小
+        codec (str): 输出编码器
+        ffmpeg_options (dict): ffmpeg编码参数：preset、crf、threads、pix_fmt、audio（是否复制音轨）
+    """
+    if ffmpeg_available():
+        reader = FFmpegVideoReader(input_path, threads=ffmpeg_options.get('threads', 0))
+        writer = FFmpegVideoWriter(
+            output_path, reader.get(cv2.CAP_PROP_FPS), int(reader.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(reader.get(cv2.CAP_PROP_FRAME_HEIGHT)), codec=codec,
+            preset=ffmpeg_options.get('preset', 'medium'),
+            crf=ffmpeg_options.get('crf', 23),
+            threads=ffmpeg_options.get('threads', 0),
+            pix_fmt=ffmpeg_options.get('pix_fmt', 'yuv420p'),
+            audio_source=input_path if ffmpeg_options.get('audio', True) else None
+        )
+        try:
+            for faces in tracked_faces:
+                ret, frame = reader.read()
+                if not ret:
+                    break
+                writer.write(detector.apply_mosaic_to_faces(frame, faces, mosaic_size, in_place=True))
+        finally:
+            reader.release()
+            writer.release()
+        writer.check_returncode()
+        return
+
+    cap = cv2.VideoCapture(input_path)
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    input_fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    input_codec = "".join([chr((input_fourcc >> 8 * i) & 0xFF) for i in range(4)])
+    out = open_video_writer(output_path, codec, fps, width, height, input_fourcc, input_codec)
+    try:
+        for faces in tracked_faces:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(detector.apply_mosaic_to_faces(frame, faces, mosaic_size, in_place=True))
+    finally:
+        cap.release()
+        out.release()
+
+
+def smart_render(detector, input_path, output_path, mosaic_size=15, codec='auto', ffmpeg_options=None,
+                 **process_kwargs):
+    """
+    两遍智能重编码：只重新编码包含人脸的GOP，其余GOP直接复制码流
+
+    Args:
+        detector (VideoFaceDetector): 人脸检测器
+        input_path (str): 输入视频文件路径
+        output_path (str): 输出视频文件路径
+        mosaic_size (int): 马赛克块大小
+        codec (str): 无法智能重编码时整体重新编码使用的编码器
+        ffmpeg_options (dict): 重新编码的参数：preset、crf、threads、pix_fmt、audio（是否复制音轨）
+        **process_kwargs: 传给第一遍process_video的其他参数（如detect_size、detect_interval、pipeline_workers）
+
+    Returns:
+        dict: 第一遍的处理统计，'smart_render'中为GOP数量、重新编码的GOP和帧数等信息
+    """
+    ffmpeg_options = dict(ffmpeg_options or {})
+    start_time = time.time()
+
+    # 第一遍：只检测和跟踪，不渲染、不输出
+    print("智能重编码 第一遍: 检测并记录需要打码的帧...")
+    process_kwargs.pop('apply_mosaic', None)
+    process_kwargs.pop('show_preview', None)
+    result = detector.process_video(input_path, output_path=None, collect_faces=True, **process_kwargs)
+    tracked_faces = result.pop('tracked_faces')
+    face_frames = [len(faces) > 0 for faces in tracked_faces]
+    total_frames = len(tracked_faces)
+
+    stats = {
+        'gops': 0,
+        'reencoded_gops': 0,
+        'copied_gops': 0,
+        'redacted_frames': sum(face_frames),
+        'reencoded_frames': total_frames,
+        'fallback': None
+    }
+
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    input_fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    cap.release()
+    input_codec = "".join([chr((input_fourcc >> 8 * i) & 0xFF) for i in range(4)])
+    chunk_codec = SOURCE_CODECS.get(input_codec)
+
+    # 检查能否只重新编码部分GOP
+    chunks = None
+    if not ffmpeg_available():
+        stats['fallback'] = '未找到ffmpeg'
+    elif chunk_codec is None:
+        stats['fallback'] = f"不支持的源视频编码: {input_codec}"
+    else:
+        keyframes, packet_count = read_keyframes(input_path)
+        if packet_count != total_frames:
+            stats['fallback'] = f"数据包数量({packet_count})与解码帧数({total_frames})不一致"
+        elif not keyframes or keyframes[0] != 0:
+            stats['fallback'] = "视频不是从关键帧开始"
+        else:
+            chunks, stats['gops'], stats['reencoded_gops'] = plan_chunks(keyframes, total_frames, face_frames)
+            stats['copied_gops'] = stats['gops'] - stats['reencoded_gops']
+
+    if chunks is not None:
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        temp_dir = tempfile.mkdtemp(prefix='.smart_render_', dir=output_dir)
+        try:
+            print(f"智能重编码 第二遍: {stats['gops']}个GOP, 重新编码 {stats['reencoded_gops']}个, "
+                  f"复制 {stats['copied_gops']}个")
+            _split_at_frames(input_path, [start for start, _, _ in chunks[1:]],
+                             os.path.join(temp_dir, 'chunk_%05d.mkv'), chunk_codec)
+
+            chunk_paths = []
+            stats['reencoded_frames'] = 0
+            for index, (start, end, reencode) in enumerate(chunks):
+                chunk_path = os.path.join(temp_dir, f"chunk_{index:05d}.mkv")
+                if reencode:
+                    redacted_path = os.path.join(temp_dir, f"redacted_{index:05d}.mkv")
+                    _redact_chunk(detector, chunk_path, redacted_path, tracked_faces[start:end], fps,
+                                  width, height, chunk_codec, mosaic_size, ffmpeg_options)
+                    chunk_path = redacted_path
+                    stats['reencoded_frames'] += end - start
+                chunk_paths.append(chunk_path)
+
+            durations = [(end - start) / fps for start, end, _ in chunks]
+            _concat_chunks(chunk_paths, durations, input_path, output_path, ffmpeg_options.get('audio', True))
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            stats['fallback'] = str(e)
+            stats['reencoded_frames'] = total_frames
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if stats['fallback']:
+        print(f"无法智能重编码（{stats['fallback']}），整体重新编码")
+        _render_full(detector, input_path, output_path, tracked_faces, mosaic_size, codec, ffmpeg_options)
+
+    result['smart_render'] = stats
+    result['processing_time'] = time.time() - start_time
+    result['fps_processed'] = total_frames / result['processing_time'] if result['processing_time'] > 0 else 0
+
+    print(f"\n智能重编码完成!")
+    print(f"打码帧数: {stats['redacted_frames']}/{total_frames}")
+    print(f"重新编码帧数: {stats['reencoded_frames']}/{total_frames}")
+    print(f"总耗时: {result['processing_time']:.2f}秒")
+    return result
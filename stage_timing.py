@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段计时
+记录每帧在解码、检测、多尺度回退、跟踪、渲染、编码各阶段的耗时，汇总为累计时间、最小/最大值和p50/p95/p99。
+每个阶段只保存次数、累计、最小、最大值和固定大小的蓄水池样本（用于估计百分位），长视频的内存占用不随帧数增长；
+每次记录约1微秒，相对每帧数毫秒的处理时间可以忽略，因此始终开启。
+"""
+
+import random
+import threading
+
+import numpy as np
+
+# 阶段名称 -> 表格中的显示名称（按处理顺序）
+STAGES = {
+    'decode': '解码',
+    'detect': '检测',
+    'multi_scale': '多尺度回退',
+    'track': '跟踪',
+    'render': '渲染',
+    'encode': '编码'
+}
+
+
+# 每个阶段用于估计百分位的样本数上限（不超过该帧数时百分位是精确值）
+RESERVOIR_SIZE = 4096
+
+
+class _StageStats:
+    """
+    单个阶段的耗时统计：次数、累计、最小、最大值和蓄水池样本
+    蓄水池抽样（Algorithm R）保证每次记录被保留的概率相同，百分位估计不偏向视频的开头或结尾
+    """
+
+    def __init__(self, reservoir_size, seed):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.reservoir = []
+        self.reservoir_size = reservoir_size
+        self.random = random.Random(seed)
+        # 多线程流水线中多个检测/渲染线程会同时记录同一阶段
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir.append(seconds)
+            else:
+                index = self.random.randrange(self.count)
+                if index < self.reservoir_size:
+                    self.reservoir[index] = seconds
+
+
+class StageTimer:
+    """
+    分阶段计时器
+    每个阶段保存运行中的汇总值和固定大小的蓄水池样本，内存占用与处理帧数无关
+    """
+
+    def __init__(self, reservoir_size=RESERVOIR_SIZE):
+        """
+        Args:
+            reservoir_size (int): 每个阶段用于估计百分位的样本数上限
+        """
+        self.stats = {name: _StageStats(reservoir_size, seed=index) for index, name in enumerate(STAGES)}
+
+    def record(self, stage, seconds):
+        """
+        记录一次阶段耗时
+
+        Args:
+            stage (str): 阶段名称
+            seconds (float): 耗时（秒）
+        """
+        self.stats[stage].add(seconds)
+
+    def totals(self):
+        """
+        各阶段当前的累计耗时（处理过程中调用）
+
+        Returns:
+            dict: 阶段名称 -> 累计耗时（秒）
+        """
+        return {name: stats.total for name, stats in self.stats.items()}
+
+    def summary(self, processing_time=None):
+        """
+        汇总各阶段耗时
+
+        Args:
+            processing_time (float): 整体处理时间（秒），用于计算各阶段占比；为None时按各阶段累计时间之和计算
+
+        Returns:
+            dict: 阶段名称 -> {count, total, mean_ms, min_ms, max_ms, p50_ms, p95_ms, p99_ms, share}，
+                  记录次数超过蓄水池大小时百分位为抽样估计值
+        """
+        reference = processing_time if processing_time else sum(stats.total for stats in self.stats.values())
+        stages = {}
+        for name, stats in self.stats.items():
+            with stats.lock:
+                count, total, reservoir = stats.count, stats.total, list(stats.reservoir)
+                low, high = stats.min, stats.max
+            if count:
+                p50, p95, p99 = np.percentile(np.asarray(reservoir), (50, 95, 99)) * 1000
+            else:
+                p50 = p95 = p99 = 0.0
+                low = high = 0.0
+            stages[name] = {
+                'count': count,
+                'total': total,
+                'mean_ms': total / count * 1000 if count else 0.0,
+                'min_ms': low * 1000,
+                'max_ms': high * 1000,
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'share': total / reference if reference > 0 else 0.0
+            }
+        return stages
+
+
+def format_timing_table(timing):
+    """
+    把process_video结果中的'timing'格式化为分阶段耗时表
+
+    Args:
+        timing (dict): process_video结果中的'timing'
+
+    Returns:
+        str: 多行表格文本
+    """
+    lines = [
+        f"{'阶段':<10}{'次数':>8}{'累计(秒)':>10}{'占比':>8}{'平均(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}",
+        "-" * 76
+    ]
+    for name, label in STAGES.items():
+        item = timing['stages'][name]
+        if item['count'] == 0:
+            continue
+        lines.append(f"{label:<10}{item['count']:>8}{item['total']:>10.2f}{item['share']:>8.1%}{item['mean_ms']:>10.2f}"
+                     f"{item['p50_ms']:>10.2f}{item['p95_ms']:>10.2f}{item['p99_ms']:>10.2f}")
+    lines.append("-" * 76)
+    lines.append(f"多尺度回退: {timing['multi_scale_invocations']}次, 延续打码: {timing['continuation_frames']}帧")
+    return "\n".join(lines)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成测试视频生成器
+离线生成可复现的测试视频：分辨率、时长、人脸数量和无人脸片段均可配置。
+人脸默认为程序绘制的简易人脸（YuNet可检测），也可以用给定图片（如人脸裁剪图）贴图；
+相同的参数和随机种子逐帧生成完全相同的画面，不同机器上的基准测试因此可以直接比较。
+
+使用方法:
+    python synthetic_video.py bench.mp4 --size 1280x720 --duration 8 --faces 3 --face-free 2-3,6-6.5
+    python synthetic_video.py bench.mp4 --face-crops faces/*.jpg --seed 7
+"""
+
+import argparse
+import glob
+
+import cv2
+import numpy as np
+
+
+def draw_face(frame, center, size):
+    """
+    在帧上绘制一个可被YuNet检测到的简易人脸
+
+    Args:
+        frame (numpy.ndarray): 目标图像帧
+        center (tuple): 人脸中心 (x, y)
+        size (int): 人脸尺寸（约为脸部高度的一半）
+    """
+    cx, cy = center
+    cv2.ellipse(frame, (cx, cy), (int(size * 0.38), int(size * 0.5)), 0, 0, 360, (150, 180, 225), -1)
+    for dx in (-0.16, 0.16):
+        eye = (int(cx + dx * size), int(cy - 0.1 * size))
+        cv2.ellipse(frame, eye, (int(size * 0.07), int(size * 0.035)), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(frame, eye, int(size * 0.03), (40, 30, 20), -1)
+        cv2.line(frame, (eye[0] - int(size * 0.08), eye[1] - int(size * 0.08)),
+                 (eye[0] + int(size * 0.08), eye[1] - int(size * 0.09)), (40, 40, 60), 4)
+    cv2.line(frame, (cx, cy), (cx - int(size * 0.03), cy + int(size * 0.12)), (110, 130, 180), 3)
+    cv2.ellipse(frame, (cx, cy + int(size * 0.25)), (int(size * 0.12), int(size * 0.04)), 0, 0, 180, (60, 60, 170), -1)
+
+
+def paste_face(frame, center, size, crop):
+    """
+    把人脸图片缩放后贴到帧上（超出画面的部分裁掉）
+
+    Args:
+        frame (numpy.ndarray): 目标图像帧
+        center (tuple): 人脸中心 (x, y)
+        size (int): 人脸尺寸，与draw_face一致（贴图高度约为size）
+        crop (numpy.ndarray): 人脸图片
+    """
+    height = max(2, int(size * 1.05))
+    width = max(2, int(height * crop.shape[1] / crop.shape[0]))
+    face = cv2.resize(crop, (width, height), interpolation=cv2.INTER_AREA)
+    x1, y1 = center[0] - width // 2, center[1] - height // 2
+    fx1, fy1 = max(0, -x1), max(0, -y1)
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(frame.shape[1], x1 + width - fx1), min(frame.shape[0], y1 + height - fy1)
+    if x2 > x1 and y2 > y1:
+        frame[y1:y2, x1:x2] = face[fy1:fy1 + y2 - y1, fx1:fx1 + x2 - x1]
+
+
+def load_face_crops(patterns):
+    """
+    读取人脸贴图
+
+    Args:
+        patterns (list): 图片路径或通配符
+
+    Returns:
+        list: BGR图像列表
+    """
+    crops = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            image = cv2.imread(path)
+            if image is None:
+                raise ValueError(f"无法读取人脸图片: {path}")
+            crops.append(image)
+    return crops
+
+
+def parse_face_free(text):
+    """
+    解析无人脸片段，如 "2-3,6-6.5" 表示第2~3秒和第6~6.5秒没有人脸
+
+    Args:
+        text (str): 逗号分隔的 开始-结束 秒数
+
+    Returns:
+        list: [(开始秒, 结束秒), ...]
+    """
+    spans = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        start, end = item.split('-')
+        spans.append((float(start), float(end)))
+    return spans
+
+
+def synthetic_frames(width=1280, height=720, fps=25, duration=4.0, faces=1, face_free=(), face_size=None,
+                     face_crops=None, seed=0):
+    """
+    逐帧生成合成画面：带纹理的缓慢平移背景，每个人脸在自己的横向区域内沿平滑轨迹移动
+
+    Args:
+        width (int): 画面宽度
+        height (int): 画面高度
+        fps (float): 帧率
+        duration (float): 时长（秒）
+        faces (int): 人脸数量
+        face_free (list): 无人脸片段 [(开始秒, 结束秒), ...]
+        face_size (int): 人脸尺寸（约为脸部高度），为None时按画面高度和人脸数量自动选择
+        face_crops (list): 人脸贴图，为None时使用程序绘制的人脸
+        seed (int): 随机种子
+
+    Yields:
+        tuple: (帧, 本帧人脸框列表[(x, y, w, h), ...])
+    """
+    rng = np.random.default_rng(seed)
+    frame_count = max(1, int(round(duration * fps)))
+    lane_width = width / max(1, faces)
+    if face_size is None:
+        face_size = int(min(height * 0.3, lane_width * 0.8))
+
+    # 背景：低频彩色纹理，平移时仍有足够的细节供编码器和光流使用
+    texture = rng.integers(40, 200, size=(max(2, height // 24), max(2, width // 24), 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(cv2.resize(texture, (width * 2, height), interpolation=cv2.INTER_CUBIC), (0, 0), 3)
+
+    # 每个人脸的运动参数：在各自横向区域内做李萨如运动，互不重叠
+    motions = [{
+        'phase': rng.uniform(0, 2 * np.pi, size=2),
+        'speed': rng.uniform(0.15, 0.45, size=2),
+        'crop': face_crops[i % len(face_crops)] if face_crops else None
+    } for i in range(faces)]
+    margin_x = max(0.0, (lane_width - face_size * 0.8) / 2)
+    margin_y = max(0.0, (height - face_size * 1.1) / 2)
+
+    for index in range(frame_count):
+        t = index / fps
+        shift = int(t * 20) % width
+        frame = np.ascontiguousarray(background[:, shift:shift + width])
+        boxes = []
+        if not any(start <= t < end for start, end in face_free):
+            for i, motion in enumerate(motions):
+                angle = 2 * np.pi * motion['speed'] * t + motion['phase']
+                cx = int(lane_width * (i + 0.5) + margin_x * 0.8 * np.sin(angle[0]))
+                cy = int(height / 2 + margin_y * 0.8 * np.sin(angle[1]))
+                if motion['crop'] is not None:
+                    paste_face(frame, (cx, cy), face_size, motion['crop'])
+                else:
+                    draw_face(frame, (cx, cy), face_size)
+                w, h = int(face_size * 0.76), int(face_size)
+                boxes.append((cx - w // 2, cy - h // 2, w, h))
+        yield cv2.GaussianBlur(frame, (5, 5), 0), boxes
+
+
+def write_synthetic_video(path, width=1280, height=720, fps=25, duration=4.0, faces=1, face_free=(), face_size=None,
+                          face_crops=None, seed=0, codec='mp4v'):
+    """
+    生成合成测试视频文件
+
+    Args:
+        path (str): 输出视频路径
+        width, height, fps, duration, faces, face_free, face_size, face_crops, seed: 同synthetic_frames
+        codec (str): FourCC编码
+
+    Returns:
+        dict: 视频信息，包括帧数、有人脸的帧数和每帧的人脸框（真值）
+    """
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+    if not out.isOpened():
+        raise ValueError(f"无法创建视频文件: {path}")
+    boxes = []
+    try:
+        for frame, frame_boxes in synthetic_frames(width, height, fps, duration, faces, face_free, face_size,
+                                                   face_crops, seed):
+            out.write(frame)
+            boxes.append(frame_boxes)
+    finally:
+        out.release()
+    return {
+        'path': path,
+        'width': width,
+        'height': height,
+        'fps': fps,
+        'frames': len(boxes),
+        'face_frames': sum(1 for frame_boxes in boxes if frame_boxes),
+        'boxes': boxes
+    }
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='生成合成人脸测试视频')
+    parser.add_argument('output', help='输出视频路径')
+    parser.add_argument('--size', default='1280x720', help='分辨率，如 1920x1080（默认：1280x720）')
+    parser.add_argument('--fps', type=float, default=25, help='帧率（默认：25）')
+    parser.add_argument('--duration', type=float, default=4.0, help='时长（秒，默认：4）')
+    parser.add_argument('--faces', type=int, default=1, help='人脸数量（默认：1）')
+    parser.add_argument('--face-free', default='', help='无人脸片段（秒），如 2-3,6-6.5')
+    parser.add_argument('--face-size', type=int, default=None, help='人脸尺寸（像素，默认按画面自动选择）')
+    parser.add_argument('--face-crops', nargs='+', default=None, help='人脸贴图（图片路径或通配符）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认：0）')
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    info = write_synthetic_video(
+        args.output, width, height, args.fps, args.duration, args.faces, parse_face_free(args.face_free),
+        args.face_size, load_face_crops(args.face_crops) if args.face_crops else None, args.seed
+    )
+    print(f"已生成: {info['path']} ({info['width']}x{info['height']}, {info['frames']}帧, "
+          f"其中{info['face_frames']}帧有人脸)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理速度基准测试套件
+
+用合成视频（synthetic_video.py，同样的参数生成逐帧相同的画面）代替本地的input.mp4，
+对每种视频配置和models/下的每个模型运行process_video，结果保存为JSON；
+compare子命令比较两次结果，处理速度下降超过阈值时标记为回退并以非零状态退出。
+
+使用方法:
+    python tests/benchmark_suite.py run --json bench.json [--configs 720p_3faces] [--repeat 5]
+    python tests/benchmark_suite.py run --json new.json --baseline bench.json
+    python tests/benchmark_suite.py compare bench.json new.json [--threshold 0.05]
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# 视频配置：分辨率、时长、人脸数量和无人脸片段（秒）
+CONFIGS = {
+    '480p_1face': {'width': 854, 'height': 480, 'duration': 4.0, 'faces': 1, 'face_free': [(1.5, 2.5)]},
+    '720p_3faces': {'width': 1280, 'height': 720, 'duration': 4.0, 'faces': 3, 'face_free': [(2.0, 2.5)]},
+    '1080p_2faces': {'width': 1920, 'height': 1080, 'duration': 4.0, 'faces': 2, 'face_free': [(1.0, 1.5)]},
+    '720p_no_faces': {'width': 1280, 'height': 720, 'duration': 4.0, 'faces': 0, 'face_free': []}
+}
+
+SEED = 0
+
+
+def list_models():
+    """
+    models/目录下的全部YuNet模型
+
+    Returns:
+        list: 模型文件路径（按文件名排序）
+    """
+    return sorted(glob.glob(os.path.join(PROJECT_DIR, 'models', '*.onnx')))
+
+
+def machine_info():
+    """
+    当前机器和依赖版本信息（比较不同机器的结果时用于提示）
+
+    Returns:
+        dict: 平台、处理器、CPU核数和Python/OpenCV/NumPy版本
+    """
+    import cv2
+    import numpy as np
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__
+    }
+
+
+def prepare_video(name, video_dir):
+    """
+    生成（或复用已生成的）配置对应的合成视频
+
+    Args:
+        name (str): 配置名称
+        video_dir (str): 视频目录
+
+    Returns:
+        dict: 视频信息，'path'为视频路径，'face_frames'为有人脸的帧数
+    """
+    from synthetic_video import write_synthetic_video
+    config = CONFIGS[name]
+    path = os.path.join(video_dir, f"{name}_seed{SEED}.mp4")
+    info_path = path + '.json'
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path, encoding='utf-8') as f:
+            return json.load(f)
+    info = write_synthetic_video(path, seed=SEED, **config)
+    info = {key: value for key, value in info.items() if key != 'boxes'}
+    with open(info_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    return info
+
+
+def run_case(video, model_path, output_path, repeat=1, detect_size=None):
+    """
+    用一个模型处理一个视频，重复多次取处理速度的中位数
+
+    Args:
+        video (dict): prepare_video的返回值
+        model_path (str): 模型文件路径
+        output_path (str): 输出视频路径（每次覆盖）
+        repeat (int): 重复次数
+        detect_size (int): 检测分辨率（长边像素数）
+
+    Returns:
+        dict: 处理速度、处理时间、检测统计和各阶段平均耗时
+    """
+    from face_detector import VideoFaceDetector
+    runs = []
+    for _ in range(repeat):
+        detector = VideoFaceDetector(model_path=model_path, detect_size=detect_size)
+        with redirect_stdout(io.StringIO()):
+            runs.append(detector.process_video(video['path'], output_path, apply_mosaic=True, codec='mp4v'))
+    result = sorted(runs, key=lambda item: item['fps_processed'])[len(runs) // 2]
+    return {
+        'frames': result['processed_frames'],
+        'fps': result['fps_processed'],
+        'fps_runs': [item['fps_processed'] for item in runs],
+        'processing_time': result['processing_time'],
+        'frames_with_faces': result['frames_with_faces'],
+        'faces_detected': result['total_faces_detected'],
+        'face_frames_expected': video['face_frames'],
+        'stages_mean_ms': {name: item['mean_ms'] for name, item in result['timing']['stages'].items()}
+    }
+
+
+def run_suite(configs=None, models=None, repeat=1, detect_size=None, video_dir=None):
+    """
+    运行基准测试
+
+    Args:
+        configs (list): 配置名称，None表示全部
+        models (list): 模型文件路径，None表示models/下的全部模型
+        repeat (int): 每个用例的重复次数
+        detect_size (int): 检测分辨率（长边像素数）
+        video_dir (str): 合成视频目录，None时使用临时目录
+
+    Returns:
+        dict: 基准测试报告
+    """
+    from event_log import set_log_level
+    set_log_level('warning')
+    configs = configs or list(CONFIGS)
+    models = models or list_models()
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': machine_info(),
+        'settings': {'repeat': repeat, 'detect_size': detect_size, 'seed': SEED},
+        'results': []
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_dir = video_dir or tmp_dir
+        os.makedirs(video_dir, exist_ok=True)
+        output_path = os.path.join(tmp_dir, 'output.mp4')
+        for name in configs:
+            video = prepare_video(name, video_dir)
+            for model_path in models:
+                try:
+                    item = run_case(video, model_path, output_path, repeat, detect_size)
+                except Exception as e:
+                    # 当前OpenCV版本不支持的模型（如int8bq需要OpenCV 4.9+）记录错误后继续
+                    message = str(e).strip().splitlines()[0]
+                    report['results'].append({'config': name, 'model': os.path.basename(model_path), 'error': message})
+                    print(f"{name:<16}{os.path.basename(model_path):<44}失败: {message}", flush=True)
+                    continue
+                item.update(config=name, model=os.path.basename(model_path))
+                report['results'].append(item)
+                print(f"{name:<16}{item['model']:<44}{item['fps']:>8.2f} 帧/秒  "
+                      f"有人脸 {item['frames_with_faces']}/{item['face_frames_expected']}", flush=True)
+    return report
+
+
+def compare_reports(baseline, current, threshold=0.05):
+    """
+    比较两次基准测试结果
+
+    Args:
+        baseline (dict): 基准报告
+        current (dict): 当前报告
+        threshold (float): 处理速度下降超过该比例时视为回退
+
+    Returns:
+        list: 每个共同用例一行：config、model、两次的fps、变化比例和是否回退
+    """
+    base = {(item['config'], item['model']): item for item in baseline['results'] if 'error' not in item}
+    rows = []
+    for item in current['results']:
+        key = (item['config'], item['model'])
+        if key not in base or 'error' in item:
+            continue
+        change = item['fps'] / base[key]['fps'] - 1 if base[key]['fps'] > 0 else 0.0
+        rows.append({
+            'config': item['config'],
+            'model': item['model'],
+            'baseline_fps': base[key]['fps'],
+            'current_fps': item['fps'],
+            'change': change,
+            'regression': change < -threshold
+        })
+    return rows
+
+
+def print_comparison(rows, baseline, current):
+    """
+    打印比较结果
+
+    Args:
+        rows (list): compare_reports的返回值
+        baseline (dict): 基准报告
+        current (dict): 当前报告
+    """
+    if baseline['machine'] != current['machine']:
+        print("注意: 两次结果来自不同的机器或依赖版本，速度差异不一定是代码回退")
+    print(f"\n{'配置':<16}{'模型':<44}{'基准':>10}{'当前':>10}{'变化':>9}")
+    print("-" * 92)
+    for row in rows:
+        flag = '  ← 回退' if row['regression'] else ''
+        print(f"{row['config']:<16}{row['model']:<44}{row['baseline_fps']:>10.2f}{row['current_fps']:>10.2f}"
+              f"{row['change']:>+9.1%}{flag}")
+    print("-" * 92)
+    print(f"共{len(rows)}个用例，回退{sum(row['regression'] for row in rows)}个")
+
+
+def load_report(path):
+    """读取JSON报告"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='处理速度基准测试套件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='运行基准测试')
+    run_parser.add_argument('--json', help='把结果保存为JSON文件')
+    run_parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), help='视频配置（默认：全部）')
+    run_parser.add_argument('--models', nargs='+', help='模型文件（默认：models/下的全部模型）')
+    run_parser.add_argument('--repeat', type=int, default=3, help='每个用例的重复次数（取中位数，默认：3）')
+    run_parser.add_argument('--detect-size', type=int, default=None, help='检测分辨率（长边像素）')
+    run_parser.add_argument('--video-dir', help='合成视频目录（保留生成的视频供下次复用，默认：临时目录）')
+    run_parser.add_argument('--baseline', help='运行后与该JSON结果比较')
+    run_parser.add_argument('--threshold', type=float, default=0.05, help='速度下降超过该比例视为回退（默认：0.05）')
+
+    compare_parser = subparsers.add_parser('compare', help='比较两次基准测试结果')
+    compare_parser.add_argument('baseline', help='基准JSON')
+    compare_parser.add_argument('current', help='当前JSON')
+    compare_parser.add_argument('--threshold', type=float, default=0.05, help='速度下降超过该比例视为回退（默认：0.05）')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        print("处理速度基准测试")
+        print("=" * 92)
+        report = run_suite(args.configs, args.models, args.repeat, args.detect_size, args.video_dir)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"结果已保存: {args.json}")
+        if not args.baseline:
+            return
+        baseline, current = load_report(args.baseline), report
+    else:
+        baseline, current = load_report(args.baseline), load_report(args.current)
+
+    rows = compare_reports(baseline, current, args.threshold)
+    print_comparison(rows, baseline, current)
+    if any(row['regression'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@
 此脚本用于测试和展示视频处理的性能指标，包括处理时间和每秒处理帧数
 """
 
+import os
 import cv2
 import numpy as np
 from face_detector import VideoFaceDetector
@@ -18,10 +19,12 @@ def main():
     print("=" * 50)
     
     # 初始化人脸检测器
-    detector = VideoFaceDetector(model_path='models/face_detection_yunet_2023mar_int8bq.onnx')
-    
+    # 模型变体使用本机测量结果缓存（见model_selector.py），没有缓存时为fp32
+    detector = VideoFaceDetector()
+
     print("\n测试配置:")
     print("- 输入视频: input.mp4")
+    print(f"- 模型: {os.path.basename(detector.model_path)}")
     print("- 椭圆形马赛克: 启用")
     print("- 马赛克块大小: 30")
     
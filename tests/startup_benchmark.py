@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动开销基准测试
+
+在全新的子进程中分别测量每种检测器的导入时间、初始化时间和峰值内存（RSS），
+以及 main.py --help 的总耗时，用于确认未选中的后端不会在启动时被导入。
+
+使用方法:
+    python tests/startup_benchmark.py [--runs 3] [--json startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程中执行的测量脚本：输出一行JSON
+PROBE_SCRIPT = r'''
+import json, resource, sys, time
+start = time.perf_counter()
+from detector_registry import create_detector, load_detector_class, deepface_available
+name = sys.argv[1]
+result = {'detector': name, 'available': True}
+try:
+    if name != 'yunet' and not deepface_available():
+        result['available'] = False
+    load_detector_class(name if result['available'] else 'yunet')
+    result['import_time'] = time.perf_counter() - start
+    init_start = time.perf_counter()
+    create_detector(name)
+    result['init_time'] = time.perf_counter() - init_start
+except Exception as e:
+    result['error'] = str(e)
+result['deepface_imported'] = 'deepface' in sys.modules
+result['tensorflow_imported'] = 'tensorflow' in sys.modules
+result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+print(json.dumps(result))
+'''
+
+
+def probe_detector(name):
+    """
+    在新进程中测量一种检测器的启动开销
+
+    Args:
+        name (str): 检测器名称
+
+    Returns:
+        dict: 导入时间、初始化时间、峰值内存和进程总耗时
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', PROBE_SCRIPT, name], cwd=PROJECT_DIR,
+                               capture_output=True, text=True)
+    wall_time = time.perf_counter() - start
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+    if not lines:
+        return {'detector': name, 'error': completed.stderr.strip().splitlines()[-1:] or 'unknown'}
+    result = json.loads(lines[-1])
+    result['wall_time'] = wall_time
+    return result
+
+
+def probe_cli_help():
+    """
+    测量 main.py --help 的进程总耗时
+
+    Returns:
+        float: 耗时（秒）
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', '--help'], cwd=PROJECT_DIR, capture_output=True)
+    return time.perf_counter() - start
+
+
+def summarize(samples, key):
+    """取多次测量的中位数"""
+    values = [s[key] for s in samples if key in s]
+    return statistics.median(values) if values else None
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='检测器启动开销基准测试')
+    parser.add_argument('--runs', type=int, default=3, help='每种检测器的测量次数（取中位数，默认：3）')
+    parser.add_argument('--json', help='把结果保存为JSON文件')
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_DIR)
+    from detector_registry import DETECTORS
+
+    print("检测器启动开销基准测试")
+    print("=" * 72)
+
+    report = {'python': sys.version.split()[0], 'runs': args.runs, 'detectors': {}}
+    for name in DETECTORS:
+        samples = [probe_detector(name) for _ in range(args.runs)]
+        errors = [s['error'] for s in samples if 'error' in s]
+        report['detectors'][name] = {
+            'available': all(s.get('available', False) for s in samples),
+            'import_time': summarize(samples, 'import_time'),
+            'init_time': summarize(samples, 'init_time'),
+            'wall_time': summarize(samples, 'wall_time'),
+            'peak_rss_mb': summarize(samples, 'peak_rss_mb'),
+            'deepface_imported': any(s.get('deepface_imported') for s in samples),
+            'tensorflow_imported': any(s.get('tensorflow_imported') for s in samples),
+            'error': errors[0] if errors else None
+        }
+    report['cli_help_time'] = statistics.median(probe_cli_help() for _ in range(args.runs))
+
+    def fmt(value, unit, scale=1.0):
+        return f"{value * scale:.1f}{unit}" if value is not None else '-'
+
+    print(f"{'检测器':<10}{'导入':>10}{'初始化':>10}{'进程总耗时':>12}{'峰值RSS':>12}  DeepFace/TF")
+    print("-" * 72)
+    for name, item in report['detectors'].items():
+        imported = f"{'是' if item['deepface_imported'] else '否'}/{'是' if item['tensorflow_imported'] else '否'}"
+        note = '' if item['available'] else '  (DeepFace不可用，回退YuNet)'
+        print(f"{name:<10}{fmt(item['import_time'], 'ms', 1000):>10}{fmt(item['init_time'], 'ms', 1000):>10}"
+              f"{fmt(item['wall_time'], 'ms', 1000):>12}{fmt(item['peak_rss_mb'], 'MB'):>12}  {imported}{note}")
+        if item['error']:
+            print(f"  错误: {item['error']}")
+    print("-" * 72)
+    print(f"main.py --help: {report['cli_help_time'] * 1000:.1f}ms")
+
+    if report['detectors']['yunet']['deepface_imported']:
+        print("警告: YuNet路径导入了DeepFace，延迟加载失效")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
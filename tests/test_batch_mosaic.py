@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量打码测试
+验证输入收集、最长任务优先调度、已是最新的输出跳过和汇总表
+"""
+
+import os
+import tempfile
+import time
+
+from batch_mosaic import collect_inputs, run_batch, schedule_jobs, summary_rows, write_summary
+from video_helpers import write_test_video
+
+def test_collect_and_schedule():
+    """目录中的输出文件不作为输入；任务按帧数从长到短排列"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ('a.mp4', 'b.avi', 'a_out.mp4', 'c_out_20231201_143022.mp4', 'notes.txt'):
+            open(os.path.join(tmp_dir, name), 'wb').close()
+        inputs = collect_inputs([tmp_dir, os.path.join(tmp_dir, '*.mp4')])
+        assert [os.path.basename(p) for p in inputs] == ['a.mp4', 'b.avi']
+
+    jobs = [{'frames': 10}, {'frames': 300}, {'frames': 40}]
+    assert [job['frames'] for job in schedule_jobs(jobs)] == [300, 40, 10]
+
+def test_batch_skips_up_to_date_outputs():
+    """第二次运行跳过已是最新的输出，输入更新后只重新处理该文件"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_dir = os.path.join(tmp_dir, 'in')
+        output_dir = os.path.join(tmp_dir, 'out')
+        os.makedirs(input_dir)
+        for name, frames in (('short.mp4', 10), ('long.mp4', 30)):
+            write_test_video(os.path.join(input_dir, name), frame_count=frames)
+        inputs = collect_inputs([input_dir])
+
+        options = dict(output_dir=output_dir, workers=2, detector_name='yunet',
+                       detector_options={'continuation_frames': 3}, apply_mosaic=True, codec='mp4v')
+        first = run_batch(inputs, **options)
+        assert [item['status'] for item in first] == ['done', 'done']
+        assert [item['result']['processed_frames'] for item in first] == [30, 10]
+        assert sorted(os.listdir(output_dir)) == ['long_out.mp4', 'short_out.mp4']
+
+        second = run_batch(inputs, **options)
+        assert [item['status'] for item in second] == ['skipped', 'skipped']
+
+        future = time.time() + 10
+        os.utime(os.path.join(input_dir, 'short.mp4'), (future, future))
+        third = run_batch(inputs, **options)
+        assert [item['status'] for item in third] == ['skipped', 'done']
+
+        rows = summary_rows(third)
+        assert rows[1]['frames'] == 10 and rows[0]['processing_time'] == ''
+        summary_path = os.path.join(tmp_dir, 'summary.csv')
+        write_summary(rows, summary_path)
+        with open(summary_path, encoding='utf-8-sig') as f:
+            assert len(f.read().strip().splitlines()) == 3
+
+def main():
+    """主函数"""
+    print("批量打码测试")
+    print("=" * 40)
+    test_collect_and_schedule()
+    test_batch_skips_up_to_date_outputs()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
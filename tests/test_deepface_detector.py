@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepFace检测器测试
+用模拟的DeepFace接口（无需安装deepface）验证各版本接口的兼容处理、检测分辨率缩放后的坐标映射，
+检测模型构建失败时改用extract_faces且不再重复构建，以及人脸属性批量分析的结果顺序和逐张分析回退
+"""
+
+import sys
+import types
+
+import numpy as np
+import pytest
+import deepface_detector
+from deepface_detector import DeepFaceDetector
+
+class FakeModel:
+    """模拟检测模型：记录输入图像尺寸，返回固定的人脸框"""
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.shapes = []
+
+    def detect_faces(self, img):
+        self.shapes.append(img.shape)
+        return [types.SimpleNamespace(x=x, y=y, w=w, h=h, confidence=c) for x, y, w, h, c in self.faces]
+
+def install_deepface(monkeypatch, extract_faces=None, analyze=None, **modules):
+    """
+    安装模拟的deepface包
+
+    Args:
+        monkeypatch: pytest的monkeypatch
+        extract_faces (callable): DeepFace.extract_faces的模拟实现
+        analyze (callable): DeepFace.analyze的模拟实现
+        **modules: 子模块名（如'modules.modeling'、'detectors.DetectorWrapper'）到模拟对象的映射，
+                   未给出的子模块导入时抛出ImportError，模拟旧版本DeepFace
+    """
+    for name in [name for name in sys.modules if name.startswith('deepface.')]:
+        monkeypatch.delitem(sys.modules, name)
+    package = types.ModuleType('deepface')
+    package.__path__ = []
+    monkeypatch.setitem(sys.modules, 'deepface', package)
+    for name, value in modules.items():
+        parent_name, child = name.rsplit('.', 1)
+        parent = getattr(package, parent_name, None)
+        if parent is None:
+            parent = types.ModuleType(f"deepface.{parent_name}")
+            parent.__path__ = []
+            monkeypatch.setitem(sys.modules, f"deepface.{parent_name}", parent)
+            setattr(package, parent_name, parent)
+        setattr(parent, child, value)
+    monkeypatch.setattr(deepface_detector, 'DEEPFACE_AVAILABLE', True)
+    fake = types.SimpleNamespace(extract_faces=extract_faces, analyze=analyze)
+    monkeypatch.setattr(deepface_detector, 'DeepFace', fake, raising=False)
+
+def test_version_shims(monkeypatch):
+    """各版本DeepFace的检测模型接口都转换为[(x, y, w, h, 置信度), ...]"""
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    faces = [(10, 20, 30, 40, 0.9)]
+
+    # DeepFace >= 0.0.93
+    model = FakeModel(faces)
+    calls = []
+    modeling = types.SimpleNamespace(
+        build_model=lambda task, model_name: calls.append((task, model_name)) or model)
+    install_deepface(monkeypatch, **{'modules.modeling': modeling})
+    assert DeepFaceDetector._build_detect_function('retinaface')(frame) == faces
+    assert calls == [('face_detector', 'retinaface')]
+
+    # DeepFace 0.0.86 ~ 0.0.92
+    wrapper = types.SimpleNamespace(build_model=lambda backend: FakeModel([(11, 21, 31, 41, 0.8)]))
+    install_deepface(monkeypatch, **{'detectors.DetectorWrapper': wrapper})
+    assert DeepFaceDetector._build_detect_function('retinaface')(frame) == [(11, 21, 31, 41, 0.8)]
+
+    # DeepFace 0.0.79 ~ 0.0.85
+    legacy = types.SimpleNamespace(
+        build_model=lambda backend: 'model',
+        detect_faces=lambda model, backend, img, align: [(None, [12, 22, 32, 42], 0.7)])
+    install_deepface(monkeypatch, **{'detectors.FaceDetector': legacy})
+    assert DeepFaceDetector._build_detect_function('retinaface')(frame) == [(12, 22, 32, 42, 0.7)]
+
+    # 都不可用时使用extract_faces，排除置信度为0的整幅图像
+    def extract_faces(img_path, detector_backend, enforce_detection, align):
+        return [{'facial_area': {'x': 13, 'y': 23, 'w': 33, 'h': 43}, 'confidence': 0.6},
+                {'facial_area': {'x': 0, 'y': 0, 'w': 200, 'h': 100}, 'confidence': 0}]
+    install_deepface(monkeypatch, extract_faces=extract_faces)
+    assert DeepFaceDetector._build_detect_function('retinaface')(frame) == [(13, 23, 33, 43, 0.6)]
+
+def test_detect_size_maps_back(monkeypatch):
+    """按检测分辨率缩小后检测，人脸框映射回原始坐标并限制在画面内"""
+    model = FakeModel([(100, 50, 40, 60, 0.8), (460, 250, 40, 40, None)])
+    install_deepface(monkeypatch, **{'modules.modeling': types.SimpleNamespace(
+        build_model=lambda task, model_name: model)})
+    detector = DeepFaceDetector('retinaface', detect_size=480)
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    boxes = detector.detect_faces_in_frame(frame)
+    assert model.shapes[-1] == (270, 480, 3)
+    assert boxes == [(400, 200, 160, 240), (1840, 1000, 80, 80)]
+    assert detector.last_confidences == [0.8, 1.0]
+
+    # 本次调用指定的检测分辨率优先，不改变初始化时的设置
+    boxes = detector.detect_faces_in_frame(frame, detect_size=960)
+    assert model.shapes[-1] == (540, 960, 3)
+    assert boxes[0] == (200, 100, 80, 120)
+    assert detector.detect_size == 480
+
+def test_build_failure_falls_back_once(monkeypatch):
+    """检测模型构建失败时改用extract_faces，之后的帧不再重复构建"""
+    builds = []
+    def build_model(task, model_name):
+        builds.append(model_name)
+        raise ValueError("模型权重加载失败")
+    extracted = []
+    def extract_faces(img_path, detector_backend, enforce_detection, align):
+        extracted.append(detector_backend)
+        return [{'facial_area': {'x': 5, 'y': 6, 'w': 20, 'h': 30}, 'confidence': 0.7}]
+    install_deepface(monkeypatch, extract_faces=extract_faces,
+                     **{'modules.modeling': types.SimpleNamespace(build_model=build_model)})
+    detector = DeepFaceDetector('mtcnn')
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+
+    for _ in range(3):
+        assert detector.detect_faces_in_frame(frame) == [(5, 6, 20, 30)]
+    assert builds == ['mtcnn']
+    assert extracted == ['mtcnn'] * 3
+
+def fake_analysis(crop):
+    """模拟的单张分析结果：用裁剪图宽度标识是哪一张人脸"""
+    return {'age': crop.shape[1], 'region': {'x': 0, 'y': 0, 'w': crop.shape[1], 'h': crop.shape[0]}}
+
+def test_batch_analysis_keeps_crop_order(monkeypatch):
+    """所有人脸一次批量分析，结果与人脸框一一对应；超出画面的人脸框不参与分析"""
+    calls = []
+    def analyze(img_path, actions, detector_backend, enforce_detection, silent):
+        calls.append(len(img_path) if isinstance(img_path, list) else 1)
+        assert detector_backend == 'skip'
+        return [[fake_analysis(crop)] for crop in img_path]
+    install_deepface(monkeypatch, analyze=analyze)
+    detector = DeepFaceDetector('opencv')
+    frame = np.zeros((400, 600, 3), dtype=np.uint8)
+    boxes = [(300, 100, 50, 50), (700, 100, 40, 40), (10, 10, 100, 100), (100, 200, 20, 20)]
+
+    results = detector.analyze_face_crops(frame, boxes, actions=('age',), margin=0.2)
+    assert calls == [3]
+    assert [r['bbox'] for r in results] == boxes
+    # 裁剪时向四周扩展20%（在画面边缘被截断）
+    assert [r.get('age') for r in results] == [70, None, 130, 28]
+    assert 'error' in results[1]
+    assert results[2]['region'] == {'x': 10, 'y': 10, 'w': 100, 'h': 100}
+
+def test_batch_failure_falls_back_per_crop(monkeypatch):
+    """不支持批量输入时逐张分析，之后不再尝试批量；单张分析失败只影响该人脸"""
+    calls = []
+    def analyze(img_path, actions, detector_backend, enforce_detection, silent):
+        if isinstance(img_path, list):
+            calls.append('batch')
+            raise ValueError("不支持批量输入")
+        calls.append('single')
+        if img_path.shape[1] == 28:
+            raise RuntimeError("分析失败")
+        return fake_analysis(img_path)
+    install_deepface(monkeypatch, analyze=analyze)
+    detector = DeepFaceDetector('opencv')
+    frame = np.zeros((400, 600, 3), dtype=np.uint8)
+    boxes = [(300, 100, 50, 50), (100, 200, 20, 20), (10, 10, 100, 100)]
+
+    results = detector.analyze_face_crops(frame, boxes, actions=('age',))
+    assert calls == ['batch', 'single', 'single', 'single']
+    assert [r.get('age') for r in results] == [70, None, 130]
+    assert results[1]['error'] == "分析失败"
+
+    calls.clear()
+    detector.analyze_face_crops(frame, boxes, actions=('age',))
+    assert calls == ['single'] * 3
+
+def main():
+    """主函数"""
+    print("DeepFace检测器测试（模拟DeepFace接口）")
+    print("=" * 40)
+    for test in (test_version_shims, test_detect_size_maps_back, test_build_failure_falls_back_once,
+                 test_batch_analysis_keeps_crop_order, test_batch_failure_falls_back_per_crop):
+        monkeypatch = pytest.MonkeyPatch()
+        try:
+            test(monkeypatch)
+        finally:
+            monkeypatch.undo()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
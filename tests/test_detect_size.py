@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检测分辨率（detect_size）测试
+验证缩小检测后人脸框能正确映射回原始坐标
+"""
+
+import numpy as np
+from face_detector import VideoFaceDetector
+from video_helpers import box_iou, make_frame
+
+def test_detect_size_maps_back_to_source():
+    """缩小检测的结果应与原始分辨率检测结果基本一致"""
+    frame = make_frame()
+    
+    native = VideoFaceDetector()
+    native_faces = native.detect_faces_in_frame(frame)
+    
+    scaled = VideoFaceDetector(detect_size=640)
+    scaled_faces = scaled.detect_faces_in_frame(frame)
+    
+    print(f"原始分辨率检测: {native_faces}")
+    print(f"640检测分辨率: {scaled_faces}")
+    
+    assert len(native_faces) == 1
+    assert len(scaled_faces) == 1
+    # 映射回原始坐标后应与原始分辨率的检测框高度重合
+    assert box_iou(native_faces[0], scaled_faces[0]) > 0.7
+    
+    # 关键点同样映射回原始坐标，且位于人脸框内
+    x, y, w, h = scaled_faces[0]
+    landmarks = scaled.last_detections[0, 4:14].reshape(5, 2)
+    assert np.all((landmarks[:, 0] >= x) & (landmarks[:, 0] <= x + w))
+    assert np.all((landmarks[:, 1] >= y) & (landmarks[:, 1] <= y + h))
+
+def test_detect_size_does_not_upscale():
+    """小于检测分辨率的帧不会被放大"""
+    frame = make_frame(320, 240, (160, 120), 80)
+    detector = VideoFaceDetector(detect_size=640)
+    det_frame, scale_x, scale_y = detector._prepare_detection_input(frame)
+    assert det_frame is frame
+    assert scale_x == 1.0 and scale_y == 1.0
+
+def main():
+    """主函数"""
+    print("检测分辨率测试")
+    print("=" * 40)
+    test_detect_size_maps_back_to_source()
+    test_detect_size_does_not_upscale()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检测结果缓存测试
+验证缓存的保存格式、回放结果与重新检测一致，以及缓存键的校验
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from face_detector import VideoFaceDetector
+from detection_sidecar import DetectionSidecar
+from video_helpers import write_test_video, read_frames
+
+def test_replay_matches_fresh_detection():
+    """回放缓存并修改延续帧数，输出应与用新参数重新检测完全一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        sidecar_path = os.path.join(tmp_dir, 'input.faces.npz')
+        write_test_video(input_path)
+
+        recorded = VideoFaceDetector().process_video(input_path, sidecar_path=sidecar_path)
+        assert recorded['sidecar']['mode'] == 'record'
+
+        sidecar = DetectionSidecar(sidecar_path)
+        assert sidecar.frame_count == 40
+        assert len(sidecar.detections) == recorded['total_faces_detected']
+        assert sidecar.frame_detections(0).shape == (1, 15)
+        assert sidecar.frame_detections(17).shape == (0, 15)
+
+        fresh_path = os.path.join(tmp_dir, 'fresh.mp4')
+        replay_path = os.path.join(tmp_dir, 'replay.mp4')
+        fresh = VideoFaceDetector(continuation_frames=2).process_video(
+            input_path, fresh_path, apply_mosaic=True, mosaic_size=8, codec='mp4v')
+        replayed = VideoFaceDetector(continuation_frames=2).process_video(
+            input_path, replay_path, apply_mosaic=True, mosaic_size=8, codec='mp4v', replay_sidecar=sidecar_path)
+
+        assert replayed['sidecar']['mode'] == 'replay'
+        assert replayed['keyframes'] == 0 and replayed['multi_scale']['invocations'] == 0
+        assert replayed['frames_with_faces'] == fresh['frames_with_faces']
+        for a, b in zip(read_frames(fresh_path), read_frames(replay_path)):
+            assert np.array_equal(a, b)
+
+def test_sidecar_reused_only_when_key_matches():
+    """检测参数一致时复用缓存，不一致时重新检测并覆盖"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        sidecar_path = os.path.join(tmp_dir, 'input.faces.npz')
+        write_test_video(input_path, frame_count=20)
+
+        VideoFaceDetector().process_video(input_path, sidecar_path=sidecar_path)
+        reused = VideoFaceDetector(continuation_frames=8).process_video(input_path, sidecar_path=sidecar_path)
+        assert reused['sidecar']['mode'] == 'replay'
+
+        changed = VideoFaceDetector(detect_size=240).process_video(input_path, sidecar_path=sidecar_path)
+        assert changed['sidecar']['mode'] == 'record'
+        assert DetectionSidecar(sidecar_path).key['detect_size'] == 240
+
+def test_pipeline_records_same_detections():
+    """多线程流水线记录的缓存应与串行处理一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        serial_path = os.path.join(tmp_dir, 'serial.npz')
+        pipeline_path = os.path.join(tmp_dir, 'pipeline.npz')
+        write_test_video(input_path, frame_count=30)
+
+        VideoFaceDetector().process_video(input_path, sidecar_path=serial_path)
+        VideoFaceDetector().process_video(input_path, sidecar_path=pipeline_path, pipeline_workers=3)
+
+        serial = DetectionSidecar(serial_path)
+        threaded = DetectionSidecar(pipeline_path)
+        assert np.array_equal(serial.frame_offsets, threaded.frame_offsets)
+        assert np.allclose(serial.detections, threaded.detections)
+
+def main():
+    """主函数"""
+    print("检测结果缓存测试")
+    print("=" * 40)
+    test_replay_matches_fresh_detection()
+    test_sidecar_reused_only_when_key_matches()
+    test_pipeline_records_same_detections()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
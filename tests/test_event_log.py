@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理事件日志测试
+验证进度事件的限速、重复消息的限速与汇总、处理视频时不再逐帧输出、逐帧回调，以及main.py的jsonl进度输出
+"""
+
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+from event_log import EventLog, get_logger
+from face_detector import VideoFaceDetector
+from video_helpers import write_test_video
+
+def test_progress_and_repeated_messages():
+    """进度每N帧发送一次，结束时补发；重复消息按间隔限速，汇总中包含全部次数"""
+    events = []
+    log = EventLog(progress_every=10, repeat_interval=60.0, sinks=[events.append])
+    for processed in range(1, 26):
+        log.progress(processed, 25)
+    log.progress(25, 25, force=True)
+    assert [e['processed'] for e in events] == [10, 20, 25]
+    assert events[-1]['percent'] == 100.0 and events[-1]['fps'] > 0
+
+    logger = get_logger()
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    old_level = logger.level
+    try:
+        logger.setLevel(logging.DEBUG)
+        for i in range(50):
+            log.repeated('continuation', f"第{i}帧", "延续打码: 共{count}帧")
+        log.finish()
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(old_level)
+    messages = [record.getMessage() for record in records]
+    assert messages == ["第0帧", "延续打码: 共50帧"]
+    assert log.counts() == {'continuation': 50}
+
+def test_process_video_output_is_aggregated():
+    """默认级别下处理视频时不输出逐帧的延续打码消息，只输出汇总和限速的进度"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path)
+        output = io.StringIO()
+        handler = get_logger().handlers[0]
+        old_stream = handler.setStream(output)
+        try:
+            with redirect_stdout(output):
+                VideoFaceDetector().process_video(input_path)
+        finally:
+            handler.setStream(old_stream)
+        text = output.getvalue()
+        assert "使用延续策略" not in text
+        assert "延续打码: 共5帧" in text
+        assert text.count("处理进度:") == 2
+
+def test_frame_callback():
+    """逐帧回调按帧序收到每一帧渲染后的图像（串行和流水线一致），回调不影响输出"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path)
+        for workers in (0, 3):
+            received = []
+            detector = VideoFaceDetector()
+            result = detector.process_video(input_path, os.path.join(tmp_dir, 'out.mp4'), apply_mosaic=True,
+                                            codec='mp4v', pipeline_workers=workers,
+                                            frame_callback=lambda index, frame: received.append((index, frame.shape)))
+            assert result['processed_frames'] == 40
+            assert [index for index, _ in received] == list(range(40))
+            assert all(shape == (320, 480, 3) for _, shape in received)
+
+def test_main_jsonl_progress():
+    """--progress-format jsonl 输出开始、进度和结束事件，进度事件包含帧数、fps、剩余时间、人脸数和各阶段耗时；
+    标准输出中只有JSON事件，其余输出在标准错误中"""
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path)
+        completed = subprocess.run(
+            [sys.executable, 'main.py', input_path, '--mosaic', '--output', os.path.join(tmp_dir, 'out.mp4'),
+             '--progress-format', 'jsonl', '--progress-interval', '0'],
+            cwd=project_dir, capture_output=True, text=True, check=True
+        )
+    events = [json.loads(line) for line in completed.stdout.splitlines()]
+    assert events[0]['event'] == 'start' and events[0]['total'] == 40
+    assert events[-1]['event'] == 'done' and events[-1]['processed_frames'] == 40
+    progress = [e for e in events if e['event'] == 'progress']
+    assert [e['processed'] for e in progress] == list(range(1, 41))
+    for key in ('total', 'percent', 'fps', 'eta', 'frames_with_faces', 'faces_detected', 'stages'):
+        assert key in progress[-1], key
+    assert progress[-1]['percent'] == 100.0 and progress[-1]['stages']['detect'] > 0
+    assert "处理进度:" not in completed.stdout
+    assert "视频人脸检测工具" in completed.stderr and "处理完成" in completed.stderr
+
+def main():
+    """主函数"""
+    print("处理事件日志测试")
+    print("=" * 40)
+    test_progress_and_repeated_messages()
+    test_process_video_output_is_aggregated()
+    test_frame_callback()
+    test_main_jsonl_progress()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
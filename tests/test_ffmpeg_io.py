@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FFmpeg管道读写后端测试
+需要系统中安装ffmpeg，未安装时跳过
+"""
+
+import os
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+from ffmpeg_io import FFmpegVideoReader, FFmpegVideoWriter, ffmpeg_available
+from face_detector import VideoFaceDetector
+from video_helpers import read_frames, slow_first_worker, write_test_video
+
+# 未安装ffmpeg时跳过（报告中显示为跳过，而不是通过）
+pytestmark = pytest.mark.skipif(not ffmpeg_available(), reason="未安装ffmpeg")
+
+def test_reader_matches_opencv():
+    """ffmpeg读取的帧应与OpenCV读取的帧一致，并支持起始帧定位"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path, frame_count=20)
+        reference = read_frames(input_path)
+        
+        reader = FFmpegVideoReader(input_path)
+        frames = []
+        while True:
+            ret, frame = reader.read()
+            if not ret:
+                break
+            frames.append(frame.copy())
+        reader.release()
+        
+        assert len(frames) == len(reference) == 20
+        for a, b in zip(frames, reference):
+            assert np.abs(a.astype(np.int16) - b).mean() < 2.0
+        
+        reader = FFmpegVideoReader(input_path)
+        reader.set(cv2.CAP_PROP_POS_FRAMES, 12)
+        ret, frame = reader.read()
+        reader.release()
+        assert ret and np.abs(frame.astype(np.int16) - reference[12]).mean() < 2.0
+
+def test_writer_copies_audio():
+    """ffmpeg后端输出应保留源文件音轨"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        silent_path = os.path.join(tmp_dir, 'silent.mp4')
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        output_path = os.path.join(tmp_dir, 'output.mp4')
+        write_test_video(silent_path, frame_count=25)
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', silent_path,
+                        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=1',
+                        '-c:v', 'copy', '-c:a', 'aac', '-shortest', input_path], check=True)
+        
+        result = VideoFaceDetector().process_video(
+            input_path, output_path, apply_mosaic=True, io_backend='ffmpeg',
+            ffmpeg_options={'preset': 'ultrafast', 'crf': 18})
+        assert result['processed_frames'] == 25
+        
+        probe = subprocess.run(['ffmpeg', '-hide_banner', '-i', output_path],
+                               capture_output=True, text=True)
+        assert 'Video: h264' in probe.stderr
+        assert 'Audio: aac' in probe.stderr
+
+def test_pipeline_keeps_frames_with_slow_worker():
+    """检测线程很慢、大量帧在重排处等待时，ffmpeg读取的帧缓冲区不能被覆盖，输出应与串行处理逐帧一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path, frame_count=120)
+        
+        def collect(frames):
+            return lambda index, frame: frames.append((index, frame.copy()))
+        
+        serial_frames = []
+        threaded_frames = []
+        options = {'preset': 'ultrafast'}
+        serial = VideoFaceDetector(multi_scale='always').process_video(
+            input_path, os.path.join(tmp_dir, 'serial.mp4'), apply_mosaic=True, io_backend='ffmpeg',
+            ffmpeg_options=options, frame_callback=collect(serial_frames))
+        detector = slow_first_worker(VideoFaceDetector(multi_scale='always'), delay=1.0)
+        threaded = detector.process_video(
+            input_path, os.path.join(tmp_dir, 'pipeline.mp4'), apply_mosaic=True, io_backend='ffmpeg',
+            ffmpeg_options=options, pipeline_workers=3, frame_callback=collect(threaded_frames))
+    
+    assert serial['processed_frames'] == threaded['processed_frames'] == 120
+    assert [i for i, _ in threaded_frames] == list(range(120))
+    for (_, a), (_, b) in zip(serial_frames, threaded_frames):
+        assert np.array_equal(a, b)
+
+def test_writer_rejects_wrong_frame_size():
+    """写入尺寸不符的帧应报错"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = FFmpegVideoWriter(os.path.join(tmp_dir, 'out.mp4'), 25, 64, 48, preset='ultrafast')
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+        try:
+            writer.write(np.zeros((10, 10, 3), dtype=np.uint8))
+            assert False, "应抛出ValueError"
+        except ValueError:
+            pass
+        writer.release()
+
+def test_writer_release_keeps_original_error():
+    """ffmpeg编码失败时，finally中的release()不应掩盖写入时的原始异常，失败由check_returncode()报告"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = FFmpegVideoWriter(os.path.join(tmp_dir, 'out.mp4'), 25, 64, 48, codec='no_such_encoder')
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        with pytest.raises(BrokenPipeError):
+            try:
+                for _ in range(1000):
+                    writer.write(frame)
+            finally:
+                writer.release()
+        with pytest.raises(RuntimeError):
+            writer.check_returncode()
+
+def main():
+    """主函数"""
+    print("FFmpeg读写后端测试")
+    print("=" * 40)
+    if not ffmpeg_available():
+        print("跳过: 未安装ffmpeg")
+        return
+    test_reader_matches_opencv()
+    test_writer_copies_audio()
+    test_pipeline_keeps_frames_with_slow_worker()
+    test_writer_rejects_wrong_frame_size()
+    test_writer_release_keeps_original_error()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PyQt5界面处理线程测试
+验证取消按钮和关闭窗口能停止正在进行的处理（main.py子进程和常驻处理服务中的任务）
+需要安装PyQt5，未安装时跳过；使用offscreen平台，无需显示器
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+try:
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+except ImportError:
+    QApplication = None
+
+# 未安装PyQt5时跳过（报告中显示为跳过，而不是通过）
+pytestmark = pytest.mark.skipif(QApplication is None, reason="未安装PyQt5")
+
+# 持续输出约30秒的子进程，用于模拟长时间运行的main.py
+SLOW_COMMAND = [sys.executable, '-c',
+                "import time\nfor i in range(600):\n    print(i, flush=True)\n    time.sleep(0.05)"]
+
+def get_app():
+    """返回QApplication实例（整个进程只能创建一个）"""
+    return QApplication.instance() or QApplication([])
+
+def wait_until(app, condition, timeout=20.0):
+    """处理界面事件直到条件成立"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        app.processEvents()
+        time.sleep(0.01)
+
+def start_thread(app, thread):
+    """启动处理线程，返回收集结束信号和输出的列表"""
+    results, output = [], []
+    thread.finished.connect(lambda success, message: results.append((success, message)))
+    thread.output_received.connect(output.append)
+    thread.start()
+    return results, output
+
+def test_cancel_subprocess():
+    """取消后main.py子进程被结束，线程报告任务已取消"""
+    from gui_mosaic_pyqt import ProcessingThread
+    app = get_app()
+    thread = ProcessingThread(SLOW_COMMAND)
+    results, output = start_thread(app, thread)
+    wait_until(app, lambda: output)
+    start = time.monotonic()
+    thread.cancel()
+    assert thread.wait(10000)
+    wait_until(app, lambda: results)
+    assert time.monotonic() - start < 5.0
+    assert results == [(False, "任务已取消")]
+    assert thread.process.returncode != 0
+
+def test_cancel_daemon_job():
+    """取消后常驻处理服务中运行的任务停止，线程报告任务已取消"""
+    from gui_mosaic_pyqt import ProcessingThread
+    from test_mosaic_daemon import start_server
+    from video_helpers import write_test_video
+    app = get_app()
+    server, client = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'input.mp4')
+            write_test_video(input_path, frame_count=1500)
+            job = {'input_path': input_path, 'output_path': os.path.join(tmp_dir, 'output.mp4'),
+                   'apply_mosaic': True}
+            thread = ProcessingThread(SLOW_COMMAND, job, client=client)
+            progress = []
+            thread.progress_updated.connect(progress.append)
+            results, _ = start_thread(app, thread)
+            wait_until(app, lambda: progress and progress[-1]['processed'] > 0)
+            thread.cancel()
+            assert thread.wait(20000)
+            wait_until(app, lambda: results)
+            assert results == [(False, "任务已取消")]
+            assert progress[-1]['processed'] < 1500
+            assert thread.process is None
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_close_window_cancels_processing(monkeypatch):
+    """处理中关闭窗口时确认后取消任务并等待处理线程结束"""
+    from gui_mosaic_pyqt import MosaicGUI, ProcessingThread
+    app = get_app()
+    monkeypatch.setattr(QMessageBox, 'question', lambda *args: QMessageBox.Yes)
+    window = MosaicGUI()
+    window.processing_thread = ProcessingThread(SLOW_COMMAND)
+    _, output = start_thread(app, window.processing_thread)
+    wait_until(app, lambda: output)
+    assert window.close()
+    assert not window.processing_thread.isRunning()
+    assert window.processing_thread.cancelled
+    assert window.processing_thread.process.poll() is not None
+
+def main():
+    """主函数"""
+    print("PyQt5界面处理线程测试")
+    print("=" * 40)
+    if QApplication is None:
+        print("跳过: 未安装PyQt5")
+        return
+    test_cancel_subprocess()
+    test_cancel_daemon_job()
+    monkeypatch = pytest.MonkeyPatch()
+    try:
+        test_close_window_cancels_processing(monkeypatch)
+    finally:
+        monkeypatch.undo()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
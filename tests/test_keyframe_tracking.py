@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键帧检测与光流传播测试
+验证中间帧的人脸框能跟随人脸移动，人脸消失时强制重新检测
+"""
+
+import numpy as np
+from face_detector import VideoFaceDetector
+from video_helpers import make_frame, box_iou
+
+def test_propagation_follows_moving_face():
+    """光流传播的人脸框应跟随移动的人脸"""
+    detector = VideoFaceDetector(detect_interval=4)
+    detector.reset_tracking_state()
+    
+    for i in range(8):
+        center = (400 + i * 6, 300 + i * 3)
+        frame = make_frame(960, 640, center, 160)
+        faces = detector.detect_or_propagate(frame)
+        
+        reference = VideoFaceDetector().detect_faces_in_frame(frame)
+        print(f"第{i}帧: 传播/检测 {faces}, 参考 {reference}")
+        assert len(faces) == 1
+        assert box_iou(faces[0], reference[0]) > 0.6
+    
+    stats = detector.keyframe_stats
+    assert stats['keyframes'] == 2
+    assert stats['propagated_frames'] == 6
+
+def test_forced_redetection_when_face_disappears():
+    """人脸消失后光流置信度下降，应强制重新检测"""
+    detector = VideoFaceDetector(detect_interval=10)
+    detector.reset_tracking_state()
+    
+    detector.detect_or_propagate(make_frame(960, 640, (400, 300), 160))
+    blank = np.full((640, 960, 3), (90, 120, 60), dtype=np.uint8)
+    faces = detector.detect_or_propagate(blank)
+    
+    assert faces == []
+    assert detector.keyframe_stats['forced_redetections'] == 1
+    assert detector.keyframe_stats['keyframes'] == 2
+
+def main():
+    """主函数"""
+    print("关键帧检测测试")
+    print("=" * 40)
+    test_propagation_follows_moving_face()
+    test_forced_redetection_when_face_disappears()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
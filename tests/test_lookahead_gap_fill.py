@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前瞻补帧测试
+验证漏检区间的双向插值、人脸首次出现前的向前补帧、缓冲区的内存上限，以及处理视频时的补帧效果
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from face_detector import VideoFaceDetector
+from face_tracking import LookaheadGapFiller
+from video_helpers import write_test_video
+
+def push(filler, index, faces):
+    """加入一帧，faces为 {轨迹编号: (人脸框, 连续未检测帧数)}"""
+    ids = np.array(list(faces), dtype=np.int64)
+    boxes = np.array([box for box, _ in faces.values()], dtype=np.float32).reshape(-1, 4)
+    misses = np.array([miss for _, miss in faces.values()], dtype=np.int32)
+    return filler.push(index, ids, boxes, misses)
+
+def test_gap_interpolation_and_backfill():
+    """漏检区间按前后检测位置线性插值，新出现的人脸向前补帧，输出延迟缓冲帧数"""
+    filler = LookaheadGapFiller(size=6, backfill=2)
+    output = []
+    # 轨迹0在第0帧和第4帧检测到，第1帧为延续的预测框，第2-3帧已超出延续帧数
+    # 轨迹1在第3帧首次出现
+    frames = [
+        {0: ((0, 0, 40, 40), 0)},
+        {0: ((0, 0, 40, 40), 1)},
+        {},
+        {1: ((200, 0, 40, 40), 0)},
+        {0: ((40, 20, 40, 40), 0), 1: ((200, 0, 40, 40), 0)},
+    ]
+    for index, faces in enumerate(frames):
+        ready = push(filler, index, faces)
+        assert ready == []
+        output.extend(ready)
+    assert len(filler) == 5
+    output.extend(filler.flush())
+
+    faces = {index: sorted(boxes) for index, boxes in output}
+    assert faces[0] == [(0, 0, 40, 40)]
+    assert faces[1] == [(10, 5, 40, 40), (200, 0, 40, 40)]
+    assert faces[2] == [(20, 10, 40, 40), (200, 0, 40, 40)]
+    assert faces[3] == [(30, 15, 40, 40), (200, 0, 40, 40)]
+    assert filler.stats == {'interpolated_boxes': 3, 'backfilled_boxes': 2}
+
+def test_buffer_is_bounded():
+    """缓冲区最多保存size帧，已离开缓冲范围的轨迹记录被清理"""
+    filler = LookaheadGapFiller(size=4)
+    for index in range(100):
+        ready = push(filler, index, {index: ((index, 0, 10, 10), 0)})
+        assert len(filler) <= 4
+        if index >= 4:
+            assert [payload for payload, _ in ready] == [index - 4]
+    assert len(filler.last_seen) <= 5
+
+def test_video_gap_is_filled():
+    """测试视频第15-21帧无人脸：延续3帧无法覆盖整个区间，前瞻补帧后每帧都有人脸框且位置跟随人脸"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path)
+        plain = VideoFaceDetector(continuation_frames=3, multi_scale='off').process_video(
+            input_path, collect_faces=True)
+        filled = VideoFaceDetector(continuation_frames=3, multi_scale='off').process_video(
+            input_path, os.path.join(tmp_dir, 'out.mp4'), apply_mosaic=True, codec='mp4v',
+            collect_faces=True, lookahead_frames=10)
+
+    assert filled['processed_frames'] == 40
+    assert any(not faces for faces in plain['tracked_faces'][15:22])
+    assert all(len(faces) == 1 for faces in filled['tracked_faces'])
+    for index in range(15, 22):
+        x, y, w, h = filled['tracked_faces'][index][0]
+        assert abs(x + w / 2 - (120 + index * 4)) < 8, index
+    assert filled['lookahead']['interpolated_boxes'] == 7
+
+def main():
+    """主函数"""
+    print("前瞻补帧测试")
+    print("=" * 40)
+    test_gap_interpolation_and_backfill()
+    test_buffer_is_bounded()
+    test_video_gap_is_filled()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YuNet模型变体自动选择测试
+验证一致性计算、变体选择规则、模型参数解析，以及选择结果的缓存复用
+"""
+
+import os
+import tempfile
+
+import model_selector
+from model_selector import (MODEL_VARIANTS, choose_variant, detection_agreement, resolve_model_path, select_model,
+                            variant_path)
+
+def test_detection_agreement():
+    """完全一致为1，漏检和误检都会降低一致性"""
+    reference = [[(0, 0, 10, 10), (50, 50, 10, 10)], []]
+    assert detection_agreement(reference, reference)[0] == 1.0
+    agreement, mean_iou = detection_agreement(reference, [[(1, 0, 10, 10)], [(5, 5, 5, 5)]])
+    assert abs(agreement - 2 / 4) < 1e-9 and 0.8 < mean_iou < 1.0
+    assert detection_agreement([[]], [[]])[0] == 1.0
+
+def test_choose_variant():
+    """选择一致性达标、明显快于fp32的最快变体；不可用或不一致的变体不会被选中"""
+    results = {
+        'fp32': {'available': True, 'ms_per_frame': 20.0, 'agreement': 1.0},
+        'int8': {'available': True, 'ms_per_frame': 12.0, 'agreement': 0.99},
+        'int8bq': {'available': True, 'ms_per_frame': 8.0, 'agreement': 0.80}
+    }
+    assert choose_variant(results) == 'int8'
+    results['int8']['ms_per_frame'] = 19.5
+    assert choose_variant(results) == 'fp32'
+    results['int8bq'] = {'available': False}
+    results['int8']['ms_per_frame'] = 30.0
+    assert choose_variant(results) == 'fp32'
+
+def test_resolve_and_cache():
+    """变体名称和文件路径直接解析；默认不测量，测量结果写入缓存后默认直接复用"""
+    assert resolve_model_path('int8') == variant_path('int8')
+    assert resolve_model_path('custom.onnx') == 'custom.onnx'
+    old_cache_dir = os.environ.get(model_selector.CACHE_DIR_ENV)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ[model_selector.CACHE_DIR_ENV] = tmp_dir
+        model_selector._selections.clear()
+        try:
+            # 默认只读取缓存：没有缓存时直接使用fp32，不测量也不写缓存
+            assert resolve_model_path(None, detect_size=320) == variant_path('fp32')
+            assert not os.path.exists(model_selector.cache_path())
+            first = select_model(detect_size=320)
+            assert not first['cached'] and first['variant'] in MODEL_VARIANTS
+            assert first['results']['fp32']['agreement'] == 1.0
+            assert os.path.exists(model_selector.cache_path())
+            model_selector._selections.clear()
+            second = select_model(detect_size=320)
+            assert second['cached'] and second['path'] == first['path']
+            assert resolve_model_path(None, detect_size=320) == first['path']
+        finally:
+            model_selector._selections.clear()
+            if old_cache_dir is None:
+                os.environ.pop(model_selector.CACHE_DIR_ENV, None)
+            else:
+                os.environ[model_selector.CACHE_DIR_ENV] = old_cache_dir
+
+def main():
+    """主函数"""
+    print("YuNet模型变体自动选择测试")
+    print("=" * 40)
+    test_detection_agreement()
+    test_choose_variant()
+    test_resolve_and_cache()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
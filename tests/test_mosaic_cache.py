@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+马赛克渲染测试
+验证椭圆遮罩缓存、原地渲染和越界人脸框的处理
+"""
+
+import numpy as np
+from face_detector import VideoFaceDetector, ellipse_mask
+
+def test_mask_cache_and_shape():
+    """遮罩应按尺寸缓存、只读，且椭圆覆盖人脸框中心"""
+    ellipse_mask.cache_clear()
+    mask = ellipse_mask(101, 130)
+    assert mask.shape == (130, 101) and mask.dtype == np.uint8
+    assert mask[65, 50] == 255 and mask[0, 0] == 0
+    assert not mask.flags.writeable
+    assert ellipse_mask(101, 130) is mask
+    assert ellipse_mask.cache_info().hits == 1
+
+def test_mosaic_in_place_and_bounds():
+    """默认不修改输入帧；in_place时直接修改；越界或无效的人脸框被跳过"""
+    detector = VideoFaceDetector()
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    original = frame.copy()
+    faces = [(50, 40, 80, 100), (400, 10, 30, 30), (300, 200, 0, 20), (-20, 150, 60, 60)]
+
+    result = detector.apply_mosaic_to_faces(frame, faces, mosaic_size=10)
+    assert np.array_equal(frame, original)
+    assert not np.array_equal(result[40:140, 50:130], original[40:140, 50:130])
+    # 椭圆之外和人脸框之外的像素保持不变
+    assert np.array_equal(result[40, 50], original[40, 50])
+    assert np.array_equal(result[:, 140:], original[:, 140:])
+
+    in_place = detector.apply_mosaic_to_faces(frame, faces, mosaic_size=10, in_place=True)
+    assert in_place is frame
+    assert np.array_equal(in_place, result)
+
+def main():
+    """主函数"""
+    print("马赛克渲染测试")
+    print("=" * 40)
+    test_mask_cache_and_shape()
+    test_mosaic_in_place_and_bounds()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻处理服务测试
+验证任务提交、进度流、检测器复用（任务之间检测参数互不影响）和取消
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+from main import parse_arguments
+from mosaic_daemon import PROCESS_OPTIONS, DaemonClient, create_server
+from video_helpers import write_test_video
+
+def start_server():
+    """在后台线程启动服务（系统分配端口），返回(服务, 客户端)"""
+    server = create_server(port=0, workers=1, warm=[('yunet', 1)])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, DaemonClient(f"http://127.0.0.1:{server.server_port}")
+
+def test_jobs_reuse_warm_detector():
+    """两个任务都应完成并复用预加载的检测器，不再新建实例"""
+    server, client = start_server()
+    try:
+        assert client.is_running()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'input.mp4')
+            write_test_video(input_path)
+            for name in ('a', 'b'):
+                output_path = os.path.join(tmp_dir, f'{name}.mp4')
+                final = client.run(print_progress=False, input_path=input_path, output_path=output_path,
+                                   apply_mosaic=True, codec='mp4v', continuation_frames=3)
+                assert final['state'] == 'done', final
+                assert final['processed'] == final['total'] == 40
+                assert final['result']['total_faces_detected'] > 0
+                assert os.path.exists(output_path)
+
+        pool = client.health()['pool']
+        assert len(pool) == 1 and pool[0]['created'] == 1 and pool[0]['idle'] == 1
+        assert len(client.status()) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_job_settings_do_not_leak():
+    """复用同一个检测器时，上一个任务设置的检测参数不影响下一个使用默认参数的任务"""
+    server, client = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'input.mp4')
+            write_test_video(input_path, frame_count=20)
+            first = client.run(print_progress=False, input_path=input_path, detect_size=320, detect_interval=4,
+                               motion_gate=5, roi_detection=10)
+            second = client.run(print_progress=False, input_path=input_path)
+            assert first['state'] == second['state'] == 'done'
+            assert first['result']['detect_interval'] == 4
+            assert 'motion_gate' in first['result'] and 'roi_detection' in first['result']
+            assert second['result']['detect_interval'] == 1
+            assert 'motion_gate' not in second['result'] and 'roi_detection' not in second['result']
+        assert client.health()['pool'][0]['created'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_cancel_and_invalid_job():
+    """排队中的任务可以取消；缺少输入或未知参数的任务被拒绝"""
+    server, client = start_server()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'input.mp4')
+            write_test_video(input_path, frame_count=20)
+            first = client.submit(input_path=input_path)
+            second = client.submit(input_path=input_path)
+            client.cancel(second['job_id'])
+            states = [event['state'] for event in client.events(second['job_id'])]
+            assert states[-1] == 'cancelled'
+            assert list(client.events(first['job_id']))[-1]['state'] == 'done'
+
+        for options in ({}, {'input_path': 'x.mp4', 'unknown_option': 1}):
+            try:
+                client.submit(**options)
+                assert False, "应拒绝无效任务"
+            except RuntimeError:
+                pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_defaults_match_command_line():
+    """服务端未指定的马赛克块大小与命令行默认值一致，通过服务处理和启动子进程处理的结果相同"""
+    argv = sys.argv
+    sys.argv = ['main.py', 'video.mp4']
+    try:
+        args = parse_arguments()
+    finally:
+        sys.argv = argv
+    assert PROCESS_OPTIONS['mosaic_size'] == args.mosaic_size
+
+def main():
+    """主函数"""
+    print("常驻处理服务测试")
+    print("=" * 40)
+    test_jobs_reuse_warm_detector()
+    test_job_settings_do_not_leak()
+    test_cancel_and_invalid_job()
+    test_defaults_match_command_line()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运动门控测试
+验证静止画面跳过检测并定期强制重新检测、新进入画面的人脸立即被检测，以及运动画面的打码位置不受影响
+"""
+
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from face_detector import VideoFaceDetector
+from synthetic_video import draw_face
+from video_helpers import box_iou, write_test_video
+
+def write_static_video(path, frame_count=60, face_from=0, width=640, height=360):
+    """静止镜头：固定背景加轻微噪声，face_from帧起画面中出现一个静止的人脸"""
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8), (0, 0), 4)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 25, (width, height))
+    for i in range(frame_count):
+        frame = background.copy()
+        if i >= face_from:
+            draw_face(frame, (320, 180), 140)
+        noise = rng.normal(0, 2, size=frame.shape)
+        out.write(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    out.release()
+
+def test_static_shot_skips_detection():
+    """静止画面大部分帧跳过检测，连续跳过不超过上限，每帧仍有人脸框；设置多线程流水线时按串行处理"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'static.mp4')
+        write_static_video(input_path)
+        result = VideoFaceDetector(motion_gate=10).process_video(input_path, collect_faces=True)
+
+    gate = result['motion_gate']
+    print(f"静止画面: 跳过 {gate['skipped']}/{gate['checked']}帧, 强制重新检测 {gate['forced']}次")
+    assert gate['checked'] == 60
+    assert gate['skipped'] >= 50
+    assert gate['forced'] >= 5
+    assert all(len(faces) == 1 for faces in result['tracked_faces'])
+    
+    # 多线程流水线的检测线程只看到部分帧，启用门控时改为串行处理，结果与串行一致
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'static.mp4')
+        write_static_video(input_path)
+        threaded = VideoFaceDetector(motion_gate=10).process_video(input_path, pipeline_workers=3)
+    assert 'pipeline' not in threaded and threaded['motion_gate'] == gate
+
+def test_new_face_triggers_detection():
+    """人脸进入原本静止的画面时，该帧立即运行检测"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'enter.mp4')
+        write_static_video(input_path, frame_count=40, face_from=23)
+        result = VideoFaceDetector(motion_gate=30).process_video(input_path, collect_faces=True)
+
+    faces = result['tracked_faces']
+    assert all(not item for item in faces[:23])
+    assert all(len(item) == 1 for item in faces[23:])
+    assert result['motion_gate']['skipped'] >= 30
+
+def test_moving_face_follows_detection():
+    """人脸移动时门控不影响打码位置：与逐帧检测的结果基本一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'moving.mp4')
+        write_test_video(input_path)
+        plain = VideoFaceDetector().process_video(input_path, collect_faces=True)
+        gated = VideoFaceDetector(motion_gate=30).process_video(input_path, collect_faces=True)
+
+    for expected, actual in zip(plain['tracked_faces'], gated['tracked_faces']):
+        assert len(expected) == len(actual)
+        for a, b in zip(expected, actual):
+            assert box_iou(a, b) > 0.8
+
+def main():
+    """主函数"""
+    print("运动门控测试")
+    print("=" * 40)
+    test_static_shot_skips_detection()
+    test_new_face_triggers_detection()
+    test_moving_face_follows_detection()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多人脸关联跟踪测试
+验证多个人脸中单个漏检时只延续该人脸、轨迹超期删除、匈牙利匹配结果最优、
+卡尔曼滤波的漏检预测和抖动平滑，以及多人脸场景的每帧开销
+"""
+
+import itertools
+import time
+
+import numpy as np
+import face_tracking
+from face_tracking import MultiFaceTracker, linear_assignment
+from video_helpers import box_iou
+
+def grid_faces(count, offset=0):
+    """按网格排列的人脸框，offset为整体水平位移"""
+    return [(20 + (i % 10) * 100 + offset, 20 + (i // 10) * 100, 60, 60) for i in range(count)]
+
+def test_single_face_dropout():
+    """三个人脸中一个漏检：其余两个使用当前位置，漏检的沿用最后位置，超过延续帧数后删除"""
+    tracker = MultiFaceTracker(max_misses=2, kalman=False)
+    faces = grid_faces(3)
+    boxes, coasting = tracker.update(faces)
+    assert coasting == 0 and len(tracker) == 3
+
+    moved = grid_faces(3, offset=5)
+    for frame in range(1, 4):
+        boxes, coasting = tracker.update([moved[0], moved[2]])
+        output = [tuple(int(v) for v in box) for box in boxes]
+        if frame <= 2:
+            assert coasting == 1
+            assert output == [moved[0], moved[2], faces[1]]
+            assert tracker.misses.tolist() == [0, frame, 0]
+        else:
+            assert coasting == 0 and output == [moved[0], moved[2]]
+            assert len(tracker) == 2
+
+    # 重新出现的人脸建立新轨迹，编号不复用
+    tracker.update(moved)
+    assert tracker.ids.tolist() == [0, 2, 3]
+
+def test_kalman_prediction_follows_motion():
+    """匀速移动的人脸漏检时，预测框跟随人脸继续移动，而不是停在最后位置"""
+    tracker = MultiFaceTracker(max_misses=5)
+    truth = [(100 + 12 * i, 200 + 4 * i, 80 + i, 100 + i) for i in range(16)]
+    for box in truth[:10]:
+        tracker.update([box])
+    for box in truth[10:15]:
+        boxes, coasting = tracker.update([])
+        assert coasting == 1
+        assert box_iou(tuple(boxes[0]), box) > 0.8
+    # 最后位置与第15帧真实位置的重叠已经很小
+    assert box_iou(truth[9], truth[14]) < 0.4
+
+def test_kalman_smooths_jitter():
+    """静止人脸的检测框有抖动时，输出框的抖动明显小于检测框"""
+    rng = np.random.default_rng(1)
+    tracker = MultiFaceTracker()
+    detections = np.array([300, 200, 120, 150]) + rng.normal(0, 4, size=(60, 4))
+    outputs = np.array([tracker.update([box])[0][0] for box in detections])
+    assert np.all(np.std(outputs[20:], axis=0) < 0.8 * np.std(detections[20:], axis=0))
+
+def test_kalman_state_settles():
+    """从视频中间开始跟踪时，预热warmup_frames帧后输出与从头跟踪一致（分段处理的段首依赖这一点）"""
+    rng = np.random.default_rng(2)
+    truth = [(100 + 6 * i + rng.normal(0, 1), 150 + 2 * i, 160, 200) for i in range(100)]
+    full, late = MultiFaceTracker(), MultiFaceTracker()
+    for box in truth[:100 - late.warmup_frames]:
+        full.update([box])
+    for box in truth[100 - late.warmup_frames:]:
+        expected = full.update([box])[0]
+        actual = late.update([box])[0]
+    assert np.abs(expected - actual).max() < 0.5
+    assert MultiFaceTracker(kalman=False).warmup_frames == 0
+
+def test_assignment_fallback():
+    """未安装SciPy时NumPy匈牙利算法的结果与穷举最优一致（含非方阵）"""
+    saved = face_tracking._scipy_assignment
+    face_tracking._scipy_assignment = None
+    try:
+        rng = np.random.default_rng(0)
+        for shape in [(4, 4), (3, 5), (5, 3), (1, 6)]:
+            cost = rng.random(shape)
+            rows, cols = linear_assignment(cost)
+            n, m = shape
+            if n <= m:
+                best = min(cost[np.arange(n), list(p)].sum() for p in itertools.permutations(range(m), n))
+            else:
+                best = min(cost[list(p), np.arange(m)].sum() for p in itertools.permutations(range(n), m))
+            assert len(rows) == min(shape) and len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+            assert abs(cost[rows, cols].sum() - best) < 1e-9
+    finally:
+        face_tracking._scipy_assignment = saved
+
+def test_crowd_scene_speed():
+    """60个人脸的场景：关联结果正确，每帧耗时保持在毫秒级"""
+    tracker = MultiFaceTracker(max_misses=5)
+    tracker.update(grid_faces(60))
+    start = time.perf_counter()
+    for frame in range(1, 101):
+        faces = grid_faces(60, offset=frame % 10)
+        faces = faces[:frame % 60] + faces[frame % 60 + 1:]
+        boxes, coasting = tracker.update(faces)
+        assert coasting == 1 and len(boxes) == 60
+    per_frame = (time.perf_counter() - start) / 100
+    assert len(tracker) == 60 and tracker.next_id == 60
+    print(f"60个人脸每帧关联耗时: {per_frame * 1000:.3f}ms")
+    assert per_frame < 0.005
+
+def main():
+    """主函数"""
+    print("多人脸关联跟踪测试")
+    print("=" * 40)
+    test_single_face_dropout()
+    test_kalman_prediction_follows_motion()
+    test_kalman_smooths_jitter()
+    test_kalman_state_settles()
+    test_assignment_fallback()
+    test_crowd_scene_speed()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多尺度回退检测自适应策略测试
+"""
+
+import numpy as np
+from face_detector import MultiScaleFallbackPolicy, VideoFaceDetector
+
+def test_policy_skips_after_repeated_misses():
+    """连续未命中后应跳过回退检测，并定期完整探测"""
+    policy = MultiScaleFallbackPolicy(min_samples=10, probe_interval=5)
+    
+    for _ in range(10):
+        assert policy.plan() == [0, 1, 2]
+        policy.record_result(-1)
+    
+    plans = [policy.plan() for _ in range(5)]
+    assert plans[:4] == [[], [], [], []]
+    assert plans[4] == [0, 1, 2]
+    assert policy.summary()['skipped'] == 4
+
+def test_policy_thins_to_recent_hit_scales():
+    """命中率低但有命中时，只尝试近期命中过的尺度"""
+    policy = MultiScaleFallbackPolicy(min_samples=10, min_hit_rate=0.2)
+    policy.record_result(2)
+    for _ in range(19):
+        policy.record_result(-1)
+    
+    assert policy.plan() == [2]
+    assert policy.summary()['thinned'] == 1
+
+def test_always_and_off_modes():
+    """always模式不做精简，off模式始终跳过"""
+    always = MultiScaleFallbackPolicy(mode='always')
+    for _ in range(30):
+        always.record_result(-1)
+    assert always.plan() == [0, 1, 2]
+    
+    off = MultiScaleFallbackPolicy(mode='off')
+    assert off.plan() == []
+
+def test_time_budget_limits_scales():
+    """超出时间预算的尺度不再尝试"""
+    policy = MultiScaleFallbackPolicy(time_budget_ms=5)
+    policy.record_attempt(2, 0.010, False)
+    assert policy.within_budget(0.0, 0)
+    assert not policy.within_budget(0.0, 2)
+    assert policy.summary()['budget_exhausted'] == 1
+
+def test_detector_reports_per_scale_stats():
+    """检测器在无人脸帧上记录每个尺度的尝试次数"""
+    detector = VideoFaceDetector(multi_scale='always')
+    blank = np.full((240, 320, 3), 128, dtype=np.uint8)
+    assert detector.detect_faces_in_frame(blank) == []
+    
+    scales = detector.multi_scale_policy.summary()['scales']
+    assert [item['attempts'] for item in scales.values()] == [1, 1, 1]
+    assert [item['hits'] for item in scales.values()] == [0, 0, 0]
+
+def main():
+    """主函数"""
+    print("多尺度回退策略测试")
+    print("=" * 40)
+    test_policy_skips_after_repeated_misses()
+    test_policy_thins_to_recent_hit_scales()
+    test_always_and_off_modes()
+    test_time_budget_limits_scales()
+    test_detector_reports_per_scale_stats()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
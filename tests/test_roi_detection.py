@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跟踪区域检测测试
+验证检测区域的规划和拼接、拼接图坐标精确映射回原始帧，以及区域检测的结果与全画面检测一致且检测面积大幅减少
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from face_detector import VideoFaceDetector
+from roi_detection import RoiMosaic, plan_regions
+from synthetic_video import write_synthetic_video
+from video_helpers import box_iou
+
+def test_plan_regions_merges_overlaps():
+    """重叠的区域合并为一个，区域限制在画面内，缩放比例按最小的人脸计算"""
+    boxes = np.array([[100, 100, 80, 80], [150, 110, 40, 40], [600, 300, 60, 60]], dtype=np.float32)
+    regions = plan_regions(boxes, (400, 700, 3), margin=0.5, face_size=56)
+    assert len(regions) == 2
+    assert regions[0] == (60, 60, 220, 220, 1.0)
+    assert regions[1][:4] == (570, 270, 690, 390)
+    assert abs(regions[1][4] - 56 / 60) < 1e-9
+    edge = plan_regions(np.array([[660, 360, 40, 40]]), (400, 700, 3))
+    assert edge[0][2:4] == (700, 400)
+
+def test_map_back_is_exact():
+    """拼接图上的检测结果（含关键点）映射回原始坐标，落在区域间隔中的结果被丢弃"""
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    regions = [(100, 50, 400, 350, 0.25), (900, 400, 1100, 600, 0.5)]
+    mosaic = RoiMosaic(frame, regions, gap=8)
+    assert mosaic.image.shape[0] < 200 and mosaic.image.shape[1] < 200
+
+    truth = np.array([[200, 120, 80, 100], [950, 450, 60, 70]], dtype=np.float64)
+    detections = np.zeros((3, 15), dtype=np.float32)
+    for i, (x0, y0, sx, sy, tx, ty, _, _) in enumerate(mosaic.tiles):
+        x, y, w, h = truth[i]
+        detections[i, :4] = ((x - x0) * sx + tx, (y - y0) * sy + ty, w * sx, h * sy)
+        detections[i, 4:14:2] = (x + w / 2 - x0) * sx + tx
+        detections[i, 5:14:2] = (y + h / 2 - y0) * sy + ty
+        detections[i, 14] = 0.9
+    # 中心位于拼接图边缘之外（间隔）的误检
+    detections[2, :4] = (mosaic.image.shape[1] - 2, 0, 10, 10)
+
+    mapped = mosaic.map_back(detections)
+    assert len(mapped) == 2
+    assert np.allclose(mapped[:, :4], truth, atol=1e-3)
+    assert np.allclose(mapped[:, 4], truth[:, 0] + truth[:, 2] / 2, atol=1e-3)
+    assert np.allclose(mapped[:, 13], truth[:, 1] + truth[:, 3] / 2, atol=1e-3)
+    assert np.allclose(mapped[:, 14], 0.9)
+
+def test_roi_detection_matches_full_frame():
+    """区域检测的人脸框与真值一致，检测面积不到全画面检测的15%，定期做全画面检测，设置流水线时结果不变"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        info = write_synthetic_video(os.path.join(tmp_dir, 'roi.mp4'), width=1280, height=720,
+                                     duration=3.0, faces=2, seed=2)
+        result = VideoFaceDetector(roi_detection=30).process_video(info['path'], collect_faces=True)
+        # 区域规划依赖上一帧的跟踪结果，设置多线程流水线时按串行处理，结果相同
+        threaded = VideoFaceDetector(roi_detection=30).process_video(info['path'], collect_faces=True,
+                                                                     pipeline_workers=3)
+
+    roi = result['roi_detection']
+    print(f"跟踪区域检测: 区域 {roi['roi_frames']}次, 全画面 {roi['full_scans']}次, 面积 {roi['area_ratio']:.1%}")
+    assert roi['roi_frames'] + roi['full_scans'] == info['frames']
+    assert roi['full_scans'] >= 3
+    assert roi['area_ratio'] < 0.15
+    assert 'pipeline' not in threaded and threaded['roi_detection'] == roi
+    assert threaded['tracked_faces'] == result['tracked_faces']
+    for truth, faces in zip(info['boxes'], result['tracked_faces']):
+        assert len(faces) == len(truth)
+        for box in truth:
+            assert max(box_iou(box, face) for face in faces) > 0.6
+
+def main():
+    """主函数"""
+    print("跟踪区域检测测试")
+    print("=" * 40)
+    test_plan_regions_merges_overlaps()
+    test_map_back_is_exact()
+    test_roi_detection_matches_full_frame()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段并行处理测试
+验证分段处理的帧范围划分、段首预热和结果汇总
+"""
+
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+import pytest
+from face_detector import VideoFaceDetector
+from ffmpeg_io import ffmpeg_available
+from segment_parallel import plan_segments, process_video_segments
+from video_helpers import write_test_video, read_frames
+
+def test_plan_segments_covers_all_frames():
+    """分段应覆盖全部帧且互不重叠"""
+    ranges = plan_segments(1000, 7)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 1000
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    
+    # 段长不足最少帧数时合并为更少的段
+    assert len(plan_segments(50, 8, min_segment_frames=30)) == 1
+
+def test_segments_match_single_process():
+    """分段处理的统计和输出帧应与单进程处理一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path, frame_count=60)
+        
+        single_path = os.path.join(tmp_dir, 'single.mp4')
+        segmented_path = os.path.join(tmp_dir, 'segmented.mp4')
+        
+        single = VideoFaceDetector(multi_scale='always').process_video(
+            input_path, single_path, apply_mosaic=True, codec='mp4v')
+        segmented = process_video_segments(
+            input_path, segmented_path, segments=3, preroll_frames=10,
+            detector_kwargs={'multi_scale': 'always'}, apply_mosaic=True, codec='mp4v')
+        
+        assert len(segmented['segments']) == 3
+        assert segmented['processed_frames'] == single['processed_frames'] == 60
+        assert segmented['frames_with_faces'] == single['frames_with_faces']
+        assert segmented['total_faces_detected'] == single['total_faces_detected']
+        
+        single_frames = read_frames(single_path)
+        segmented_frames = read_frames(segmented_path)
+        assert len(single_frames) == len(segmented_frames) == 60
+        for a, b in zip(single_frames, segmented_frames):
+            assert np.abs(a.astype(np.int16) - b).mean() < 2.0
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="未安装ffmpeg")
+def test_segments_keep_audio_with_ffmpeg_backend():
+    """ffmpeg后端分段处理时，拼接后的输出应与单进程处理一样保留源文件音轨"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        silent_path = os.path.join(tmp_dir, 'silent.mp4')
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        output_path = os.path.join(tmp_dir, 'output.mp4')
+        write_test_video(silent_path, frame_count=60)
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', silent_path,
+                        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=3',
+                        '-c:v', 'copy', '-c:a', 'aac', '-shortest', input_path], check=True)
+        
+        result = process_video_segments(
+            input_path, output_path, segments=2, preroll_frames=10, apply_mosaic=True,
+            io_backend='ffmpeg', ffmpeg_options={'preset': 'ultrafast'})
+        assert result['processed_frames'] == 60
+        assert len(read_frames(output_path)) == 60
+        
+        probe = subprocess.run(['ffmpeg', '-hide_banner', '-i', output_path],
+                               capture_output=True, text=True)
+        assert 'Audio: aac' in probe.stderr
+
+def main():
+    """主函数"""
+    print("分段并行处理测试")
+    print("=" * 40)
+    test_plan_segments_covers_all_frames()
+    test_segments_match_single_process()
+    if ffmpeg_available():
+        test_segments_keep_audio_with_ffmpeg_backend()
+    else:
+        print("跳过: 未安装ffmpeg")
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+智能重编码测试
+需要系统中安装ffmpeg，未安装时跳过
+"""
+
+import os
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+from face_detector import VideoFaceDetector
+from ffmpeg_io import ffmpeg_available
+from smart_render import plan_chunks, read_keyframes, smart_render
+from synthetic_video import draw_face
+from video_helpers import read_frames
+
+def write_sparse_video(path, frame_count=80, face_range=(30, 40), width=480, height=320, video_args=None):
+    """
+    生成只有少量帧包含人脸的H.264测试视频（每10帧一个关键帧，带音轨），video_args可指定其他视频编码参数
+    """
+    raw_path = path + '.raw.mp4'
+    out = cv2.VideoWriter(raw_path, cv2.VideoWriter_fourcc(*'mp4v'), 25, (width, height))
+    for i in range(frame_count):
+        frame = np.full((height, width, 3), (90, 120, 60), dtype=np.uint8)
+        if face_range[0] <= i < face_range[1]:
+            draw_face(frame, (200 + i, 160), 90)
+        cv2.putText(frame, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        out.write(cv2.GaussianBlur(frame, (5, 5), 0))
+    out.release()
+    subprocess.run(
+        ['ffmpeg', '-y', '-loglevel', 'error', '-i', raw_path,
+         '-f', 'lavfi', '-i', f"sine=frequency=440:duration={frame_count / 25}",
+         *(video_args or ['-c:v', 'libx264', '-g', '10', '-bf', '2', '-sc_threshold', '0', '-pix_fmt', 'yuv420p']),
+         '-c:a', 'aac', '-shortest', path],
+        check=True
+    )
+    os.remove(raw_path)
+
+def test_plan_chunks_merges_gops():
+    """相邻的同类GOP应合并为一个处理块"""
+    face_frames = [False] * 50
+    face_frames[22] = face_frames[31] = True
+    chunks, gops, dirty = plan_chunks([0, 10, 20, 30, 40], 50, face_frames)
+    assert gops == 5 and dirty == 2
+    assert chunks == [(0, 20, False), (20, 40, True), (40, 50, False)]
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="未安装ffmpeg")
+def test_smart_render_reencodes_only_face_gops():
+    """只有包含人脸（含延续打码）的GOP被重新编码，其余帧与源视频逐帧一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        output_path = os.path.join(tmp_dir, 'output.mp4')
+        write_sparse_video(input_path)
+
+        keyframes, packet_count = read_keyframes(input_path)
+        assert keyframes == list(range(0, 80, 10)) and packet_count == 80
+
+        result = smart_render(VideoFaceDetector(), input_path, output_path,
+                              ffmpeg_options={'preset': 'ultrafast'})
+        stats = result['smart_render']
+        assert stats['fallback'] is None
+        # 人脸在30-39帧，延续打码覆盖到44帧
+        assert stats['gops'] == 8 and stats['reencoded_gops'] == 2
+        assert stats['reencoded_frames'] == 20
+
+        source = read_frames(input_path)
+        output = read_frames(output_path)
+        assert len(output) == len(source) == 80
+        for i in list(range(0, 30)) + list(range(50, 80)):
+            assert np.array_equal(output[i], source[i]), f"第{i}帧应直接复制"
+        assert np.abs(output[35].astype(np.int16) - source[35]).mean() > 0.5
+
+        streams = subprocess.run(['ffmpeg', '-hide_banner', '-i', output_path],
+                                 capture_output=True, text=True).stderr
+        assert 'Audio:' in streams
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="未安装ffmpeg")
+def test_fallback_uses_ffmpeg_options_and_audio():
+    """无法智能重编码时整体重新编码，同样使用ffmpeg编码参数并保留音轨"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mkv')
+        output_path = os.path.join(tmp_dir, 'output.mkv')
+        write_sparse_video(input_path, video_args=['-c:v', 'mjpeg', '-q:v', '3'])
+
+        result = smart_render(VideoFaceDetector(), input_path, output_path,
+                              ffmpeg_options={'preset': 'ultrafast'})
+        stats = result['smart_render']
+        assert stats['fallback'].startswith("不支持的源视频编码")
+        assert stats['reencoded_frames'] == 80
+
+        source = read_frames(input_path)
+        output = read_frames(output_path)
+        assert len(output) == len(source) == 80
+        assert np.abs(output[35].astype(np.int16) - source[35]).mean() > 0.5
+
+        streams = subprocess.run(['ffmpeg', '-hide_banner', '-i', output_path],
+                                 capture_output=True, text=True).stderr
+        assert 'Video: h264' in streams
+        assert 'Audio: aac' in streams
+
+def main():
+    """主函数"""
+    print("智能重编码测试")
+    print("=" * 40)
+    test_plan_chunks_merges_gops()
+    if ffmpeg_available():
+        test_smart_render_reencodes_only_face_gops()
+        test_fallback_uses_ffmpeg_options_and_audio()
+    else:
+        print("跳过: 未安装ffmpeg")
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段计时测试
+验证结果中的各阶段计数、百分位、延续打码计数、计时开销，以及长视频中样本内存有上限
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from face_detector import VideoFaceDetector
+from stage_timing import STAGES, StageTimer, format_timing_table
+from video_helpers import write_test_video
+
+def check_timing(result, continuation_frames):
+    """检查一次处理结果中的分阶段计时"""
+    timing = result['timing']
+    frames = result['processed_frames']
+    stages = timing['stages']
+    assert set(stages) == set(STAGES)
+    for name in ('decode', 'detect', 'track', 'render', 'encode'):
+        item = stages[name]
+        assert item['count'] == frames, (name, item['count'])
+        assert 0 <= item['p50_ms'] <= item['p95_ms'] <= item['p99_ms']
+    assert stages['detect']['total'] > 0
+    assert stages['multi_scale']['count'] <= timing['multi_scale_invocations']
+    assert timing['continuation_frames'] == continuation_frames
+    assert '检测' in format_timing_table(timing)
+
+def test_serial_and_pipeline_timing():
+    """串行和流水线处理都返回完整的分阶段计时"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        output_path = os.path.join(tmp_dir, 'output.mp4')
+        write_test_video(input_path)
+        detector = VideoFaceDetector(continuation_frames=3)
+        # 测试视频第15-21帧无人脸，延续打码3帧
+        check_timing(detector.process_video(input_path, output_path, apply_mosaic=True, codec='mp4v'), 3)
+        check_timing(detector.process_video(input_path, output_path, apply_mosaic=True, codec='mp4v',
+                                            pipeline_workers=2), 3)
+
+def test_record_overhead():
+    """每帧约6次记录的开销应远小于每帧处理时间的1%（按每帧5毫秒估计）"""
+    timer = StageTimer()
+    count = 60000
+    start = time.perf_counter()
+    for _ in range(count):
+        begin = time.perf_counter()
+        timer.record('track', time.perf_counter() - begin)
+    per_frame = (time.perf_counter() - start) / count * 6
+    assert per_frame < 0.01 * 0.005, per_frame
+
+def test_aggregates_with_bounded_samples():
+    """次数、累计、最小/最大值精确；样本数不超过蓄水池大小，超出后百分位为接近真值的估计"""
+    values = np.random.default_rng(0).uniform(0.001, 0.011, 20000)
+    timer = StageTimer(reservoir_size=1000)
+    for value in values[:800]:
+        timer.record('render', value)
+    # 不超过蓄水池大小时百分位是精确值
+    exact = np.percentile(values[:800], (50, 95, 99)) * 1000
+    item = timer.summary()['render']
+    assert np.allclose([item['p50_ms'], item['p95_ms'], item['p99_ms']], exact)
+
+    # 多个线程同时记录同一阶段（流水线中的多个检测线程）
+    chunks = np.array_split(values, 4)
+    threads = [threading.Thread(target=lambda chunk=chunk: [timer.record('detect', v) for v in chunk])
+               for chunk in chunks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    item = timer.summary()['detect']
+    assert len(timer.stats['detect'].reservoir) == 1000
+    assert item['count'] == 20000
+    assert abs(item['total'] - values.sum()) < 1e-9
+    assert timer.totals()['detect'] == item['total']
+    assert item['min_ms'] == values.min() * 1000 and item['max_ms'] == values.max() * 1000
+    # 均匀分布在1~11毫秒：p50约6毫秒，p95约10.5毫秒
+    assert abs(item['p50_ms'] - 6.0) < 0.5
+    assert abs(item['p95_ms'] - 10.5) < 0.3
+    assert timer.summary()['encode']['count'] == 0
+
+def main():
+    """主函数"""
+    print("分阶段计时测试")
+    print("=" * 40)
+    test_serial_and_pipeline_timing()
+    test_record_overhead()
+    test_aggregates_with_bounded_samples()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
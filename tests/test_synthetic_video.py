@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成测试视频和基准测试比较测试
+验证合成画面可复现、无人脸片段正确、人脸可被YuNet检测，以及基准结果比较能标记速度回退
+"""
+
+import numpy as np
+from benchmark_suite import compare_reports
+from face_detector import VideoFaceDetector
+from synthetic_video import parse_face_free, synthetic_frames
+from video_helpers import box_iou
+
+def test_frames_are_deterministic():
+    """相同参数和种子逐帧相同，不同种子画面不同"""
+    options = {'width': 320, 'height': 240, 'fps': 10, 'duration': 1.0, 'faces': 2}
+    first = list(synthetic_frames(seed=3, **options))
+    second = list(synthetic_frames(seed=3, **options))
+    other = list(synthetic_frames(seed=4, **options))
+    assert len(first) == 10
+    for (a, boxes_a), (b, boxes_b) in zip(first, second):
+        assert np.array_equal(a, b) and boxes_a == boxes_b
+    assert not np.array_equal(first[0][0], other[0][0])
+
+def test_face_free_spans_and_detection():
+    """无人脸片段内没有人脸，其余帧的人脸能被检测到且位置与真值一致"""
+    assert parse_face_free("0.5-1, 2-2.5") == [(0.5, 1.0), (2.0, 2.5)]
+    detector = VideoFaceDetector()
+    frames = list(synthetic_frames(width=640, height=360, fps=10, duration=1.5, faces=2,
+                                   face_free=[(0.5, 1.0)], seed=1))
+    for index, (frame, boxes) in enumerate(frames):
+        if 5 <= index < 10:
+            assert boxes == []
+            continue
+        assert len(boxes) == 2
+        detected = detector.detect_faces_in_frame(frame)
+        assert len(detected) == 2, index
+        for box in boxes:
+            assert max(box_iou(box, found) for found in detected) > 0.5
+
+def test_compare_reports_flags_regressions():
+    """速度下降超过阈值的用例标记为回退，失败的用例不参与比较"""
+    baseline = {'results': [
+        {'config': 'a', 'model': 'm', 'fps': 20.0},
+        {'config': 'b', 'model': 'm', 'fps': 10.0},
+        {'config': 'c', 'model': 'm', 'error': '不支持'}
+    ]}
+    current = {'results': [
+        {'config': 'a', 'model': 'm', 'fps': 19.5},
+        {'config': 'b', 'model': 'm', 'fps': 8.0},
+        {'config': 'c', 'model': 'm', 'fps': 5.0}
+    ]}
+    rows = compare_reports(baseline, current, threshold=0.05)
+    assert [(row['config'], row['regression']) for row in rows] == [('a', False), ('b', True)]
+    assert abs(rows[1]['change'] + 0.2) < 1e-9
+
+def main():
+    """主函数"""
+    print("合成测试视频测试")
+    print("=" * 40)
+    test_frames_are_deterministic()
+    test_face_free_spans_and_detection()
+    test_compare_reports_flags_regressions()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多线程流水线测试
+验证流水线输出的帧顺序和内容与串行处理完全一致
+"""
+
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from face_detector import VideoFaceDetector
+from synthetic_video import draw_face
+from video_helpers import read_frames, slow_first_worker, write_test_video
+from video_pipeline import ThreadedVideoPipeline
+
+def test_pipeline_matches_serial_output():
+    """流水线处理结果应与串行处理逐帧一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path)
+        
+        serial_path = os.path.join(tmp_dir, 'serial.mp4')
+        pipeline_path = os.path.join(tmp_dir, 'pipeline.mp4')
+        
+        serial = VideoFaceDetector(multi_scale='always').process_video(
+            input_path, serial_path, apply_mosaic=True, codec='mp4v')
+        threaded = VideoFaceDetector(multi_scale='always').process_video(
+            input_path, pipeline_path, apply_mosaic=True, codec='mp4v', pipeline_workers=3)
+        
+        assert serial['processed_frames'] == threaded['processed_frames'] == 40
+        assert serial['frames_with_faces'] == threaded['frames_with_faces']
+        assert serial['total_faces_detected'] == threaded['total_faces_detected']
+        
+        serial_frames = read_frames(serial_path)
+        pipeline_frames = read_frames(pipeline_path)
+        assert len(serial_frames) == len(pipeline_frames)
+        for a, b in zip(serial_frames, pipeline_frames):
+            assert np.array_equal(a, b)
+        
+        stats = threaded['pipeline']
+        assert stats['stages']['detect']['threads'] == 3
+        assert stats['stages']['write']['items'] == 40
+        assert all(item['max_depth'] <= item['capacity'] for item in stats['queues'].values())
+
+def test_pipeline_adaptive_multi_scale_matches_serial():
+    """默认的自适应多尺度回退：长时间无人脸时回退被精简，流水线尝试的尺度和输出与串行处理一致"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        out = cv2.VideoWriter(input_path, cv2.VideoWriter_fourcc(*'mp4v'), 25, (480, 320))
+        for i in range(90):
+            frame = np.full((320, 480, 3), (90, 120, 60), dtype=np.uint8)
+            if not (20 <= i < 75):
+                draw_face(frame, (150 + i * 2, 160), 90)
+            out.write(cv2.GaussianBlur(frame, (5, 5), 0))
+        out.release()
+        
+        serial_path = os.path.join(tmp_dir, 'serial.mp4')
+        pipeline_path = os.path.join(tmp_dir, 'pipeline.mp4')
+        serial = VideoFaceDetector().process_video(input_path, serial_path, apply_mosaic=True, codec='mp4v')
+        threaded = VideoFaceDetector().process_video(
+            input_path, pipeline_path, apply_mosaic=True, codec='mp4v', pipeline_workers=3)
+        
+        policy = serial['multi_scale']
+        assert policy['mode'] == 'adaptive' and policy['skipped'] > 0
+        for key in ('invocations', 'skipped', 'thinned', 'scales'):
+            assert threaded['multi_scale'][key] == policy[key], key
+        assert serial['frames_with_faces'] == threaded['frames_with_faces']
+        for a, b in zip(read_frames(serial_path), read_frames(pipeline_path)):
+            assert np.array_equal(a, b)
+
+def test_pipeline_limits_frames_in_flight():
+    """某个检测线程很慢时，读取线程停在同时处理帧数的上限，不会无限制地解码后续帧"""
+    class CountingCapture:
+        def __init__(self, path):
+            self.cap = cv2.VideoCapture(path)
+            self.reads = 0
+        def read(self):
+            self.reads += 1
+            return self.cap.read()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path, frame_count=120)
+        detector = slow_first_worker(VideoFaceDetector(), delay=1.0)
+        pipeline = ThreadedVideoPipeline(detector, workers=3)
+        cap = CountingCapture(input_path)
+        in_flight = []
+        counters = pipeline.run(cap, None, 120, progress_callback=lambda processed, total:
+                                in_flight.append(cap.reads - processed + 1) or True)
+        cap.cap.release()
+    
+    assert counters['processed_frames'] == 120
+    assert pipeline.max_in_flight < 120
+    assert max(in_flight) <= pipeline.max_in_flight
+    assert pipeline.summary()['max_in_flight'] == pipeline.max_in_flight
+
+def test_pipeline_stops_on_progress_callback():
+    """进度回调返回False时流水线应停止"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'input.mp4')
+        write_test_video(input_path)
+        
+        result = VideoFaceDetector().process_video(
+            input_path, None, pipeline_workers=2,
+            progress_callback=lambda processed, total: processed < 10)
+        assert result['processed_frames'] == 10
+
+def main():
+    """主函数"""
+    print("多线程流水线测试")
+    print("=" * 40)
+    test_pipeline_matches_serial_output()
+    test_pipeline_adaptive_multi_scale_matches_serial()
+    test_pipeline_limits_frames_in_flight()
+    test_pipeline_stops_on_progress_callback()
+    print("✓ 测试通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共用的辅助函数
+生成测试帧和测试视频、读取输出视频的全部帧、人脸框IoU计算，以及模拟检测线程偶尔很慢
+"""
+
+import time
+
+import cv2
+import numpy as np
+from synthetic_video import draw_face
+
+
+def make_frame(width=1920, height=1080, center=(1200, 500), size=260):
+    """
+    生成带一个人脸的测试帧
+    """
+    frame = np.full((height, width, 3), (90, 120, 60), dtype=np.uint8)
+    draw_face(frame, center, size)
+    return cv2.GaussianBlur(frame, (5, 5), 0)
+
+
+def box_iou(a, b):
+    """
+    计算两个(x, y, w, h)矩形框的IoU
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def write_test_video(path, frame_count=40, width=480, height=320):
+    """
+    生成一段带移动人脸、中间有无人脸片段的测试视频
+    """
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 25, (width, height))
+    for i in range(frame_count):
+        frame = np.full((height, width, 3), (90, 120, 60), dtype=np.uint8)
+        if not (15 <= i < 22):
+            draw_face(frame, (120 + i * 4, 160), 90)
+        # 在角落写入帧号，便于检查输出顺序
+        cv2.putText(frame, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        out.write(cv2.GaussianBlur(frame, (5, 5), 0))
+    out.release()
+
+
+def read_frames(path):
+    """读取视频的全部帧"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def slow_first_worker(detector, delay=1.0):
+    """
+    让多线程流水线的第一个检测线程在它处理的第一帧上等待delay秒（模拟偶尔很慢的推理），
+    其后的帧先完成检测，在按帧序重排处等待
+    """
+    create = detector.create_worker_detector
+    state = {'workers': 0, 'slept': False}
+
+    def create_worker():
+        worker = create()
+        state['workers'] += 1
+        if state['workers'] == 1:
+            detect = worker.detect_timed
+
+            def slow_detect(frame, timer):
+                if not state['slept']:
+                    state['slept'] = True
+                    time.sleep(delay)
+                return detect(frame, timer)
+            worker.detect_timed = slow_detect
+        return worker
+
+    detector.create_worker_detector = create_worker
+    return detector
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多线程视频处理流水线
+将读取、检测、跟踪、渲染、写入拆分为独立阶段，阶段之间通过有界队列连接。
+OpenCV在解码、推理、缩放和编码时都会释放GIL，因此各阶段可以真正并行。
+"""
+
+import queue
+import threading
+import time
+
+# 队列结束标记
+_END = object()
+
+
+class _StageMonitor:
+    """
+    流水线阶段统计：累计工作时间、处理数量和线程数
+    """
+
+    def __init__(self, threads):
+        self.threads = threads
+        self.busy_time = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy_time):
+        with self._lock:
+            self.busy_time += busy_time
+            self.items += 1
+
+
+class _MonitoredQueue(queue.Queue):
+    """
+    带深度统计的有界队列
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.max_depth = 0
+        self.depth_sum = 0
+        self.samples = 0
+
+    def sample(self):
+        depth = self.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self.depth_sum += depth
+        self.samples += 1
+
+
+class ThreadedVideoPipeline:
+    """
+    多线程视频处理流水线
+    读取线程 -> 检测线程池 -> 按帧序的跟踪阶段 -> 渲染线程池 -> 写入（调用线程）
+    跟踪阶段严格按帧序执行，输出帧顺序和跟踪语义与串行处理一致。
+    乱序到达的帧在重排时离开队列，队列容量不能限制内存，因此另外限制同时在流水线中的帧数：
+    读取前占用一个名额，写入后释放
+    """
+
+    def __init__(self, detector, workers=4, render_workers=None, queue_size=None):
+        """
+        初始化流水线
+
+        Args:
+            detector (VideoFaceDetector): 主检测器，负责跟踪和渲染
+            workers (int): 检测线程数
+            render_workers (int): 渲染线程数，默认为检测线程数的一半（至少1个）
+            queue_size (int): 每个阶段间队列的容量，默认为检测线程数的2倍
+        """
+        self.detector = detector
+        self.workers = max(1, workers)
+        self.render_workers = render_workers or max(1, self.workers // 2)
+        self.queue_size = queue_size or max(4, self.workers * 2)
+
+        # 关键帧检测的光流传播依赖帧序，此时检测阶段只能单线程按序执行
+        if detector.detect_interval > 1:
+            print("关键帧检测依赖帧序，流水线检测阶段使用单线程")
+            self.workers = 1
+
+        # 同时在流水线中（已读取、尚未写入）的最大帧数
+        self.max_in_flight = 4 * self.queue_size + 2 * self.workers + 2 * self.render_workers + 2
+        self.in_flight = threading.Semaphore(self.max_in_flight)
+
+        self.stop_event = threading.Event()
+        self.errors = []
+        self.face_log = None
+        self.recorder = None
+        self.replay = None
+        self.wall_time = 0.0
+
+        self.queues = {
+            'decoded': _MonitoredQueue(self.queue_size),
+            'detected': _MonitoredQueue(self.queue_size),
+            'tracked': _MonitoredQueue(self.queue_size),
+            'rendered': _MonitoredQueue(self.queue_size)
+        }
+        self.stages = {
+            'read': _StageMonitor(1),
+            'detect': _StageMonitor(self.workers),
+            'track': _StageMonitor(1),
+            'render': _StageMonitor(self.render_workers),
+            'write': _StageMonitor(1)
+        }
+
+    def _create_detectors(self):
+        """
+        为每个检测线程准备检测器实例
+
+        Returns:
+            list: 检测器列表
+        """
+        if self.workers == 1:
+            return [self.detector]
+        if not self.detector.supports_parallel_detection:
+            # 检测器不支持复制（如DeepFace后端），退回单线程检测
+            print("当前检测器不支持并行检测，流水线检测阶段使用单线程")
+            self.workers = 1
+            self.stages['detect'].threads = 1
+            return [self.detector]
+        return [self.detector.create_worker_detector() for _ in range(self.workers)]
+
+    def _put(self, name, item):
+        """
+        放入队列，等待期间响应停止信号
+
+        Returns:
+            bool: 是否成功放入
+        """
+        target = self.queues[name]
+        while not self.stop_event.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                target.sample()
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, name):
+        """
+        从队列取出，等待期间响应停止信号
+
+        Returns:
+            object: 队列元素，停止时返回_END
+        """
+        source = self.queues[name]
+        while not self.stop_event.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _guard(self, target, *args):
+        """
+        运行阶段函数，出现异常时记录并停止整个流水线
+        """
+        try:
+            target(*args)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+
+    def _read_stage(self, cap, frame_limit):
+        """读取线程：按顺序解码帧"""
+        monitor = self.stages['read']
+        timer = self.detector.stage_timer
+        index = 0
+        while not self.stop_event.is_set() and (frame_limit is None or index < frame_limit):
+            # 等待写入阶段释放名额：某一帧检测较慢时，其后的帧在重排处等待，不再继续解码
+            if not self.in_flight.acquire(timeout=0.1):
+                continue
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            elapsed = time.perf_counter() - start
+            monitor.add(elapsed)
+            timer.record('decode', elapsed)
+            if not self._put('decoded', (index, frame)):
+                return
+            index += 1
+        for _ in range(self.workers):
+            self._put('decoded', _END)
+
+    def _detect_stage(self, detector):
+        """检测线程：对帧运行人脸检测"""
+        monitor = self.stages['detect']
+        while True:
+            item = self._get('decoded')
+            if item is _END:
+                break
+            index, frame = item
+            start = time.perf_counter()
+            if self.replay is not None:
+                detected_faces = detector._detections_to_boxes(self.replay.frame_detections(index))
+            else:
+                detected_faces = detector.detect_timed(frame, self.detector.stage_timer)
+                if detector.multi_scale_pending:
+                    # 多尺度回退由跟踪阶段按帧序执行，检测结果届时再记录
+                    detected_faces = None
+                elif self.recorder is not None:
+                    self.recorder.record(index, detector.last_detections)
+            monitor.add(time.perf_counter() - start)
+            if not self._put('detected', (index, frame, detected_faces)):
+                return
+        self._put('detected', _END)
+
+    def _track_stage(self):
+        """跟踪阶段：按帧序重排后依次执行跟踪"""
+        monitor = self.stages['track']
+        pending = {}
+        next_index = 0
+        finished_workers = 0
+        while finished_workers < self.workers:
+            item = self._get('detected')
+            if item is _END:
+                if self.stop_event.is_set():
+                    return
+                finished_workers += 1
+                continue
+            index, frame, detected_faces = item
+            pending[index] = (frame, detected_faces)
+
+            # 检测结果可能乱序到达，按帧序依次跟踪
+            while next_index in pending:
+                frame, detected_faces = pending.pop(next_index)
+                if detected_faces is None:
+                    detected_faces = self._multi_scale_fallback(next_index, frame)
+                start = time.perf_counter()
+                faces = self.detector.track_faces_with_history(detected_faces)
+                if self.face_log is not None:
+                    self.face_log.append(list(faces))
+                elapsed = time.perf_counter() - start
+                monitor.add(elapsed)
+                self.detector.stage_timer.record('track', elapsed)
+                if not self._put('tracked', (next_index, frame, faces, len(detected_faces))):
+                    return
+                next_index += 1
+        for _ in range(self.render_workers):
+            self._put('tracked', _END)
+
+    def _multi_scale_fallback(self, index, frame):
+        """
+        跟踪阶段中为检测线程未找到人脸的帧做多尺度回退检测
+        回退策略的命中率窗口按帧序更新，尝试哪些尺度与串行处理完全一致；
+        检测线程使用各自的检测器实例，主检测器的YuNet只在这里使用
+
+        Returns:
+            list: 人脸矩形框列表
+        """
+        start = time.perf_counter()
+        detections = self.detector._multi_scale_detection_raw(frame)
+        self.detector.stage_timer.record('multi_scale', time.perf_counter() - start)
+        if self.recorder is not None:
+            self.recorder.record(index, detections)
+        return self.detector._detections_to_boxes(detections)
+
+    def _render_stage(self, apply_mosaic, mosaic_size):
+        """渲染线程：应用马赛克或绘制检测框"""
+        monitor = self.stages['render']
+        while True:
+            item = self._get('tracked')
+            if item is _END:
+                break
+            index, frame, faces, detected_count = item
+            start = time.perf_counter()
+            # 帧在流水线中只流经一次，直接在原帧上打码
+            result_frame = self.detector.render_frame(frame, faces, apply_mosaic, mosaic_size, in_place=True)
+            elapsed = time.perf_counter() - start
+            monitor.add(elapsed)
+            self.detector.stage_timer.record('render', elapsed)
+            if not self._put('rendered', (index, result_frame, detected_count)):
+                return
+        self._put('rendered', _END)
+
+    def run(self, cap, out, total_frames, show_preview=False, apply_mosaic=False, mosaic_size=15, progress_callback=None,
+            frame_limit=None, face_log=None, recorder=None, replay=None):
+        """
+        运行流水线，写入阶段在调用线程上执行，预览和进度回调保持在调用线程
+
+        Args:
+            cap (cv2.VideoCapture): 输入视频
+            out (cv2.VideoWriter): 输出视频写入器，可为None
+            total_frames (int): 视频总帧数
+            show_preview (bool): 是否显示实时预览
+            apply_mosaic (bool): 是否应用马赛克
+            mosaic_size (int): 马赛克块大小
+            progress_callback (callable): 进度回调函数
+            frame_limit (int): 最多处理的帧数，None表示处理到视频结束
+            face_log (list): 不为None时按帧追加跟踪后的人脸框列表
+            recorder (DetectionRecorder): 不为None时记录每帧的原始检测结果
+            replay (DetectionSidecar): 不为None时从缓存回放检测结果，不运行检测器
+
+        Returns:
+            dict: 统计计数器
+        """
+        self.face_log = face_log
+        self.recorder = recorder
+        self.replay = replay
+        # 回放缓存时不运行检测器，无需创建额外的检测器实例
+        detectors = [self.detector] * self.workers if replay is not None else self._create_detectors()
+
+        # ffmpeg读取器复用预分配缓冲区，缓冲区数量与同时在流水线中的帧数上限一致，
+        # 某个缓冲区被再次读入时，使用它的帧一定已经写入
+        if hasattr(cap, 'ensure_buffers'):
+            cap.ensure_buffers(self.max_in_flight)
+        print(f"多线程流水线: 检测线程 {self.workers}, 渲染线程 {self.render_workers}, 队列容量 {self.queue_size}, "
+              f"最多 {self.max_in_flight} 帧同时处理")
+
+        threads = [threading.Thread(target=self._guard, args=(self._read_stage, cap, frame_limit), daemon=True)]
+        threads += [threading.Thread(target=self._guard, args=(self._detect_stage, detector), daemon=True)
+                    for detector in detectors]
+        threads.append(threading.Thread(target=self._guard, args=(self._track_stage,), daemon=True))
+        threads += [threading.Thread(target=self._guard, args=(self._render_stage, apply_mosaic, mosaic_size), daemon=True)
+                    for _ in range(self.render_workers)]
+
+        counters = {'processed_frames': 0, 'frames_with_faces': 0, 'total_faces_detected': 0}
+        monitor = self.stages['write']
+        pending = {}
+        next_index = 0
+        finished_workers = 0
+
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            while finished_workers < self.render_workers:
+                item = self._get('rendered')
+                if item is _END:
+                    if self.stop_event.is_set():
+                        break
+                    finished_workers += 1
+                    continue
+                index, result_frame, detected_count = item
+                pending[index] = (result_frame, detected_count)
+
+                # 渲染结果可能乱序到达，按帧序写入
+                keep_going = True
+                while next_index in pending:
+                    result_frame, detected_count = pending.pop(next_index)
+                    start = time.perf_counter()
+                    keep_going = self.detector._finish_frame(result_frame, detected_count, out, counters,
+                                                             total_frames, show_preview, progress_callback)
+                    self.in_flight.release()
+                    monitor.add(time.perf_counter() - start)
+                    next_index += 1
+                    if not keep_going:
+                        break
+                if not keep_going:
+                    break
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            self.wall_time = time.perf_counter() - start_time
+
+        if self.errors:
+            raise self.errors[0]
+
+        return counters
+
+    def summary(self):
+        """
+        汇总流水线统计：各阶段利用率和队列深度
+
+        Returns:
+            dict: 'stages' 为各阶段的线程数、处理数量、累计工作时间和利用率，
+                  'queues' 为各队列的容量、最大深度和平均深度，'max_in_flight' 为同时处理的帧数上限
+        """
+        wall_time = self.wall_time if self.wall_time > 0 else 1e-9
+        stages = {}
+        for name, monitor in self.stages.items():
+            stages[name] = {
+                'threads': monitor.threads,
+                'items': monitor.items,
+                'busy_time': monitor.busy_time,
+                'utilisation': monitor.busy_time / (wall_time * monitor.threads)
+            }
+        queues = {}
+        for name, monitored in self.queues.items():
+            queues[name] = {
+                'capacity': monitored.maxsize,
+                'max_depth': monitored.max_depth,
+                'mean_depth': monitored.depth_sum / monitored.samples if monitored.samples else 0.0
+            }
+        return {'wall_time': self.wall_time, 'stages': stages, 'queues': queues, 'max_in_flight': self.max_in_flight}